@@ -3,20 +3,126 @@
 
 import os
 import sys
+import threading
 import traceback
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, Depends, Form, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Form, File, UploadFile, BackgroundTasks, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import uvicorn
 import json
+import math
+import time
+import zlib
 import asyncio
-from src.core.rag_system import RAGSystem
-from src.core.session_manager import SessionManager
+from src.core.metrics import REGISTRY, request_context, get_request_id
+from src.core.session_manager import SessionManager, DEFAULT_CLIENT_ID
+from src.core.mcp_tools import MCPTools
+from src.core.tool_runtime import ToolResources
+from src.core.scheduler import FairScheduler, RateLimited
+from src.core.ingest_jobs import IngestJobManager, copy_upload
+
+CONFIG_PATH = os.getenv("RAG_CONFIG_PATH", "./config/chinese_fiction.json")
+
+# RAGSystem 实例，在后台预热完成后才可用（模型和数据库加载较慢，不阻塞端口监听）
+rag_system = None
+_load_lock = threading.Lock()
+_ready = threading.Event()
+_warm_up_error: Optional[str] = None
+
+def load_rag_system():
+    """加载 RAG 系统（嵌入模型、向量数据库、LLM 客户端），重复调用时直接返回已加载的实例"""
+    global rag_system
+    with _load_lock:
+        if rag_system is None:
+            from src.core.rag_system import RAGSystem
+            system = RAGSystem(config_path=CONFIG_PATH)
+            # 工具共享资源：复用 RAG 系统的检索器，避免每次工具调用重新加载模型
+            MCPTools.configure(ToolResources(retriever=system.retriever))
+            rag_system = system
+    return rag_system
+
+def warm_up(worker_id: int = 0, num_workers: int = 1):
+    """加载并预热 RAG 系统，完成后服务进入就绪状态
+    
+    多工作进程模式下模型在 fork 前加载，每个工作进程重建数据库连接并按工作进程数分配计算线程。
+    """
+    global _warm_up_error
+    try:
+        system = load_rag_system()
+        num_threads = None
+        if num_workers > 1:
+            num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+            system.retriever.reconnect()
+        system.retriever.warm_up(num_threads)
+        _ready.set()
+        print(f"工作进程 {worker_id} 预热完成 (pid {os.getpid()})")
+    except Exception as e:
+        _warm_up_error = f"{e}\n{traceback.format_exc()}"
+        print(f"预热 RAG 系统时出错: {_warm_up_error}", file=sys.stderr)
+        raise
+
+def _warm_up_in_background():
+    try:
+        warm_up()
+    except Exception:
+        pass  # 错误已记录，由 /ready 报告
+
+def _archive_in_background(older_than_days: float):
+    try:
+        result = session_manager.archive_sessions(older_than_days)
+        print(f"会话归档完成: {result}")
+    except Exception as e:
+        print(f"归档会话时出错: {e}", file=sys.stderr)
+
+def _recover_ingest_jobs():
+    try:
+        ingest_manager.recover_stale_jobs()
+    except Exception as e:
+        print(f"恢复中断的入库任务时出错: {e}", file=sys.stderr)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 端口先开始监听，模型在后台线程中加载；多进程模式下工作进程启动前已完成预热
+    if not _ready.is_set():
+        threading.Thread(target=_warm_up_in_background, name="warm-up", daemon=True).start()
+    # 上次运行中断的入库任务标记为失败并清理影子集合（删除集合需要导入 chromadb，放到后台线程）
+    threading.Thread(target=_recover_ingest_jobs, name="ingest-recovery", daemon=True).start()
+    # 配置了 SESSION_ARCHIVE_DAYS 时，启动后在后台归档长期不活跃的会话
+    archive_days = os.getenv("SESSION_ARCHIVE_DAYS")
+    if archive_days:
+        threading.Thread(target=_archive_in_background, args=(float(archive_days),),
+                         name="session-archive", daemon=True).start()
+    yield
+    MCPTools.get_resources().close()
 
 # 创建 FastAPI 应用
-app = FastAPI(title="周棋洛 AI 助手 API", description="API for 周棋洛 AI 助手")
+app = FastAPI(title="周棋洛 AI 助手 API", description="API for 周棋洛 AI 助手", lifespan=lifespan)
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests handled by the backend",
+    labelnames=("method", "path", "status")
+)
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    """为每个请求分配请求 ID（可由 X-Request-ID 头传入），并统计请求耗时"""
+    with request_context(request.headers.get("X-Request-ID")) as request_id:
+        start = time.perf_counter()
+        response = await call_next(request)
+        # 使用路由模板作为标签，避免路径参数导致标签数量膨胀
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            path=path,
+            status=response.status_code
+        )
+        response.headers["X-Request-ID"] = request_id
+        return response
 
 # 允许跨域
 app.add_middleware(
@@ -27,17 +133,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 创建 RAGSystem 实例
-rag_system = RAGSystem()
-
 # 创建会话管理器
 session_manager = SessionManager()
 
+def _load_config() -> Dict[str, Any]:
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取配置文件失败，调度器使用默认参数: {e}", file=sys.stderr)
+        return {}
+
+_config = _load_config()
+
+# 聊天请求调度器：每个工作进程各自限流与排队
+scheduler = FairScheduler.from_config(_config)
+
+# 后台入库任务：状态保存在磁盘上，任一工作进程都能查询
+ingest_manager = IngestJobManager.from_config(CONFIG_PATH, _config)
+
 # 请求模型
 class ChatRequest(BaseModel):
     messages: List[Dict[str, str]]
     stream: bool = False
     session_id: Optional[str] = None
+    use_tools: bool = False
 
 # 响应模型
 class ChatResponse(BaseModel):
@@ -49,6 +169,25 @@ class ChatResponse(BaseModel):
 class SessionRequest(BaseModel):
     session_id: Optional[str] = None
 
+# 会话检索请求模型
+class SessionSearchRequest(BaseModel):
+    query: str
+    page: int = 1
+    page_size: int = 20
+
+# 归档请求模型
+class ArchiveRequest(BaseModel):
+    older_than_days: float = 30
+
+# 归档会话列表请求模型
+class ArchivedListRequest(BaseModel):
+    offset: int = 0
+    limit: int = 50
+
+# 客户端标识：前端在每个请求中通过 X-Client-Id 头传递，用于区分各客户端的当前会话
+def get_client_id(x_client_id: Optional[str] = Header(None)) -> str:
+    return x_client_id or DEFAULT_CLIENT_ID
+
 # 会话列表响应模型
 class SessionListResponse(BaseModel):
     sessions: List[Dict[str, Any]]
@@ -58,16 +197,35 @@ class SessionListResponse(BaseModel):
 async def root():
     return {"message": "周棋洛 AI 助手 API 已启动"}
 
+@app.get("/health")
+async def health():
+    """存活检查：进程能响应请求即返回成功"""
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的指标（各阶段耗时、工具调用、HTTP 请求）"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    """就绪检查：模型和数据库加载完成后才返回成功，同时返回调度器的排队情况供负载均衡参考"""
+    if _ready.is_set():
+        return {"status": "ready", "scheduler": scheduler.stats()}
+    if _warm_up_error:
+        return JSONResponse(status_code=503, content={"status": "error", "message": _warm_up_error})
+    return JSONResponse(status_code=503, content={"status": "starting"})
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, client_id: str = Depends(get_client_id)):
     try:
         # 获取或创建会话
         session_id = request.session_id
         if not session_id:
-            session_id = session_manager.get_current_session_id()
+            session_id = session_manager.get_current_session_id(client_id)
             if not session_id:
-                session_id = session_manager.create_session()
-        session_manager.set_current_session(session_id)
+                session_id = session_manager.create_session(client_id)
+        session_manager.set_current_session(session_id, client_id)
         
         # 提取用户最后一条消息
         user_messages = [msg for msg in request.messages if msg.get('role') == 'user']
@@ -82,68 +240,98 @@ async def chat(request: ChatRequest):
             )
         
         user_input = user_messages[-1].get('content', '')
-        print(f"处理用户输入: {user_input}")
+        print(f"[{get_request_id()}] 处理用户输入: {user_input}")
         
-        # 保存用户消息到会话
-        last_message = user_messages[-1]
-        session_manager.save_message(session_id, last_message)
+        if not _ready.is_set():
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "response": "系统正在启动，模型加载完成后即可对话，请稍后再试",
+                    "tool_calls": None,
+                    "session_id": session_id
+                }
+            )
         
-        # 直接使用 try-except 调用 RAG 系统处理用户查询
+        # 限流与公平调度：超出速率的请求直接拒绝，其余请求按会话轮转获得执行槽位
+        priority = scheduler.priority_for(user_input, request.use_tools)
         try:
-            # 调用 RAG 系统并捕获输出
-            import io
-            from contextlib import redirect_stdout
-            
-            # 捕获标准输出
-            f = io.StringIO()
-            with redirect_stdout(f):
-                result = rag_system.query(user_input, use_history=True)
-            
-            # 获取标准输出内容
-            output = f.getvalue()
-            
-            # 如果 result 为 None，但有打印输出，则使用打印的内容
-            if result is None and output:
-                response = output
-            else:
-                response = str(result) if result is not None else "RAG 系统没有返回答案"
-                
-            print(f"RAG 系统返回: {response}")
-            
-            # 保存助手回复到会话
-            assistant_message = {
-                "role": "assistant",
-                "content": response
-            }
-            session_manager.save_message(session_id, assistant_message)
-            
+            async with scheduler.slot(session_id, client_id, priority):
+                # 保存用户消息到会话
+                session_manager.save_message(session_id, user_messages[-1])
+                return await _answer(user_input, session_id, request.use_tools)
+        except RateLimited as e:
             return JSONResponse(
                 status_code=200,
                 content={
-                    "response": response, 
+                    "response": str(e),
                     "tool_calls": None,
                     "session_id": session_id
-                }
+                },
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
             )
-        except Exception as e:
-            # 获取详细的错误堆栈
-            error_details = traceback.format_exc()
-            error_msg = f"调用 RAG 系统时出错: {str(e)}\n{error_details}"
-            print(error_msg, file=sys.stderr)
             
+    except Exception as e:
+        # 获取详细的错误堆栈
+        error_details = traceback.format_exc()
+        error_msg = f"处理请求时出错: {str(e)}\n{error_details}"
+        print(error_msg, file=sys.stderr)
+        
+        return JSONResponse(
+            status_code=200,  # 使用 200 而不是 500，以便前端能够正常显示错误消息
+            content={
+                "response": error_msg, 
+                "tool_calls": None,
+                "session_id": session_manager.get_current_session_id(client_id) or ""
+            }
+        )
+
+async def _answer(user_input: str, session_id: str, use_tools: bool) -> JSONResponse:
+    """调用 RAG 系统生成回答并保存到会话；同步查询在线程中执行，不阻塞事件循环"""
+    # 直接使用 try-except 调用 RAG 系统处理用户查询
+    try:
+        if use_tools:
+            # 工具调用模式：模型请求的工具并发执行
+            result = await rag_system.aquery_with_tools(
+                user_input, use_history=True, request_id=get_request_id(), session_id=session_id
+            )
+            response = result["response"]
+            session_manager.save_message(session_id, {"role": "assistant", "content": response})
             return JSONResponse(
-                status_code=200,  # 使用 200 而不是 500，以便前端能够正常显示错误消息
+                status_code=200,
                 content={
-                    "response": error_msg, 
-                    "tool_calls": None,
+                    "response": response,
+                    "tool_calls": result["tool_calls"],
                     "session_id": session_id
                 }
             )
+        
+        # asyncio.to_thread 会复制当前上下文，请求 ID 在线程中仍然可见
+        result = await asyncio.to_thread(
+            rag_system.query, user_input, use_history=True, request_id=get_request_id(), session_id=session_id
+        )
+        response = str(result) if result is not None else "RAG 系统没有返回答案"
             
+        print(f"[{get_request_id()}] RAG 系统返回: {response}")
+        
+        # 保存助手回复到会话
+        assistant_message = {
+            "role": "assistant",
+            "content": response
+        }
+        session_manager.save_message(session_id, assistant_message)
+        
+        return JSONResponse(
+            status_code=200,
+            content={
+                "response": response, 
+                "tool_calls": None,
+                "session_id": session_id
+            }
+        )
     except Exception as e:
         # 获取详细的错误堆栈
         error_details = traceback.format_exc()
-        error_msg = f"处理请求时出错: {str(e)}\n{error_details}"
+        error_msg = f"调用 RAG 系统时出错: {str(e)}\n{error_details}"
         print(error_msg, file=sys.stderr)
         
         return JSONResponse(
@@ -151,15 +339,15 @@ async def chat(request: ChatRequest):
             content={
                 "response": error_msg, 
                 "tool_calls": None,
-                "session_id": session_manager.get_current_session_id() or ""
+                "session_id": session_id
             }
         )
 
 @app.post("/sessions/create")
-async def create_session():
+async def create_session(client_id: str = Depends(get_client_id)):
     """创建新会话"""
     try:
-        session_id = session_manager.create_session()
+        session_id = session_manager.create_session(client_id)
         return {
             "status": "success", 
             "session_id": session_id,
@@ -179,11 +367,11 @@ async def create_session():
         )
 
 @app.post("/sessions/list", response_model=SessionListResponse)
-async def list_sessions():
+async def list_sessions(client_id: str = Depends(get_client_id)):
     """获取会话列表"""
     try:
         sessions = session_manager.get_sessions()
-        current_session_id = session_manager.get_current_session_id()
+        current_session_id = session_manager.get_current_session_id(client_id)
         return {
             "sessions": sessions,
             "current_session_id": current_session_id
@@ -236,6 +424,11 @@ async def delete_session(request: SessionRequest):
         
         success = session_manager.delete_session(session_id)
         if success:
+            # 会话记忆与历史摘要属于 RAG 系统，随会话一起删除
+            if rag_system is not None:
+                for store in (rag_system.memory, rag_system.summarizer):
+                    if store is not None:
+                        store.remove(session_id)
             return {"status": "success", "message": "会话已删除"}
         else:
             return {"status": "error", "message": "删除会话失败"}
@@ -249,7 +442,7 @@ async def delete_session(request: SessionRequest):
         )
 
 @app.post("/sessions/set_current")
-async def set_current_session(request: SessionRequest):
+async def set_current_session(request: SessionRequest, client_id: str = Depends(get_client_id)):
     """设置当前会话"""
     try:
         session_id = request.session_id
@@ -259,7 +452,7 @@ async def set_current_session(request: SessionRequest):
                 content={"status": "error", "message": "未提供会话ID"}
             )
         
-        success = session_manager.set_current_session(session_id)
+        success = session_manager.set_current_session(session_id, client_id)
         if success:
             return {"status": "success", "message": "当前会话已设置"}
         else:
@@ -274,11 +467,11 @@ async def set_current_session(request: SessionRequest):
         )
 
 @app.post("/clear_history")
-async def clear_history():
+async def clear_history(client_id: str = Depends(get_client_id)):
     """清空对话历史"""
     try:
         # 创建新会话而不是清空当前会话
-        session_id = session_manager.create_session()
+        session_id = session_manager.create_session(client_id)
         return {"status": "success", "message": "新会话已创建", "session_id": session_id}
     except Exception as e:
         error_details = traceback.format_exc()
@@ -290,14 +483,205 @@ async def clear_history():
             content={"status": "error", "message": error_msg}
         )
 
+@app.post("/sessions/search")
+async def search_sessions(request: SessionSearchRequest):
+    """全文检索历史会话，返回按相关度排序的命中片段"""
+    try:
+        if not request.query.strip():
+            return JSONResponse(
+                status_code=200,
+                content={"status": "error", "message": "检索词不能为空"}
+            )
+        result = await asyncio.to_thread(
+            session_manager.search_sessions, request.query, request.page, request.page_size
+        )
+        return {"status": "success", **result}
+    except Exception as e:
+        error_msg = f"检索会话时出错: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg, file=sys.stderr)
+        return JSONResponse(
+            status_code=200,
+            content={"status": "error", "message": error_msg}
+        )
+
+@app.post("/sessions/archive")
+async def archive_sessions(request: ArchiveRequest):
+    """将超过指定天数未更新的会话压缩归档"""
+    try:
+        result = await asyncio.to_thread(session_manager.archive_sessions, request.older_than_days)
+        return {"status": "success", **result}
+    except Exception as e:
+        error_msg = f"归档会话时出错: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg, file=sys.stderr)
+        return JSONResponse(
+            status_code=200,
+            content={"status": "error", "message": error_msg}
+        )
+
+@app.post("/sessions/archived")
+async def list_archived_sessions(request: ArchivedListRequest):
+    """分页获取归档会话列表，归档会话可直接通过 /sessions/get 读取"""
+    try:
+        return {"status": "success", **session_manager.list_archived(request.offset, request.limit)}
+    except Exception as e:
+        error_msg = f"获取归档会话列表时出错: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg, file=sys.stderr)
+        return JSONResponse(
+            status_code=200,
+            content={"status": "error", "message": error_msg}
+        )
+
+@app.get("/sessions/export")
+async def export_sessions(compress: bool = True):
+    """流式导出全部会话（含归档），每行一个 JSON 会话记录，默认 gzip 压缩"""
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        for record in session_manager.iter_export():
+            line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+            data = compressor.compress(line) if compressor else line
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+
+    filename = "sessions.jsonl.gz" if compress else "sessions.jsonl"
+    return StreamingResponse(
+        generate(),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@app.post("/sessions/import")
+async def import_sessions(request: Request, overwrite: bool = False):
+    """流式导入会话：请求体为 /sessions/export 导出的 JSONL（可 gzip 压缩），边接收边写入"""
+    result = {"imported": 0, "skipped": 0, "invalid": 0}
+
+    async def flush(records):
+        counts = await asyncio.to_thread(session_manager.import_sessions, records, overwrite)
+        for key, value in counts.items():
+            result[key] += value
+
+    try:
+        decompressor = None
+        buffer = b""
+        records = []
+        async for chunk in request.stream():
+            if decompressor is None and not buffer and chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(47)
+            buffer += decompressor.decompress(chunk) if decompressor else chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    result["invalid"] += 1
+            if len(records) >= 100:
+                await flush(records)
+                records = []
+        if decompressor:
+            buffer += decompressor.flush()
+        if buffer.strip():
+            try:
+                records.append(json.loads(buffer))
+            except json.JSONDecodeError:
+                result["invalid"] += 1
+        if records:
+            await flush(records)
+        return {"status": "success", **result}
+    except Exception as e:
+        error_msg = f"导入会话时出错: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg, file=sys.stderr)
+        return JSONResponse(
+            status_code=200,
+            content={"status": "error", "message": error_msg, **result}
+        )
+
+def _run_ingest_job(job_id: str):
+    """在后台线程中执行入库任务；模型名与检索器一致时复用已加载的嵌入模型"""
+    model = None
+    if rag_system is not None:
+        vector_store = _config.get("vector_store", {})
+        if vector_store.get("model_name") == rag_system.retriever.embedding_model:
+            model = rag_system.retriever.model
+    ingest_manager.run(job_id, model=model, busy=lambda: scheduler.active > 0)
+
+@app.post("/ingest/jobs")
+async def create_ingest_job(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    corpus: str = Form(...),
+    title: Optional[str] = Form(None),
+    keywords: Optional[str] = Form(None)
+):
+    """上传 UTF-8 文本并创建后台入库任务
+
+    文本写入新的影子集合，建完后原子切换，查询不会看到建了一半的索引。
+    corpus 为语料名（字母、数字、下划线、连字符），与已有语料同名时替换该语料的索引；
+    keywords 为逗号分隔的路由关键词，只在新建语料时使用。
+    """
+    try:
+        if not ingest_manager.validate_corpus_name(corpus):
+            return JSONResponse(
+                status_code=200,
+                content={"status": "error", "message": "语料名只能包含字母、数字、下划线和连字符"}
+            )
+        upload_path = ingest_manager.new_upload_path()
+        size = await asyncio.to_thread(copy_upload, file.file, upload_path)
+        if size == 0:
+            os.remove(upload_path)
+            return JSONResponse(status_code=200, content={"status": "error", "message": "上传的文件为空"})
+        job = ingest_manager.create_job(
+            corpus, upload_path, file.filename, title=title,
+            keywords=[k.strip() for k in (keywords or "").split(",") if k.strip()]
+        )
+        # 同步函数由 BackgroundTasks 放到线程池中执行，响应先返回
+        background_tasks.add_task(_run_ingest_job, job["id"])
+        return {"status": "success", "job": job}
+    except Exception as e:
+        error_details = traceback.format_exc()
+        error_msg = f"创建入库任务时出错: {str(e)}\n{error_details}"
+        print(error_msg, file=sys.stderr)
+        return JSONResponse(status_code=200, content={"status": "error", "message": error_msg})
+
+@app.get("/ingest/jobs")
+async def list_ingest_jobs(limit: int = 50):
+    """列出入库任务（从新到旧）"""
+    return {"status": "success", "jobs": ingest_manager.list_jobs(limit)}
+
+@app.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """查询入库任务的状态与进度"""
+    job = ingest_manager.get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=200, content={"status": "error", "message": "任务不存在"})
+    return {"status": "success", "job": job}
+
+@app.post("/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    """取消入库任务：运行中的任务在当前批次完成后停止并删除影子集合"""
+    if ingest_manager.cancel(job_id):
+        return {"status": "success", "message": "已请求取消"}
+    return {"status": "error", "message": "任务不存在或已结束"}
+
 @app.get("/tools")
 async def get_tools():
     """获取所有可用工具的列表"""
-    return {"tools": []}
+    if rag_system is None:
+        from src.core.tool_registry import build_default_registry
+        return {"tools": build_default_registry().schemas()}
+    return {"tools": rag_system.tool_registry.schemas()}
+
+@app.get("/tools/metrics")
+async def get_tool_metrics():
+    """获取各工具的调用次数与耗时统计"""
+    return {"metrics": MCPTools.get_resources().metrics.snapshot()}
 
 def start_server():
     """启动 API 服务器"""
-    uvicorn.run("src.backend.api:app", host="127.0.0.1", port=8000, reload=True)
+    from src.backend.server_runner import run_server
+    run_server()
 
 if __name__ == "__main__":
     start_server() 
\ No newline at end of file
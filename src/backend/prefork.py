@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import signal
+import socket
+from typing import Callable, Dict, Optional
+
+import uvicorn
+
+
+class PreforkServer:
+    """预先加载应用后 fork 多个 uvicorn 工作进程的服务器
+
+    主进程加载应用（包括嵌入模型）并监听端口，之后 fork 出工作进程，
+    模型内存以写时复制方式共享。工作进程退出后由主进程重新 fork，
+    新进程无需再次冷加载模型。收到 SIGTERM/SIGINT 时通知所有工作进程
+    优雅退出，超时后强制结束。
+    """
+
+    def __init__(
+        self,
+        load_app: Callable[[], object],
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 2,
+        on_worker_start: Optional[Callable[[int, int], None]] = None,
+        graceful_timeout: float = 30.0,
+        log_level: str = "info"
+    ):
+        """
+        Args:
+            load_app (Callable[[], object]): 在主进程中调用，返回 ASGI 应用（此时完成模型加载）
+            host (str): 监听地址
+            port (int): 监听端口
+            workers (int): 工作进程数
+            on_worker_start (Optional[Callable[[int, int], None]]): fork 后在工作进程中调用，参数为工作进程编号和工作进程总数
+            graceful_timeout (float): 优雅退出的最长等待时间（秒）
+            log_level (str): uvicorn 日志级别
+        """
+        self.load_app = load_app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.on_worker_start = on_worker_start
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+        self.children: Dict[int, int] = {}  # pid -> 工作进程编号
+        self.shutting_down = False
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, worker_id: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            # 工作进程：恢复默认信号处理，由 uvicorn 接管 SIGTERM/SIGINT
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                if self.on_worker_start is not None:
+                    self.on_worker_start(worker_id, self.workers)
+                config = uvicorn.Config(
+                    self.app,
+                    log_level=self.log_level,
+                    timeout_graceful_shutdown=self.graceful_timeout
+                )
+                uvicorn.Server(config).run(sockets=[self.sock])
+            except Exception as e:
+                print(f"工作进程 {worker_id} 异常退出: {e}", file=sys.stderr)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.children[pid] = worker_id
+        print(f"工作进程 {worker_id} 已启动 (pid {pid})")
+        return pid
+
+    def _handle_exit(self, signum, frame):
+        if self.shutting_down:
+            return
+        self.shutting_down = True
+        print(f"\n收到信号 {signum}，正在等待工作进程处理完当前请求...")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self, block: bool) -> Optional[int]:
+        """回收一个已退出的工作进程，返回其编号"""
+        try:
+            pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            # 已没有子进程可回收
+            self.children.clear()
+            return None
+        if pid == 0 or pid not in self.children:
+            return None
+        worker_id = self.children.pop(pid)
+        if not self.shutting_down:
+            print(f"工作进程 {worker_id} (pid {pid}) 已退出，状态 {status}", file=sys.stderr)
+        return worker_id
+
+    def run(self):
+        """启动主进程：加载应用、监听端口、fork 并监控工作进程"""
+        self.app = self.load_app()
+        self.sock = self._bind()
+        print(f"后端服务器已启动: http://{self.host}:{self.port} ({self.workers} 个工作进程)")
+
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+        last_restart: Dict[int, float] = {}
+        while not self.shutting_down:
+            worker_id = self._reap(block=False)
+            if worker_id is None:
+                time.sleep(0.5)
+                continue
+            if self.shutting_down:
+                break
+            # 连续快速崩溃时退避，避免重启风暴
+            if time.monotonic() - last_restart.get(worker_id, 0.0) < 1.0:
+                time.sleep(1.0)
+            last_restart[worker_id] = time.monotonic()
+            self._spawn(worker_id)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            if self._reap(block=False) is None:
+                time.sleep(0.1)
+        for pid, worker_id in list(self.children.items()):
+            print(f"工作进程 {worker_id} 未在 {self.graceful_timeout}s 内退出，强制结束", file=sys.stderr)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            self._reap(block=True)
+        self.sock.close()
+        print("后端服务器已关闭")
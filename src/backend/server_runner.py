@@ -3,21 +3,71 @@
 
 import os
 import sys
+import argparse
 import uvicorn
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
-def run_server(port=8000):
-    """启动后端 API 服务器"""
+def _load_app():
+    """在主进程中导入应用并加载模型和数据库，之后 fork 的工作进程共享已加载的模型"""
+    from src.backend.api import app, load_rag_system
+    load_rag_system()
+    return app
+
+def _on_worker_start(worker_id, num_workers):
+    """fork 之后在每个工作进程中执行的初始化"""
+    from src.backend.api import warm_up
+    warm_up(worker_id, num_workers)
+
+def run_server(port=8000, host="127.0.0.1", workers=1, reload=False, graceful_timeout=30.0):
+    """启动后端 API 服务器
+    
+    reload=True 时为开发模式（单进程，代码变更自动重启）；
+    workers > 1 时先加载模型再 fork 多个工作进程，共享已加载的模型内存。
+    """
     try:
-        print(f"正在启动后端服务器，端口: {port}...")
-        uvicorn.run("src.backend.api:app", host="127.0.0.1", port=port, reload=True)
+        print(f"正在启动后端服务器，地址: {host}:{port}，工作进程数: {workers}...")
+        if reload:
+            uvicorn.run("src.backend.api:app", host=host, port=port, reload=True)
+        elif workers <= 1:
+            # 单进程：立即监听端口，模型由应用的 lifespan 在后台预热
+            from src.backend.api import app
+            uvicorn.run(app, host=host, port=port, timeout_graceful_shutdown=graceful_timeout)
+        elif not hasattr(os, "fork"):
+            # 不支持 fork 的平台：每个工作进程各自加载模型
+            uvicorn.run("src.backend.api:app", host=host, port=port, workers=workers,
+                        timeout_graceful_shutdown=graceful_timeout)
+        else:
+            from src.backend.prefork import PreforkServer
+            PreforkServer(
+                load_app=_load_app,
+                host=host,
+                port=port,
+                workers=workers,
+                on_worker_start=_on_worker_start,
+                graceful_timeout=graceful_timeout
+            ).run()
     except Exception as e:
         print(f"启动后端服务器时出错: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="后端 API 服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument("--reload", action="store_true", help="开发模式：代码变更时自动重启（单进程）")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="优雅退出的最长等待时间（秒）")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    # 如果直接运行此脚本，则使用默认端口启动服务器
-    run_server() 
\ No newline at end of file
+    args = parse_args()
+    run_server(
+        port=args.port,
+        host=args.host,
+        workers=args.workers,
+        reload=args.reload,
+        graceful_timeout=args.graceful_timeout
+    )
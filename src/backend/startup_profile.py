@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""后端冷启动分析：基于 python -X importtime 统计导入耗时
+
+用法:
+    python -m src.backend.startup_profile [--module src.backend.api] [--top 20]
+"""
+
+import sys
+import argparse
+import subprocess
+from typing import Dict, List
+
+
+def run_importtime(module: str) -> List[Dict[str, object]]:
+    """在子进程中导入模块并解析 -X importtime 的输出
+
+    Returns:
+        List[Dict[str, object]]: 每个被导入模块的 name、self_us、cumulative_us、depth
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        # importtime 在 "| " 之后用两个空格表示一级导入层级
+        name = name[1:] if name.startswith(" ") else name
+        entries.append({
+            "name": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip())) // 2
+        })
+    return entries
+
+
+def report(entries: List[Dict[str, object]], top: int = 20) -> str:
+    """生成按累计耗时和自身耗时排序的文本报告"""
+    top_level = [e for e in entries if e["depth"] == 0]
+    total_us = sum(e["cumulative_us"] for e in top_level)
+    lines = [f"总导入耗时: {total_us / 1000:.1f} ms（{len(entries)} 个模块）", ""]
+
+    lines.append(f"累计耗时最高的 {top} 个模块:")
+    for entry in sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top]:
+        lines.append(f"  {entry['cumulative_us'] / 1000:9.1f} ms  {entry['name']}")
+
+    lines.append("")
+    lines.append(f"自身耗时最高的 {top} 个模块:")
+    for entry in sorted(entries, key=lambda e: e["self_us"], reverse=True)[:top]:
+        lines.append(f"  {entry['self_us'] / 1000:9.1f} ms  {entry['name']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端冷启动导入耗时分析")
+    parser.add_argument("--module", default="src.backend.api", help="要分析的模块")
+    parser.add_argument("--top", type=int, default=20, help="显示前 N 个模块")
+    args = parser.parse_args()
+
+    print(report(run_importtime(args.module), args.top))
+
+
+if __name__ == "__main__":
+    main()
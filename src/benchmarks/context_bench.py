@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""检索上下文后处理的基准：token 节省、耗时与证据保留率
+
+对问题集中的每个问题取检索结果，分别统计后处理前后上下文的估计 token 数、后处理耗时，
+以及证据片段在后处理后是否仍在上下文中（只统计处理前命中证据的问题）。
+
+默认不依赖向量库：语料按固定字数切分为带重叠的 chunk（模拟 chunk_overlap），用问题的
+字符二元组做词法检索代替向量检索；--use-retriever 时使用配置中的 VectorRetriever。
+
+用法:
+    python -m src.benchmarks.context_bench --top-k 5 --overlap 50
+    python -m src.benchmarks.context_bench --use-retriever --config config/chinese_fiction.json
+"""
+
+import json
+import math
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+from src.benchmarks.run_bench import REPO_ROOT, DEFAULT_CORPUS, DEFAULT_QUESTIONS, load_questions, summarize, git_commit
+from src.core.context_compressor import ContextCompressor, bigrams
+
+
+class LexicalRetriever:
+    """按问题二元组的 IDF 之和给 chunk 打分，返回与 VectorRetriever.retrieve 相同格式的结果"""
+
+    def __init__(self, text: str, chunk_chars: int, overlap: int, source: str = "corpus"):
+        step = max(1, chunk_chars - overlap)
+        self.chunks = [text[i:i + chunk_chars] for i in range(0, len(text), step)]
+        self.terms = [bigrams(chunk) for chunk in self.chunks]
+        self.source = source
+        df: Dict[str, int] = {}
+        for terms in self.terms:
+            for term in terms:
+                df[term] = df.get(term, 0) + 1
+        self.idf = {term: math.log(1 + len(self.chunks) / count) for term, count in df.items()}
+
+    def retrieve(self, query: str, top_k: int = 5) -> List[dict]:
+        query_terms = [t for t in bigrams(query) if t in self.idf]
+        scores = [sum(self.idf[t] for t in query_terms if t in terms) for terms in self.terms]
+        ranked = sorted(range(len(self.chunks)), key=lambda i: -scores[i])[:top_k]
+        return [
+            {"text": self.chunks[i], "metadata": {"source": self.source, "chunk": i},
+             "distance": 1.0 / (1.0 + scores[i]), "corpus": self.source}
+            for i in ranked
+        ]
+
+
+def has_evidence(docs: List[dict], evidence: List[str]) -> bool:
+    context = "\n".join(doc["text"] for doc in docs)
+    return any(e in context for e in evidence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索上下文后处理基准")
+    parser.add_argument("--config", default=str(REPO_ROOT / "config" / "chinese_fiction.json"),
+                        help="RAG 配置文件，读取 context_compression 段（--use-retriever 时同时用于检索）")
+    parser.add_argument("--use-retriever", action="store_true", help="使用配置中的向量检索器")
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="带证据标注的 JSONL 问题集")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="词法检索使用的语料文件")
+    parser.add_argument("--chunk-chars", type=int, default=200, help="词法检索的 chunk 字数")
+    parser.add_argument("--overlap", type=int, default=50, help="相邻 chunk 重叠的字数")
+    parser.add_argument("--top-k", type=int, default=5, help="检索结果数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个问题后处理的重复次数（计时用）")
+    parser.add_argument("--output", default=None, help="结果文件，默认写入 bench_results/")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    options = {**config.get("context_compression", {}), "enabled": True}
+    compressor = ContextCompressor.from_config({"context_compression": options})
+
+    if args.use_retriever:
+        from src.core.retrieve_related import VectorRetriever
+        retriever = VectorRetriever(args.config)
+        retrieve = lambda question: retriever.retrieve(question, top_k=args.top_k)
+    else:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            lexical = LexicalRetriever(f.read(), args.chunk_chars, args.overlap)
+        retrieve = lambda question: lexical.retrieve(question, args.top_k)
+
+    questions = load_questions(Path(args.questions))
+    latencies = []
+    tokens_before = tokens_after = duplicates = 0
+    hits_before = hits_after = 0
+    lost = []
+    start = time.perf_counter()
+    for question in questions:
+        docs = retrieve(question["question"])
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            compressed, stats = compressor.compress_with_stats(question["question"], docs)
+            latencies.append(time.perf_counter() - t0)
+        tokens_before += stats["tokens_before"]
+        tokens_after += stats["tokens_after"]
+        duplicates += stats["duplicate"]
+        if has_evidence(docs, question["evidence"]):
+            hits_before += 1
+            if has_evidence(compressed, question["evidence"]):
+                hits_after += 1
+            else:
+                lost.append(question["id"])
+    wall = time.perf_counter() - start
+
+    savings = 1 - tokens_after / tokens_before if tokens_before else 0.0
+    retention = hits_after / hits_before if hits_before else 1.0
+    latency = summarize(latencies, wall)
+    print(f"{len(questions)} 个问题，top_k={args.top_k}，参数: {options}")
+    print(f"上下文 token: {tokens_before} -> {tokens_after}（节省 {savings:.1%}），"
+          f"平均每问 {tokens_before / len(questions):.0f} -> {tokens_after / len(questions):.0f}；去重片段 {duplicates} 个")
+    print(f"后处理耗时 p50 {latency['p50']} ms，p95 {latency['p95']} ms")
+    print(f"证据保留率: {hits_after}/{hits_before} = {retention:.1%}" + (f"，丢失: {lost}" if lost else ""))
+
+    output = Path(args.output) if args.output else (
+        REPO_ROOT / "bench_results" / f"context_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "params": {**{k: v for k, v in vars(args).items() if k != "output"}, "compression": options},
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "savings": round(savings, 4),
+            "duplicates": duplicates,
+            "latency": latency,
+            "evidence_retention": round(retention, 4),
+            "evidence_lost": lost
+        }, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
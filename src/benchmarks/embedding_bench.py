@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""嵌入推理后端的基准：fp32 PyTorch vs int8 动态量化 vs ONNX Runtime
+
+对每个后端报告：
+    - 单条查询编码延迟（对应在线聊天的检索前编码）与批量编码吞吐（对应入库）
+    - 查询向量与 fp32 向量的余弦相似度
+    - 检索一致性：top-k 与 fp32 结果的重合比例，分两种情况
+        query_only  索引仍是 fp32 向量，只替换查询编码（切换后端后不重建索引）
+        rebuilt     索引与查询都用该后端编码（切换后端并重建索引）
+    - 以证据片段判定的 recall@k
+
+语料按固定字数切分为 chunk，在内存中用精确余弦相似度检索，不依赖 Chroma。
+
+用法:
+    python -m src.benchmarks.embedding_bench --backends torch,int8,onnx --num-threads 4
+    python -m src.benchmarks.embedding_bench --backends onnx --onnx-file onnx/model_qint8_avx2.onnx
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.benchmarks.run_bench import REPO_ROOT, DEFAULT_CORPUS, DEFAULT_QUESTIONS, load_questions, summarize, git_commit
+from src.core.embedding import BACKENDS, load_embedding_model
+
+
+def split_chunks(text: str, chunk_chars: int) -> List[str]:
+    chunks = [text[i:i + chunk_chars].strip() for i in range(0, len(text), chunk_chars)]
+    return [c for c in chunks if c]
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(queries: np.ndarray, index: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ index.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def overlap(a: np.ndarray, b: np.ndarray) -> float:
+    """两组 top-k 结果的平均重合比例"""
+    return float(np.mean([len(set(x) & set(y)) / len(x) for x, y in zip(a, b)]))
+
+
+def recall(ranked: np.ndarray, chunks: List[str], questions: List[dict]) -> float:
+    hits = [any(e in chunks[i] for i in row for e in q["evidence"]) for row, q in zip(ranked, questions)]
+    return round(sum(hits) / (len(hits) or 1), 4)
+
+
+def bench_backend(backend: str, args, questions: List[dict], chunks: List[str],
+                  reference: Optional[Dict[str, np.ndarray]]) -> Tuple[dict, Optional[Dict[str, np.ndarray]]]:
+    """加载一个后端并测量延迟与检索一致性；reference 为 fp32 的查询与索引向量"""
+    options = {"backend": backend, "num_threads": args.num_threads, "onnx_file": args.onnx_file}
+    start = time.perf_counter()
+    model = load_embedding_model(args.model, options)
+    load_time = time.perf_counter() - start
+    texts = [q["question"] for q in questions]
+    model.encode(texts[:2])
+
+    latencies = []
+    single_start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            t0 = time.perf_counter()
+            model.encode([text])
+            latencies.append(time.perf_counter() - t0)
+    single_wall = time.perf_counter() - single_start
+
+    query_vectors = normalize(model.encode(texts, batch_size=args.batch_size))
+    batch_start = time.perf_counter()
+    index_vectors = normalize(model.encode(chunks, batch_size=args.batch_size))
+    batch_wall = time.perf_counter() - batch_start
+
+    row = {
+        "backend": backend,
+        "loaded_backend": getattr(model, "embedding_backend", backend),
+        "load_time_s": round(load_time, 3),
+        "query_latency": summarize(latencies, single_wall),
+        "encode_chunks_per_s": round(len(chunks) / batch_wall, 2) if batch_wall > 0 else 0.0,
+        f"recall@{args.top_k}": recall(top_k(query_vectors, index_vectors, args.top_k), chunks, questions)
+    }
+    if reference is None:
+        return row, {"queries": query_vectors, "index": index_vectors}
+
+    baseline = top_k(reference["queries"], reference["index"], args.top_k)
+    cosine = np.sum(query_vectors * reference["queries"], axis=1)
+    row.update({
+        "query_cosine_mean": round(float(cosine.mean()), 5),
+        "query_cosine_min": round(float(cosine.min()), 5),
+        "agreement_query_only": round(overlap(top_k(query_vectors, reference["index"], args.top_k), baseline), 4),
+        "agreement_rebuilt": round(overlap(top_k(query_vectors, index_vectors, args.top_k), baseline), 4)
+    })
+    return row, None
+
+
+def format_table(rows: List[dict], k: int) -> str:
+    headers = ["backend", "p50_ms", "p95_ms", "speedup", "chunks/s", f"R@{k}", "cos_min", "agree_query", "agree_rebuilt"]
+    lines = [" | ".join(headers)]
+    base_p50 = rows[0]["query_latency"]["p50"] if rows else 0
+    for row in rows:
+        p50 = row["query_latency"]["p50"]
+        values = [
+            row["loaded_backend"], p50, row["query_latency"]["p95"],
+            f"{base_p50 / p50:.2f}x" if p50 > 0 else "-", row["encode_chunks_per_s"], row[f"recall@{k}"],
+            row.get("query_cosine_min", 1.0), row.get("agreement_query_only", 1.0), row.get("agreement_rebuilt", 1.0)
+        ]
+        lines.append(" | ".join(str(v) for v in values))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入推理后端的延迟与检索一致性基准")
+    parser.add_argument("--model", default=None, help="嵌入模型，默认使用配置中的 embedding_model")
+    parser.add_argument("--config", default=str(REPO_ROOT / "config" / "chinese_fiction.json"), help="RAG 配置文件")
+    parser.add_argument("--backends", default="torch,int8,onnx", help="对比的后端，逗号分隔；始终以 torch 为基准")
+    parser.add_argument("--num-threads", type=int, default=0, help="计算线程数，0 表示默认")
+    parser.add_argument("--onnx-file", default=None, help="onnx 后端使用的模型文件（相对模型目录）")
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="带证据标注的 JSONL 问题集")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="语料文件")
+    parser.add_argument("--corpus-chars", type=int, default=100000, help="截取的语料字符数，0 表示全文")
+    parser.add_argument("--chunk-chars", type=int, default=200, help="每个 chunk 的字数")
+    parser.add_argument("--top-k", type=int, default=5, help="检索结果数")
+    parser.add_argument("--batch-size", type=int, default=32, help="批量编码的批大小")
+    parser.add_argument("--repeat", type=int, default=3, help="单条查询延迟的重复轮数")
+    parser.add_argument("--output", default=None, help="结果文件，默认写入 bench_results/")
+    args = parser.parse_args()
+
+    if not args.model:
+        with open(args.config, "r", encoding="utf-8") as f:
+            args.model = json.load(f)["embedding_model"]
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        raise SystemExit(f"未知的后端: {unknown}，可选: {BACKENDS}")
+    backends = ["torch"] + [b for b in backends if b != "torch"]
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        text = f.read()
+    if args.corpus_chars > 0:
+        text = text[:args.corpus_chars]
+    chunks = split_chunks(text, args.chunk_chars)
+    questions = [q for q in load_questions(Path(args.questions)) if any(e in text for e in q["evidence"])]
+    print(f"模型 {args.model}，{len(chunks)} 个 chunk，{len(questions)} 个问题")
+
+    rows = []
+    reference = None
+    for backend in backends:
+        row, vectors = bench_backend(backend, args, questions, chunks, reference)
+        reference = reference or vectors
+        rows.append(row)
+        print(f"  完成: {backend}")
+
+    print(format_table(rows, args.top_k))
+    output = Path(args.output) if args.output else (
+        REPO_ROOT / "bench_results" / f"embedding_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+            "results": rows
+        }, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""检索质量与延迟的离线评估
+
+为多组配置（嵌入模型、chunk_size、HNSW 参数等）并行建库，用带标注的问题集批量检索，
+并排报告 recall@k、MRR、索引大小、建库耗时和查询延迟。命中的判定方式是检索到的
+chunk 中包含问题的任一证据片段。
+
+用法:
+    python -m src.benchmarks.eval_retrieval --grid src/benchmarks/data/retrieval_grid.json --jobs 2
+    python -m src.benchmarks.eval_retrieval --min-recall 0.8 --recall-k 5
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from src.benchmarks.run_bench import (
+    REPO_ROOT, DEFAULT_CORPUS, DEFAULT_QUESTIONS, load_questions, summarize, git_commit
+)
+
+DEFAULT_GRID = Path(__file__).parent / "data" / "retrieval_grid.json"
+DEFAULT_BASE_CONFIG = REPO_ROOT / "config" / "chinese_fiction.json"
+
+# 配置项中属于 vector_store 段的字段
+VECTOR_STORE_KEYS = ("chunk_size", "chunk_overlap", "hnsw")
+
+
+def build_config(base: dict, spec: dict, workdir: Path, corpus_path: Path) -> dict:
+    """在基础配置上应用一组评估参数，向量库写入该配置独立的目录"""
+    config = json.loads(json.dumps(base))
+    # 评估只针对单个语料的集合
+    config.pop("corpus_manifest", None)
+    config.pop("corpus_overlay", None)
+    vector_store = config.setdefault("vector_store", {})
+    collection_name = "eval_" + "".join(c if c.isalnum() else "_" for c in spec["name"])
+    db_path = str(workdir / spec["name"] / "chroma_db")
+    corpus_dir = str(workdir / spec["name"] / "corpus_store")
+
+    model = spec.get("embedding_model", config.get("embedding_model"))
+    vector_store.update({
+        "collection_name": collection_name,
+        "model_name": model,
+        "db_path": db_path,
+        "corpus_dir": corpus_dir,
+        "default_input_file": str(corpus_path)
+    })
+    for key in VECTOR_STORE_KEYS:
+        if key in spec:
+            vector_store[key] = spec[key]
+    # 嵌入推理后端，例如 {"backend": "int8"}
+    if "embedding" in spec:
+        config["embedding"] = spec["embedding"]
+    config.update({
+        "chroma_db_path": db_path,
+        "corpus_dir": corpus_dir,
+        "collection_name": collection_name,
+        "embedding_model": model
+    })
+    return config
+
+
+def directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def first_hit_rank(results: List[dict], evidence: Sequence[str]) -> Optional[int]:
+    """返回第一个包含证据片段的结果排名（从 1 开始），未命中返回 None"""
+    for rank, item in enumerate(results, 1):
+        if any(e in (item.get("text") or "") for e in evidence):
+            return rank
+    return None
+
+
+def score(ranks: List[Optional[int]], ks: Sequence[int]) -> Dict[str, float]:
+    """计算 recall@k 与 MRR"""
+    total = len(ranks) or 1
+    metrics = {f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / total, 4) for k in ks}
+    metrics["mrr"] = round(sum(1.0 / r for r in ranks if r) / total, 4)
+    return metrics
+
+
+def evaluate_config(spec: dict, base: dict, corpus_path: str, questions: List[dict], workdir: str,
+                    ks: Sequence[int], batch_size: int, num_threads: int) -> dict:
+    """在独立进程中为一组配置建库并评估"""
+    import torch
+    torch.set_num_threads(num_threads)
+
+    from src.generate_db.write_db import ChromaVectorStore
+    from src.core.retrieve_related import VectorRetriever
+
+    workdir = Path(workdir)
+    config = build_config(base, spec, workdir, Path(corpus_path))
+    config_path = workdir / spec["name"] / "config.json"
+    config_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    start = time.perf_counter()
+    store = ChromaVectorStore(config_file=str(config_path))
+    num_chunks = store.store_texts_from_file(corpus_path)
+    build_time = time.perf_counter() - start
+    del store
+
+    retriever = VectorRetriever(str(config_path))
+    top_k = max(ks)
+    texts = [q["question"] for q in questions]
+    retriever.warm_up()
+
+    # 批量检索：用于质量指标和批处理吞吐
+    results: List[List[dict]] = []
+    batch_latencies = []
+    batch_start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        t0 = time.perf_counter()
+        results.extend(retriever.retrieve_batch(batch, top_k=top_k))
+        # 按查询平摊批次耗时
+        batch_latencies.extend([(time.perf_counter() - t0) / len(batch)] * len(batch))
+    batch_wall = time.perf_counter() - batch_start
+
+    # 单条检索：对应在线聊天时的查询延迟
+    single_latencies = []
+    single_start = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        retriever.retrieve(text, top_k=top_k)
+        single_latencies.append(time.perf_counter() - t0)
+    single_wall = time.perf_counter() - single_start
+
+    ranks = [first_hit_rank(r, q["evidence"]) for r, q in zip(results, questions)]
+    return {
+        "name": spec["name"],
+        "spec": spec,
+        "chunks": num_chunks,
+        "build_time_s": round(build_time, 3),
+        "index_bytes": directory_size(Path(config["chroma_db_path"])),
+        "corpus_bytes": directory_size(Path(config["corpus_dir"])),
+        **score(ranks, ks),
+        "query_latency": summarize(single_latencies, single_wall),
+        "batch_latency": summarize(batch_latencies, batch_wall),
+        "misses": [q["id"] for q, r in zip(questions, ranks) if r is None]
+    }
+
+
+def format_table(rows: List[dict], ks: Sequence[int]) -> str:
+    headers = ["name", "chunks", "build_s", "index_MB"] + [f"R@{k}" for k in ks] + ["MRR", "p50_ms", "p95_ms", "batch_p50_ms"]
+    lines = [" | ".join(headers)]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['name']} | 失败: {row['error']}")
+            continue
+        values = [
+            row["name"], row["chunks"], row["build_time_s"], round(row["index_bytes"] / 2 ** 20, 2),
+            *[row[f"recall@{k}"] for k in ks], row["mrr"],
+            row["query_latency"]["p50"], row["query_latency"]["p95"], row["batch_latency"]["p50"]
+        ]
+        lines.append(" | ".join(str(v) for v in values))
+    return "\n".join(lines)
+
+
+def pick_cheapest(rows: List[dict], recall_k: int, min_recall: float) -> Optional[dict]:
+    """在达到召回要求的配置中选择查询延迟最低、索引最小的一组"""
+    passing = [r for r in rows if "error" not in r and r.get(f"recall@{recall_k}", 0) >= min_recall]
+    if not passing:
+        return None
+    return min(passing, key=lambda r: (r["query_latency"]["p50"], r["index_bytes"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索质量与延迟的离线评估")
+    parser.add_argument("--grid", default=str(DEFAULT_GRID), help="待评估的配置列表（JSON 数组）")
+    parser.add_argument("--base-config", default=str(DEFAULT_BASE_CONFIG), help="基础配置文件")
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="带证据标注的 JSONL 问题集")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="语料文件")
+    parser.add_argument("--corpus-chars", type=int, default=0, help="截取的语料字符数，0 表示全文")
+    parser.add_argument("--ks", default="1,3,5,10", help="计算 recall@k 的 k 值，逗号分隔")
+    parser.add_argument("--batch-size", type=int, default=16, help="批量检索的批大小")
+    parser.add_argument("--jobs", type=int, default=2, help="并行建库的进程数")
+    parser.add_argument("--recall-k", type=int, default=5, help="质量门槛使用的 k")
+    parser.add_argument("--min-recall", type=float, default=0.8, help="质量门槛：recall@k 的最低值")
+    parser.add_argument("--workdir", default=None, help="工作目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--output", default=None, help="结果文件，默认写入 bench_results/")
+    args = parser.parse_args()
+
+    ks = sorted({int(k) for k in args.ks.split(",") if k.strip()} | {args.recall_k})
+    with open(args.grid, "r", encoding="utf-8") as f:
+        specs = json.load(f)
+    with open(args.base_config, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_eval_")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        text = f.read()
+    if args.corpus_chars > 0:
+        text = text[:args.corpus_chars]
+    corpus_path = workdir / "corpus.txt"
+    corpus_path.write_text(text, encoding="utf-8")
+    questions = [q for q in load_questions(Path(args.questions)) if any(e in text for e in q["evidence"])]
+    print(f"评估 {len(specs)} 组配置，{len(questions)} 个问题")
+
+    # 每个进程各自加载模型，平分 CPU 核心避免线程超额订阅；spawn 避免 fork 带上已初始化的 torch 状态
+    jobs = max(1, min(args.jobs, len(specs)))
+    num_threads = max(1, (os.cpu_count() or 1) // jobs)
+    rows = []
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(evaluate_config, spec, base, str(corpus_path), questions,
+                            str(workdir), ks, args.batch_size, num_threads)
+                for spec in specs
+            ]
+            for spec, future in zip(specs, futures):
+                try:
+                    rows.append(future.result())
+                except Exception as e:
+                    rows.append({"name": spec["name"], "spec": spec, "error": str(e)})
+                print(f"  完成: {spec['name']}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_table(rows, ks))
+    best = pick_cheapest(rows, args.recall_k, args.min_recall)
+    if best:
+        print(f"满足 recall@{args.recall_k} >= {args.min_recall} 的最低成本配置: {best['name']}")
+    else:
+        print(f"没有配置满足 recall@{args.recall_k} >= {args.min_recall}")
+
+    output = Path(args.output) if args.output else (
+        REPO_ROOT / "bench_results" / f"eval_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "params": {
+                "questions": len(questions),
+                "corpus_chars": len(text),
+                "ks": ks,
+                "batch_size": args.batch_size,
+                "recall_k": args.recall_k,
+                "min_recall": args.min_recall
+            },
+            "results": rows,
+            "recommended": best["name"] if best else None
+        }, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""prompt 构建的微基准：预编译模板 vs 每次调用都经过 langchain PromptTemplate 的旧路径
+
+旧路径按原来的 PromptManager 实现：三个 PromptTemplate 各 format 一次，每次查询重新拼接
+用户提示词，用 += 累加上下文。两条路径使用同一组模板，先校验输出完全一致再计时。
+另外报告同一用户不同问题之间 prompt 的公共前缀长度（上游前缀缓存可复用的部分）。
+
+用法:
+    python -m src.benchmarks.prompt_bench --iterations 20000 --docs 5
+"""
+
+import os
+import time
+import argparse
+from typing import Callable, Dict, List
+
+from src.benchmarks.run_bench import summarize
+from src.prompts.manager import PromptManager, RECENT_TURNS
+from src.prompts.templates import (
+    SYSTEM_PROMPT, USER_PROMPTS, CONTEXT_TEMPLATE, QA_TEMPLATE, HISTORY_TEMPLATE, MEMORY_TEMPLATE
+)
+
+USER_ID = 1234
+
+
+class LegacyPromptBuilder:
+    """旧版 PromptManager 的 prompt 构建路径"""
+
+    def __init__(self, user_id: int):
+        from langchain.prompts import PromptTemplate
+
+        self.user_id = user_id
+        self.context_template = PromptTemplate(input_variables=["context"], template=CONTEXT_TEMPLATE)
+        self.qa_template = PromptTemplate(
+            input_variables=["system_prompt", "context_template", "memory_template", "question", "user_prompt"],
+            template=QA_TEMPLATE
+        )
+        self.history_template = PromptTemplate(
+            input_variables=["summary", "history", "question"], template=HISTORY_TEMPLATE
+        )
+        self.memory_template = PromptTemplate(input_variables=["memory"], template=MEMORY_TEMPLATE)
+
+    def build(self, retrieved_docs: List[Dict], question: str, history: List[str], memories: List[Dict]) -> str:
+        context = ""
+        for doc in retrieved_docs:
+            context += f"{doc['text']}\n\n"
+        context_str = self.context_template.format(context=context.strip()) if retrieved_docs else ""
+        user_prompt = USER_PROMPTS.get(self.user_id, USER_PROMPTS[0])
+        user_prompt = "\n".join([user_prompt["style"], user_prompt["constraints"]])
+        if history:
+            question = self.history_template.format(summary="", history="\n\n".join(history), question=question)
+        memory_str = self.memory_template.format(memory="\n\n".join(m["text"] for m in memories)) if memories else ""
+        return self.qa_template.format(
+            system_prompt=SYSTEM_PROMPT,
+            context_template=context_str,
+            memory_template=memory_str,
+            question=question,
+            user_prompt=user_prompt
+        )
+
+
+def make_inputs(num_docs: int, doc_chars: int, count: int) -> List[dict]:
+    """生成 count 组不同的检索结果、问题、历史与召回记忆"""
+    inputs = []
+    for i in range(count):
+        inputs.append({
+            "retrieved_docs": [{"text": f"第{i}-{j}段：" + "贾宝玉林黛玉" * (doc_chars // 6)} for j in range(num_docs)],
+            "question": f"第{i}个问题：黛玉是什么时候进贾府的？",
+            "history": [f"Q: 历史问题{i}-{k}\nA: 历史回答{i}-{k}" for k in range(RECENT_TURNS)],
+            "memories": [{"text": f"Q: 早期问题{i}\nA: 早期回答{i}"}]
+        })
+    return inputs
+
+
+def time_calls(fn: Callable[[dict], str], inputs: List[dict], iterations: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(inputs[i % len(inputs)])
+        latencies.append(time.perf_counter() - t0)
+    stats = summarize(latencies, time.perf_counter() - start)
+    stats["mean_us"] = round(stats["mean_ms"] * 1000, 2)
+    return stats
+
+
+def common_prefix_length(prompts: List[str]) -> int:
+    return len(os.path.commonprefix(prompts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt 构建微基准")
+    parser.add_argument("--iterations", type=int, default=20000, help="每条路径的调用次数")
+    parser.add_argument("--docs", type=int, default=5, help="每次查询的检索片段数")
+    parser.add_argument("--doc-chars", type=int, default=200, help="每个检索片段的字数")
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.docs, args.doc_chars, 64)
+    manager = PromptManager(USER_ID)
+
+    def compiled(item: dict) -> str:
+        manager.history = item["history"]
+        return manager.get_qa_prompt(item["retrieved_docs"], item["question"], use_history=True,
+                                     memories=item["memories"])
+
+    paths = {"compiled": compiled}
+    try:
+        legacy_builder = LegacyPromptBuilder(USER_ID)
+        paths["langchain"] = lambda item: legacy_builder.build(
+            item["retrieved_docs"], item["question"], item["history"], item["memories"]
+        )
+    except ImportError:
+        print("未安装 langchain，跳过旧路径")
+
+    # 两条路径的输出必须一致，否则计时没有意义
+    if "langchain" in paths:
+        for item in inputs:
+            if paths["compiled"](item) != paths["langchain"](item):
+                raise SystemExit("预编译模板与旧路径的输出不一致")
+
+    results = {name: time_calls(fn, inputs, args.iterations) for name, fn in paths.items()}
+    prompts = [compiled(item) for item in inputs]
+    prefix = common_prefix_length(prompts)
+
+    print("path | mean_us | p50_ms | p99_ms | calls/s")
+    for name, stats in results.items():
+        print(f"{name} | {stats['mean_us']} | {stats['p50']} | {stats['p99']} | {stats['throughput']}")
+    if "langchain" in results:
+        speedup = results["langchain"]["mean_ms"] / max(results["compiled"]["mean_ms"], 1e-9)
+        print(f"加速比: {speedup:.1f}x")
+    print(f"静态前缀: {len(manager.static_prefix)} 字符，{len(prompts)} 个不同请求的公共前缀: {prefix} 字符，"
+          f"平均 prompt 长度: {sum(map(len, prompts)) // len(prompts)} 字符")
+
+
+if __name__ == "__main__":
+    main()
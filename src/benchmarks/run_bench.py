@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""RAG 聊天链路的端到端基准测试
+
+覆盖四个环节：
+    ingest   ChromaVectorStore 切分、编码并写入向量库
+    retrieve VectorRetriever.retrieve 的检索延迟
+    session  SessionManager 的会话读写
+    chat     通过后端 /chat 接口的完整请求（LLM 由本地桩服务代替）
+
+所有数据写入独立的工作目录，默认使用小型嵌入模型以便在 CPU 上运行。
+结果保存为 JSON，可用 --compare 与基线对比。
+
+用法:
+    python -m src.benchmarks.run_bench --suites ingest,retrieve,session,chat --concurrency 4
+    python -m src.benchmarks.run_bench --suites retrieve --compare bench_results/baseline.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import shutil
+import socket
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import http.client
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CORPUS = REPO_ROOT / "resources" / "红楼梦.txt"
+DEFAULT_QUESTIONS = Path(__file__).parent / "data" / "hongloumeng_qa.jsonl"
+DEFAULT_MODEL = "BAAI/bge-small-zh-v1.5"
+ALL_SUITES = ("ingest", "retrieve", "session", "chat")
+
+# 对比基线时，这些指标越大越差；throughput 越小越差
+LATENCY_KEYS = ("p50", "p95", "p99")
+
+
+def load_questions(path: Path) -> List[dict]:
+    """读取 JSONL 问题集，每行包含 id、question、evidence"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法求百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(latencies: List[float], wall_time: float, errors: int = 0) -> Dict[str, float]:
+    """汇总延迟分布（毫秒）与吞吐量（次/秒）"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "count": count,
+        "errors": errors,
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else 0.0,
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if count else 0.0,
+        "throughput": round(count / wall_time, 3) if wall_time > 0 else 0.0,
+        "wall_time_s": round(wall_time, 3)
+    }
+
+
+def run_concurrently(fn: Callable[[int], None], total: int, concurrency: int) -> Dict[str, float]:
+    """以给定并发执行 fn(i) 共 total 次，返回延迟统计"""
+    latencies: List[float] = []
+    errors = 0
+
+    def call(i: int):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(call, i) for i in range(total)]:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"  请求失败: {e}")
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def self_peak_rss_mb() -> float:
+    """当前进程的峰值 RSS（Linux 下 ru_maxrss 单位为 KB，macOS 下为字节）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def process_peak_rss_mb(pid: int) -> Optional[float]:
+    """读取其他进程的峰值 RSS，仅支持 Linux"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class BenchContext:
+    """基准测试的工作目录：语料切片、独立的向量库、会话目录和配置文件"""
+
+    def __init__(self, workdir: Path, corpus: Path, corpus_chars: int, model: str, questions: List[dict]):
+        self.workdir = workdir
+        self.workdir.mkdir(parents=True, exist_ok=True)
+
+        with open(corpus, "r", encoding="utf-8") as f:
+            text = f.read()
+        if corpus_chars > 0:
+            text = text[:corpus_chars]
+        self.corpus_chars = len(text)
+        self.corpus_path = workdir / "corpus.txt"
+        self.corpus_path.write_text(text, encoding="utf-8")
+
+        # 只保留证据落在语料切片内的问题
+        self.questions = [q for q in questions if any(e in text for e in q["evidence"])] or questions
+        self.db_path = workdir / "chroma_db"
+        self.corpus_dir = workdir / "corpus_store"
+        self.history_dir = workdir / "history"
+        self.config_path = workdir / "bench_config.json"
+
+        collection_name = "bench_" + uuid.uuid4().hex[:8]
+        config = {
+            "vector_store": {
+                "collection_name": collection_name,
+                "model_name": model,
+                "db_path": str(self.db_path),
+                "default_input_file": str(self.corpus_path),
+                "chunk_size": 200,
+                "chunk_overlap": 50,
+                "corpus_dir": str(self.corpus_dir)
+            },
+            "chroma_db_path": str(self.db_path),
+            "corpus_dir": str(self.corpus_dir),
+            "collection_name": collection_name,
+            "embedding_model": model,
+            "max_results": 5
+        }
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def bench_ingest(ctx: BenchContext, args) -> dict:
+    from src.generate_db.write_db import ChromaVectorStore
+
+    store = ChromaVectorStore(config_file=str(ctx.config_path))
+    start = time.perf_counter()
+    num_chunks = store.store_texts_from_file(str(ctx.corpus_path))
+    elapsed = time.perf_counter() - start
+    return {
+        "chunks": num_chunks,
+        "corpus_chars": ctx.corpus_chars,
+        "wall_time_s": round(elapsed, 3),
+        "throughput": round(num_chunks / elapsed, 3) if elapsed > 0 else 0.0,
+        "peak_rss_mb": self_peak_rss_mb()
+    }
+
+
+def bench_retrieve(ctx: BenchContext, args) -> dict:
+    from src.core.retrieve_related import VectorRetriever
+
+    retriever = VectorRetriever(str(ctx.config_path))
+    questions = [q["question"] for q in ctx.questions]
+    # 预热一次，避免首次编码的初始化开销计入统计
+    retriever.retrieve(questions[0])
+
+    result = run_concurrently(
+        lambda i: retriever.retrieve(questions[i % len(questions)]),
+        len(questions) * args.repeat, args.concurrency
+    )
+    result["peak_rss_mb"] = self_peak_rss_mb()
+    return result
+
+
+def bench_session(ctx: BenchContext, args) -> dict:
+    from src.core.session_manager import SessionManager
+
+    manager = SessionManager(base_dir=str(ctx.history_dir))
+    session_ids = [manager.create_session(f"bench-{i}") for i in range(args.concurrency)]
+    questions = [q["question"] for q in ctx.questions]
+
+    def write_and_read(i: int):
+        session_id = session_ids[i % len(session_ids)]
+        manager.save_message(session_id, {"role": "user", "content": questions[i % len(questions)]})
+        manager.get_session(session_id)
+
+    result = run_concurrently(write_and_read, len(questions) * args.repeat, args.concurrency)
+    result["peak_rss_mb"] = self_peak_rss_mb()
+    return result
+
+
+def _post_json(port: int, path: str, payload: dict, headers: Optional[dict] = None, timeout: float = 120):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        conn.request("POST", path, body, {"Content-Type": "application/json", **(headers or {})})
+        response = conn.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {data[:200]!r}")
+        return json.loads(data)
+    finally:
+        conn.close()
+
+
+def _wait_ready(port: int, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"后端进程已退出，返回码 {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/ready")
+            status = conn.getresponse().status
+            conn.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"后端在 {timeout} 秒内未就绪")
+
+
+def bench_chat(ctx: BenchContext, args) -> dict:
+    from src.benchmarks.stub_llm import start_stub_llm
+
+    stub = start_stub_llm(latency=args.llm_latency)
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")])),
+        "RAG_CONFIG_PATH": str(ctx.config_path),
+        "LLM_BASE_URL": f"http://127.0.0.1:{stub.server_address[1]}/v1",
+        "DASHSCOPE_API_KEY": "stub"
+    })
+    # 后端以工作目录为 cwd 启动，会话等相对路径都落在工作目录内
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.backend.server_runner", "--port", str(port),
+         "--workers", str(args.backend_workers)],
+        cwd=ctx.workdir, env=env,
+        stdout=subprocess.DEVNULL if not args.verbose else None,
+        stderr=subprocess.DEVNULL if not args.verbose else None
+    )
+    try:
+        start = time.perf_counter()
+        _wait_ready(port, process, args.ready_timeout)
+        ready_time = time.perf_counter() - start
+
+        questions = [q["question"] for q in ctx.questions]
+
+        def chat(i: int):
+            # 每个并发槽位使用独立客户端，模拟多个用户
+            _post_json(port, "/chat", {
+                "messages": [{"role": "user", "content": questions[i % len(questions)]}]
+            }, headers={"X-Client-Id": f"bench-{i % args.concurrency}"})
+
+        result = run_concurrently(chat, len(questions) * args.repeat, args.concurrency)
+        result["ready_time_s"] = round(ready_time, 3)
+        result["llm_latency_s"] = args.llm_latency
+        result["backend_peak_rss_mb"] = process_peak_rss_mb(process.pid)
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        stub.shutdown()
+
+
+SUITES = {
+    "ingest": bench_ingest,
+    "retrieve": bench_retrieve,
+    "session": bench_session,
+    "chat": bench_chat
+}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """与基线对比，返回超过阈值的退化项"""
+    regressions = []
+    for suite, current in results["suites"].items():
+        previous = baseline.get("suites", {}).get(suite)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        print(f"[{suite}]")
+        for key in LATENCY_KEYS + ("throughput",):
+            if key not in current or not previous.get(key):
+                continue
+            change = (current[key] - previous[key]) / previous[key]
+            worse = change > threshold if key in LATENCY_KEYS else change < -threshold
+            flag = "  <-- 退化" if worse else ""
+            print(f"  {key:>10}: {previous[key]:>10} -> {current[key]:>10} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append(f"{suite}.{key} {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 聊天链路端到端基准测试")
+    parser.add_argument("--suites", default=",".join(ALL_SUITES), help="要运行的测试，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发数")
+    parser.add_argument("--repeat", type=int, default=3, help="问题集重复次数")
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="JSONL 问题集")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="语料文件")
+    parser.add_argument("--corpus-chars", type=int, default=200000, help="截取的语料字符数，0 表示全文")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="嵌入模型")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="桩 LLM 的模拟延迟（秒）")
+    parser.add_argument("--backend-workers", type=int, default=1, help="chat 测试的后端工作进程数")
+    parser.add_argument("--ready-timeout", type=float, default=300, help="等待后端就绪的超时（秒）")
+    parser.add_argument("--workdir", default=None, help="工作目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--output", default=None, help="结果文件，默认写入 bench_results/")
+    parser.add_argument("--compare", default=None, help="对比的基线结果文件")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定退化的相对变化阈值")
+    parser.add_argument("--verbose", action="store_true", help="显示后端输出")
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        parser.error(f"未知的测试: {', '.join(unknown)}")
+    # retrieve 和 chat 依赖向量库，没有单独指定 ingest 时也先建库
+    if any(s in suites for s in ("retrieve", "chat")) and "ingest" not in suites:
+        suites.insert(0, "ingest")
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="rag_bench_"))
+    ctx = BenchContext(workdir.resolve(), Path(args.corpus), args.corpus_chars,
+                       args.model, load_questions(Path(args.questions)))
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "platform": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "cpu_count": os.cpu_count()
+        },
+        "params": {
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "model": args.model,
+            "corpus_chars": args.corpus_chars,
+            "questions": len(ctx.questions),
+            "llm_latency": args.llm_latency,
+            "backend_workers": args.backend_workers
+        },
+        "suites": {}
+    }
+
+    try:
+        for suite in suites:
+            print(f"运行 {suite} ...")
+            try:
+                results["suites"][suite] = SUITES[suite](ctx, args)
+            except Exception as e:
+                results["suites"][suite] = {"error": str(e)}
+            print(f"  {json.dumps(results['suites'][suite], ensure_ascii=False)}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = Path(args.output) if args.output else (
+        REPO_ROOT / "bench_results" / f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能退化: {'; '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""OpenAI 兼容的本地桩 LLM 服务，用于在不访问外部 API 的情况下压测聊天链路
+
+用法:
+    python -m src.benchmarks.stub_llm --port 9100 --latency 0.2
+"""
+
+import json
+import time
+import argparse
+import threading
+import http.server
+
+
+class StubLLMHandler(http.server.BaseHTTPRequestHandler):
+    """对 /chat/completions 返回固定回答，并模拟固定的生成延迟"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    answer = "这是桩服务返回的回答。"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in request.get("messages", []))
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars,
+                "completion_tokens": len(self.answer),
+                "total_tokens": prompt_chars + len(self.answer)
+            }
+        }, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_llm(port: int = 0, latency: float = 0.0) -> http.server.ThreadingHTTPServer:
+    """在后台线程中启动桩服务，返回服务器对象（port=0 时自动分配端口）"""
+
+    class Handler(StubLLMHandler):
+        pass
+
+    Handler.latency = latency
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的桩 LLM 服务")
+    parser.add_argument("--port", type=int, default=9100, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次请求的模拟延迟（秒）")
+    args = parser.parse_args()
+
+    server = start_stub_llm(args.port, args.latency)
+    print(f"桩 LLM 服务已启动: http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""离线批量问答
+
+从 JSONL 文件读取问题，按批检索（每批只编码一次），以有限并发调用 LLM，每完成一个
+问题就向输出 JSONL 追加一行（答案、来源与各阶段耗时）。输出文件同时是断点记录：
+重新运行时跳过已成功的问题，并从输出中移除将要重试的失败记录，每个问题只保留一行。
+
+输入每行是一个 JSON 对象，问题字段默认 question，ID 字段默认 id（缺失时使用行号）。
+无法解析的行会带行号提示后跳过。
+
+用法:
+    python -m src.core.batch_qa --input questions.jsonl --output answers.jsonl --concurrency 8
+    python -m src.core.batch_qa --input requests.jsonl --question-field body --id-field request_id
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def read_questions(path: str, question_field: str, id_field: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取问题，不一次性加载整个文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print(f"第 {line_number} 行不是合法的 JSON，已跳过: {e}", file=sys.stderr)
+                continue
+            if not isinstance(record, dict):
+                print(f"第 {line_number} 行不是 JSON 对象，已跳过", file=sys.stderr)
+                continue
+            question = record.get(question_field)
+            if not isinstance(question, str) or not question.strip():
+                print(f"第 {line_number} 行缺少问题字段 {question_field}，已跳过", file=sys.stderr)
+                continue
+            yield {"id": str(record.get(id_field, line_number)), "line": line_number, "question": question}
+
+
+def completed_ids(path: str, retry_errors: bool = True) -> Set[str]:
+    """读取已有输出中完成的问题 ID，并整理输出文件
+
+    进程中断时最后一行可能只写了一半：截断到最后一个完整行，后续追加不会与残行拼接。
+    同一问题有多行记录时只保留一行（成功的记录优先，其次是最新的记录）；需要重试的
+    失败记录从输出中移除，重试结果追加后每个问题仍只有一行。
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+
+    lines = data.decode("utf-8").splitlines()
+    kept: Dict[str, str] = {}
+    ok: Set[str] = set()
+    for line in lines:
+        try:
+            record = json.loads(line)
+            record_id = record["id"]
+        except (ValueError, TypeError, KeyError):
+            continue
+        if record_id in ok:
+            continue
+        if record.get("status") == "ok":
+            ok.add(record_id)
+            kept[record_id] = line
+        elif not retry_errors:
+            kept[record_id] = line
+
+    if len(kept) != len(lines):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in kept.values())
+        os.replace(tmp_path, path)
+    return set(kept)
+
+
+def batched(items: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BatchRunner:
+    """批量问答执行器：检索按批进行，LLM 调用以固定并发执行，结果流式写出"""
+
+    def __init__(self, retriever, llm, prompt_manager, output, batch_size: int = 32, concurrency: int = 8,
+                 max_retries: int = 2, compressor=None):
+        """
+        Args:
+            retriever (VectorRetriever): 检索器
+            llm: 支持 ainvoke 的聊天模型
+            prompt_manager (PromptManager): prompt 构建器（批量模式不使用对话历史）
+            output: 以追加模式打开的输出文件
+            batch_size (int): 每批检索的问题数
+            concurrency (int): 同时进行的 LLM 调用数
+            max_retries (int): LLM 调用失败后的重试次数
+            compressor (ContextCompressor): 检索上下文后处理，None 表示原样使用检索结果
+        """
+        self.retriever = retriever
+        self.llm = llm
+        self.prompt_manager = prompt_manager
+        self.output = output
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.compressor = compressor
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def _write(self, record: Dict[str, Any]):
+        # 所有写入都在事件循环线程中进行，逐行写出并刷新，中断时最多丢失正在进行的问题
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def _answer(self, item: Dict[str, Any], prompt: str, sources: List[dict], retrieval_ms: float,
+                      semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            record = {"id": item["id"], "line": item["line"], "question": item["question"]}
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self.llm.ainvoke(prompt)
+                    record.update({"status": "ok", "answer": response.content})
+                    break
+                except Exception as e:
+                    record.update({"status": "error", "error": str(e)})
+                    if attempt < self.max_retries:
+                        await asyncio.sleep(2 ** attempt)
+            llm_ms = (time.perf_counter() - start) * 1000
+        if record["status"] != "ok":
+            self.errors += 1
+        self.latencies.append((retrieval_ms + llm_ms) / 1000)
+        record.update({
+            "sources": sources,
+            "timings": {
+                "retrieval_ms": round(retrieval_ms, 2),
+                "llm_ms": round(llm_ms, 2),
+                "total_ms": round(retrieval_ms + llm_ms, 2)
+            }
+        })
+        self._write(record)
+
+    async def run(self, items: Iterator[Dict[str, Any]]) -> int:
+        """处理全部问题，返回处理的问题数
+
+        检索下一批与当前批次的 LLM 调用重叠进行；在途的问题数超过两批时暂停检索，控制内存占用。
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending: Set[asyncio.Task] = set()
+        max_pending = max(self.batch_size, self.concurrency) * 2
+        count = 0
+        for batch in batched(items, self.batch_size):
+            start = time.perf_counter()
+            try:
+                results = await asyncio.to_thread(self.retriever.retrieve_batch, [item["question"] for item in batch])
+            except Exception as e:
+                # 检索失败的批次整体记为失败，续跑时重试
+                for item in batch:
+                    self.errors += 1
+                    self._write({**item, "status": "error", "error": f"检索失败: {e}"})
+                count += len(batch)
+                continue
+            # 批次检索耗时按问题平摊
+            retrieval_ms = (time.perf_counter() - start) * 1000 / len(batch)
+            for item, docs in zip(batch, results):
+                if self.compressor:
+                    docs = self.compressor.compress(item["question"], docs)
+                prompt = self.prompt_manager.get_qa_prompt(retrieved_docs=docs, question=item["question"])
+                sources = [
+                    {"corpus": doc.get("corpus"), "source": (doc.get("metadata") or {}).get("source"),
+                     "chunk": (doc.get("metadata") or {}).get("chunk"), "distance": doc.get("distance")}
+                    for doc in docs
+                ]
+                pending.add(asyncio.create_task(self._answer(item, prompt, sources, retrieval_ms, semaphore)))
+            count += len(batch)
+            while len(pending) >= max_pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            await asyncio.gather(*pending)
+        return count
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="离线批量问答")
+    parser.add_argument("--input", required=True, help="问题 JSONL 文件")
+    parser.add_argument("--output", required=True, help="答案 JSONL 文件，已存在时跳过其中已完成的问题")
+    parser.add_argument("--config", default="./config/chinese_fiction.json", help="RAG 配置文件")
+    parser.add_argument("--question-field", default="question", help="问题字段名")
+    parser.add_argument("--id-field", default="id", help="ID 字段名，缺失时使用行号")
+    parser.add_argument("--batch-size", type=int, default=32, help="每批检索的问题数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的 LLM 调用数")
+    parser.add_argument("--max-retries", type=int, default=2, help="LLM 调用失败后的重试次数")
+    parser.add_argument("--no-retry-errors", action="store_true", help="续跑时不重试上次失败的问题")
+    args = parser.parse_args(argv)
+
+    done = completed_ids(args.output, retry_errors=not args.no_retry_errors)
+    items = (item for item in read_questions(args.input, args.question_field, args.id_field)
+             if item["id"] not in done)
+    if done:
+        print(f"跳过已完成的 {len(done)} 个问题")
+
+    from src.core.rag_system import RAGSystem
+    system = RAGSystem(config_path=args.config)
+    system.retriever.warm_up()
+
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as output:
+        runner = BatchRunner(system.retriever, system.llm, system.prompt_manager, output,
+                             batch_size=args.batch_size, concurrency=args.concurrency,
+                             max_retries=args.max_retries, compressor=system.compressor)
+        count = asyncio.run(runner.run(items))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(runner.latencies)
+    p50 = latencies[len(latencies) // 2] if latencies else 0.0
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+    print(f"完成 {count} 个问题，失败 {runner.errors} 个，耗时 {wall:.1f} 秒，"
+          f"吞吐 {count / wall if wall > 0 else 0:.2f} 个/秒，单题 p50 {p50 * 1000:.0f} ms，p95 {p95 * 1000:.0f} ms")
+    if runner.errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
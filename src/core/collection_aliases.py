@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""集合别名：逻辑集合名到实际 Chroma 集合的映射
+
+重建索引时先写入一个新的影子集合，建完后只替换别名文件（原子 os.replace），
+检索端通过文件的 mtime 感知变化后切换到新集合。查询要么使用完整的旧集合，
+要么使用完整的新集合，不会看到建了一半的索引。没有别名的逻辑名直接作为集合名使用。
+
+别名文件格式：
+    {"version": 3, "aliases": {"chinese_love_fiction": {"collection": "...", "source": "...",
+                                                      "previous": [...]}}}
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为进程内锁
+    fcntl = None
+
+
+class CollectionAliases:
+    """读写别名文件；读取结果按 mtime 缓存"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._thread_lock = threading.Lock()
+        self._cache: Tuple[Optional[Tuple[int, int]], Dict[str, Any]] = (None, {})
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CollectionAliases":
+        """别名文件默认放在 Chroma 数据库目录下"""
+        return cls(config.get("collection_aliases") or os.path.join(config["chroma_db_path"], "aliases.json"))
+
+    def stamp(self) -> Optional[Tuple[int, int]]:
+        """别名文件的 (mtime_ns, inode)，文件不存在时为 None；用于判断是否需要切换集合"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino
+
+    def _read(self) -> Dict[str, Any]:
+        stamp = self.stamp()
+        cached_stamp, data = self._cache
+        if stamp is not None and stamp == cached_stamp:
+            return data
+        data = {"version": 0, "aliases": {}}
+        if stamp is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        self._cache = (stamp, data)
+        return data
+
+    def resolve(self, name: str) -> str:
+        """返回逻辑名当前指向的集合名"""
+        entry = self._read()["aliases"].get(name)
+        return entry["collection"] if entry else name
+
+    def entries(self) -> Dict[str, Any]:
+        return dict(self._read()["aliases"])
+
+    @contextmanager
+    def _locked(self):
+        """跨进程互斥锁，保护别名文件的读-改-写"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_name(self.path.name + ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def flip(self, name: str, collection: str, source: str, retain: int = 1,
+             initial_source: Optional[str] = None) -> List[Dict[str, str]]:
+        """将逻辑名切换到新集合
+
+        Args:
+            name (str): 逻辑集合名
+            collection (str): 新集合名
+            source (str): 新集合对应的语料源名
+            retain (int): 保留的旧版本数，其他进程可能仍在使用刚被替换的集合
+            initial_source (Optional[str]): 逻辑名第一次切换时，原集合对应的语料源名
+
+        Returns:
+            List[Dict[str, str]]: 超出保留数、可以删除的旧版本（collection、source）
+        """
+        with self._locked():
+            self._cache = (None, {})
+            data = self._read()
+            current = data["aliases"].get(name) or {"collection": name, "source": initial_source, "previous": []}
+            previous = [{"collection": current["collection"], "source": current.get("source")}]
+            previous += current.get("previous", [])
+            data["aliases"][name] = {
+                "collection": collection,
+                "source": source,
+                "previous": previous[:retain]
+            }
+            data["version"] = data.get("version", 0) + 1
+            tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        return previous[retain:]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""检索结果进入 prompt 前的后处理：去重、按问题裁剪句子、按原文顺序排列
+
+检索返回的片段经常彼此重复（同一段文字被多次入库、书中反复出现的诗词、多个语料收录了
+同一章节），也常有大段与问题无关的叙述。这里在拼接上下文之前依次:
+    1. 去重：SimHash（字符 3-gram）汉明距离不超过阈值、或文本被已保留片段完整包含的片段被丢弃，
+       保留检索排名靠前的一份
+    2. 排序：同一来源的片段按原文 chunk 顺序排列，相邻且属于同一章节的 chunk 拼接成一段
+       （去掉首尾重叠的文字），来源之间按最佳排名排列
+    3. 裁剪（min_relevance 大于 0 时）：片段按句切分，以问题的字符二元组（按在上下文中的稀有程度加权）为句子打分，每个片段
+       保留得分不低于该片段最高分一定比例的句子及其前后各 neighbors 句，省略处以"……"标记；
+       没有任何句子与问题字面相关的片段保持原样（它们是按语义相似度检索到的）。词法打分可能删掉只在
+       语义上相关的证据句，默认不裁剪
+    4. 预算：估计的 token 数超过 token_budget 时，丢弃排名靠后的片段
+
+输入和输出都是检索结果的字典列表（text、metadata、distance、corpus），PromptManager 不需要改动。
+"""
+
+import re
+import math
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.text_utils import estimate_tokens
+from src.core.metrics import REGISTRY, timed
+
+CONTEXT_TOKENS = REGISTRY.counter(
+    "context_tokens_total",
+    "Estimated tokens of retrieved context before and after compression",
+    labelnames=("stage",)
+)
+CONTEXT_DROPPED = REGISTRY.counter(
+    "context_chunks_dropped_total",
+    "Retrieved chunks removed before prompting",
+    labelnames=("reason",)
+)
+
+# 句子：以句末标点（可跟引号）或换行结束
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?\n]*(?:[。！？!?]+[”’」』\"]*|\n|$)")
+# 不参与相关性打分的字符
+_SKIP_CHARS = set("，。！？!?、；：,.;:“”‘’「」『』（）()《》 \n\t\"'…—")
+ELLIPSIS = "……"
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """64 位 SimHash，特征为字符 n-gram（中文没有空格分词）"""
+    grams = {text[i:i + shingle] for i in range(max(1, len(text) - shingle + 1))}
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(grams), 64)
+    votes = bits.sum(axis=0) * 2 > len(grams)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_PATTERN.findall(text) if s.strip()]
+
+
+def bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)
+            if text[i] not in _SKIP_CHARS and text[i + 1] not in _SKIP_CHARS}
+
+
+def join_overlapping(first: str, second: str, min_overlap: int = 8) -> str:
+    """拼接原文中相邻的两段，去掉 first 结尾与 second 开头重叠的部分"""
+    for size in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+class ContextCompressor:
+    """检索上下文的去重、排序与裁剪"""
+
+    def __init__(self, simhash_distance: int = 3, min_relevance: float = 0.0, neighbors: int = 1,
+                 min_trim_chars: int = 120, token_budget: int = 0):
+        """
+        Args:
+            simhash_distance (int): SimHash 汉明距离不超过该值的片段视为重复
+            min_relevance (float): 句子得分不低于所在片段最高分的该比例时保留，0 表示不裁剪
+            neighbors (int): 保留相关句前后各几句，保证语义连贯
+            min_trim_chars (int): 短于该字数的片段不裁剪
+            token_budget (int): 上下文估计 token 数上限，0 表示不限制
+        """
+        self.simhash_distance = simhash_distance
+        self.min_relevance = min_relevance
+        self.neighbors = neighbors
+        self.min_trim_chars = min_trim_chars
+        self.token_budget = token_budget
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["ContextCompressor"]:
+        """根据配置中的 context_compression 段创建，未启用时返回 None"""
+        options = config.get("context_compression", {})
+        if not options.get("enabled", False):
+            return None
+        return cls(
+            simhash_distance=options.get("simhash_distance", 3),
+            min_relevance=options.get("min_relevance", 0.0),
+            neighbors=options.get("neighbors", 1),
+            min_trim_chars=options.get("min_trim_chars", 120),
+            token_budget=options.get("token_budget", 0)
+        )
+
+    def compress(self, question: str, docs: List[Dict]) -> List[Dict]:
+        """处理检索结果并记录 token 指标，返回新的结果列表（不修改输入）"""
+        if not docs:
+            return docs
+        with timed("context_compression"):
+            compressed, stats = self.compress_with_stats(question, docs)
+        CONTEXT_TOKENS.inc(stats["tokens_before"], stage="input")
+        CONTEXT_TOKENS.inc(stats["tokens_after"], stage="output")
+        for reason in ("duplicate", "budget"):
+            if stats[reason]:
+                CONTEXT_DROPPED.inc(stats[reason], reason=reason)
+        return compressed
+
+    def compress_with_stats(self, question: str, docs: List[Dict]) -> Tuple[List[Dict], Dict[str, int]]:
+        """与 compress 相同，另返回处理前后的 token 数与各步丢弃的片段数"""
+        docs = [doc for doc in docs if doc.get("text")]
+        stats = {"tokens_before": sum(estimate_tokens(doc["text"]) for doc in docs), "duplicate": 0, "budget": 0}
+
+        kept = self._deduplicate(docs)
+        stats["duplicate"] = len(docs) - len(kept)
+        passages = self._order(kept)
+        if self.min_relevance > 0:
+            passages = self._trim(question, passages)
+        if self.token_budget:
+            passages, stats["budget"] = self._fit_budget(passages)
+
+        stats["tokens_after"] = sum(estimate_tokens(doc["text"]) for doc in passages)
+        return passages, stats
+
+    def _deduplicate(self, docs: List[Dict]) -> List[Dict]:
+        """按检索排名保留每组近似重复片段中的第一个"""
+        kept: List[Tuple[int, str, Dict]] = []
+        for doc in docs:
+            text = doc["text"].strip()
+            fingerprint = simhash(text)
+            if any(text in other or hamming(fingerprint, other_hash) <= self.simhash_distance
+                   for other_hash, other, _ in kept):
+                continue
+            kept.append((fingerprint, text, doc))
+        return [doc for _, _, doc in kept]
+
+    @staticmethod
+    def _position(doc: Dict) -> Tuple[Optional[Tuple[str, str]], Optional[int], Optional[int]]:
+        """片段在原文中的位置：(语料, 来源)、起始 chunk、结束 chunk；没有位置信息时为 None"""
+        meta = doc.get("metadata") or {}
+        if "source" not in meta or "chunk" not in meta:
+            return None, None, None
+        first, last = meta.get("chunk_range") or (meta["chunk"], meta["chunk"])
+        return (doc.get("corpus"), meta["source"]), first, last
+
+    def _order(self, docs: List[Dict]) -> List[Dict]:
+        """同一来源的片段按原文顺序排列并拼接相邻 chunk；来源之间保持最佳排名的先后
+
+        编号相邻但章节不同（metadata 中的 chapter）的 chunk 跨越了章节边界，不拼接。
+        """
+        groups: Dict[Any, List[Tuple[int, int, Dict]]] = {}
+        for rank, doc in enumerate(docs):
+            key, first, last = self._position(doc)
+            # 没有位置信息的片段各自成组
+            groups.setdefault(key if key is not None else ("rank", rank), []).append((first or 0, last or 0, doc))
+
+        passages = []
+        for members in groups.values():
+            members.sort(key=lambda m: m[0])
+            current_first, current_last, current = members[0]
+            current = dict(current)
+            for first, last, doc in members[1:]:
+                same_chapter = current["metadata"].get("chapter") == doc["metadata"].get("chapter")
+                if first <= current_last + 1 and same_chapter:
+                    current["text"] = join_overlapping(current["text"], doc["text"])
+                    current["distance"] = min(current["distance"], doc["distance"])
+                    current["metadata"] = {**current["metadata"], "chunk_range": [current_first, max(current_last, last)]}
+                    current_last = max(current_last, last)
+                else:
+                    passages.append(current)
+                    current_first, current_last, current = first, last, dict(doc)
+            passages.append(current)
+        return passages
+
+    def _trim(self, question: str, passages: List[Dict]) -> List[Dict]:
+        """只保留与问题相关的句子及其邻句"""
+        terms = bigrams(question)
+        if not terms:
+            return passages
+        sentences = [split_sentences(p["text"]) for p in passages]
+        sentence_terms = [[bigrams(s) & terms for s in group] for group in sentences]
+        # 在越少句子中出现的问题二元组越有区分度（人名、地名），"什么""为何"之类权重低
+        total = sum(len(group) for group in sentences)
+        df = {t: sum(1 for group in sentence_terms for found in group if t in found) for t in terms}
+        weight = {t: math.log(1 + total / df[t]) for t in terms if df[t]}
+        scores = [[sum(weight[t] for t in found) for found in group] for group in sentence_terms]
+
+        trimmed = []
+        for passage, group, group_scores in zip(passages, sentences, scores):
+            best = max(group_scores, default=0.0)
+            if len(passage["text"]) < self.min_trim_chars or best <= 0:
+                trimmed.append(passage)
+                continue
+            threshold = best * self.min_relevance
+            keep = set()
+            for i, score in enumerate(group_scores):
+                if score >= threshold:
+                    keep.update(range(max(0, i - self.neighbors), min(len(group), i + self.neighbors + 1)))
+            parts = []
+            for i in range(len(group)):
+                if i in keep:
+                    parts.append(group[i].strip())
+                elif not parts or parts[-1] != ELLIPSIS:
+                    parts.append(ELLIPSIS)
+            trimmed.append({**passage, "text": "".join(parts)})
+        return trimmed
+
+    def _fit_budget(self, passages: List[Dict]) -> Tuple[List[Dict], int]:
+        """按最佳距离保留片段直到用完预算，输出顺序不变"""
+        by_rank = sorted(range(len(passages)), key=lambda i: passages[i].get("distance") or 0.0)
+        chosen, used = set(), 0
+        for i in by_rank:
+            tokens = estimate_tokens(passages[i]["text"])
+            # 至少保留一个片段
+            if chosen and used + tokens > self.token_budget:
+                continue
+            chosen.add(i)
+            used += tokens
+        return [p for i, p in enumerate(passages) if i in chosen], len(passages) - len(chosen)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会话记忆：为较早的对话轮次建立向量索引，查询时召回与当前问题相关的历史
+
+PromptManager 只把最近几轮对话原样放入 prompt，更早的轮次由这里负责：每轮对话
+结束后在后台线程中编码并写入 SQLite（向量以 float32 BLOB 保存），查询时只在
+当前会话的、不在最近窗口内的轮次中按余弦相似度召回，并按 token 预算截断，
+使长会话的 prompt 长度保持稳定。
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.core.metrics import timed
+from src.core.text_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 内存中缓存向量矩阵的会话数上限
+MAX_CACHED_SESSIONS = 256
+
+
+def format_turn(question: str, answer: str) -> str:
+    return f"Q: {question}\nA: {answer}"
+
+
+class ConversationMemory:
+    """按会话划分的对话记忆索引"""
+
+    def __init__(self, model, db_path: str, recent_turns: int = 5, top_k: int = 3,
+                 token_budget: int = 600, min_score: float = 0.3):
+        """
+        Args:
+            model: 句向量模型（复用检索器已加载的 SentenceTransformer）
+            db_path (str): SQLite 文件路径
+            recent_turns (int): 最近几轮已原样放入 prompt，召回时跳过
+            top_k (int): 最多召回的轮次数
+            token_budget (int): 召回内容的 token 上限
+            min_score (float): 余弦相似度下限，低于该值的轮次不召回
+        """
+        self.model = model
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.recent_turns = recent_turns
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._executor = None
+        self._executor_pid = None
+        # 会话 ID -> (已加载的轮次数, 向量矩阵, 文本列表)
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], model) -> Optional["ConversationMemory"]:
+        """根据配置中的 conversation_memory 段创建记忆索引，top_k 为 0 时不启用"""
+        options = config.get("conversation_memory", {})
+        if options.get("top_k", 3) <= 0:
+            return None
+        return cls(
+            model=model,
+            db_path=options.get("db_path", "resources/cache/conversation_memory.sqlite"),
+            recent_turns=options.get("recent_turns", 5),
+            top_k=options.get("top_k", 3),
+            token_budget=options.get("token_budget", 600),
+            min_score=options.get("min_score", 0.3)
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个进程使用自己的连接：fork 出的工作进程不能复用父进程的 SQLite 连接"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, "
+                "vector BLOB NOT NULL, PRIMARY KEY (session_id, position))"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+            # 其他进程可能已写入新的轮次，缓存不再可信
+            self._cache.clear()
+        return self._conn
+
+    def _background(self) -> ThreadPoolExecutor:
+        """单线程执行编码任务，保证同一会话的轮次按提交顺序写入；父进程的线程池不能在子进程中使用"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-embed")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def add_turn(self, session_id: str, question: str, answer: str):
+        """提交一轮对话，在后台编码后写入索引，不阻塞当前请求"""
+        if not session_id:
+            return
+        self._background().submit(self._index_turn, session_id, format_turn(question, answer))
+
+    def _index_turn(self, session_id: str, text: str):
+        try:
+            vector = self.model.encode([text], normalize_embeddings=True)[0].astype(np.float32)
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    # 先取得写锁再读取 MAX(position)，多个工作进程同时写入同一会话时不会得到相同的编号
+                    conn.execute("BEGIN IMMEDIATE")
+                    position = conn.execute(
+                        "SELECT COALESCE(MAX(position) + 1, 0) FROM turns WHERE session_id = ?", (session_id,)
+                    ).fetchone()[0]
+                    conn.execute(
+                        "INSERT INTO turns VALUES (?, ?, ?, ?)",
+                        (session_id, position, text, vector.tobytes())
+                    )
+        except Exception as e:
+            logger.error(f"写入会话记忆失败 ({session_id}): {e}")
+
+    def remove(self, session_id: str):
+        """删除会话的全部记忆"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._cache.pop(session_id, None)
+
+    def flush(self, timeout: Optional[float] = None):
+        """等待已提交的编码任务完成（测试与脚本使用）"""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.submit(lambda: None).result(timeout)
+
+    def _load(self, session_id: str):
+        """返回会话的 (向量矩阵, 文本列表)，只从数据库读取缓存之后新增的轮次
+
+        其他工作进程删除会话后，重新写入的轮次从 0 开始编号，本进程的缓存随之失效：
+        每次同时读取最后一条已缓存的轮次，它不存在或文本不同时丢弃缓存重新读取。
+        """
+        query = "SELECT position, text, vector FROM turns WHERE session_id = ? AND position >= ? ORDER BY position"
+        with self._lock:
+            conn = self._connection()
+            count, matrix, texts = self._cache.get(session_id, (0, None, []))
+            rows = conn.execute(query, (session_id, max(count - 1, 0))).fetchall()
+            if count:
+                if rows and rows[0][0] == count - 1 and rows[0][1] == texts[-1]:
+                    rows = rows[1:]
+                else:
+                    count, matrix, texts = 0, None, []
+                    rows = conn.execute(query, (session_id, 0)).fetchall()
+            if rows:
+                new = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+                matrix = new if matrix is None else np.vstack([matrix, new])
+                texts = texts + [r[1] for r in rows]
+                count += len(rows)
+            self._cache[session_id] = (count, matrix, texts)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > MAX_CACHED_SESSIONS:
+                self._cache.popitem(last=False)
+        return matrix, texts
+
+    def recall(self, session_id: str, question: str) -> List[Dict[str, Any]]:
+        """召回与问题相关的早期轮次
+
+        Args:
+            session_id (str): 会话 ID
+            question (str): 当前问题
+
+        Returns:
+            List[Dict[str, Any]]: 按对话先后排序的轮次，每项包含 text、position、score
+        """
+        if not session_id:
+            return []
+        with timed("memory_recall"):
+            matrix, texts = self._load(session_id)
+            # 最近几轮已原样在 prompt 中，只在更早的轮次中召回
+            candidates = len(texts) - self.recent_turns
+            if matrix is None or candidates <= 0:
+                return []
+            query = self.model.encode([question], normalize_embeddings=True)[0].astype(np.float32)
+            scores = matrix[:candidates] @ query
+            order = np.argsort(-scores)[:self.top_k]
+
+            selected, used = [], 0
+            for position in order:
+                score = float(scores[position])
+                if score < self.min_score:
+                    break
+                cost = estimate_tokens(texts[position])
+                if used + cost > self.token_budget:
+                    continue
+                used += cost
+                selected.append({"text": texts[position], "position": int(position), "score": round(score, 4)})
+        return sorted(selected, key=lambda item: item["position"])
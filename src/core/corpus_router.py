@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""多语料检索的清单与路由
+
+清单（config/corpora.json）中每本书对应一个独立的 Chroma 集合：
+    {"corpora": [{"name": "hongloumeng", "title": "红楼梦", "input_file": "...",
+                  "collection_name": "...", "keywords": ["贾宝玉", ...]}]}
+
+后台入库（见 ingest_jobs.py）登记的语料不写入受版本控制的清单，而是写入数据目录下的
+登记文件（corpus_overlay 配置项），格式与清单相同；读取时两者合并，同名条目以登记文件
+中的字段覆盖清单中的字段。
+
+路由规则：查询中出现某本书的书名或关键词时只检索这些书，否则检索全部集合。
+各集合使用同一个嵌入模型，距离可以直接比较，按距离合并即可。
+"""
+
+import os
+import json
+import heapq
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _read_corpora(path: Optional[str]) -> List[dict]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("corpora", [])
+
+
+def _validate(corpora: List[dict]) -> List[dict]:
+    for corpus in corpora:
+        if "name" not in corpus or "collection_name" not in corpus:
+            raise ValueError(f"语料清单条目缺少 name 或 collection_name: {corpus}")
+    return corpora
+
+
+def load_manifest(path: Optional[str]) -> List[dict]:
+    """读取语料清单，未配置或文件不存在时返回空列表"""
+    return _validate(_read_corpora(path))
+
+
+def load_overlay(path: Optional[str]) -> List[dict]:
+    """读取入库登记文件；替换清单中已有语料时条目可以只包含 name 和变化的字段"""
+    return _read_corpora(path)
+
+
+def load_corpora(config: Dict[str, Any]) -> List[dict]:
+    """读取语料清单并合并入库登记文件，同名条目以登记文件为准，新语料追加在清单之后"""
+    corpora = [dict(corpus) for corpus in load_manifest(config.get("corpus_manifest"))]
+    by_name = {corpus["name"]: corpus for corpus in corpora}
+    for entry in load_overlay(config.get("corpus_overlay")):
+        if entry.get("name") in by_name:
+            by_name[entry["name"]].update(entry)
+        else:
+            corpora.append(dict(entry))
+            by_name[entry.get("name")] = corpora[-1]
+    return _validate(corpora)
+
+
+def manifest_paths(config: Dict[str, Any]) -> List[str]:
+    """语料清单与入库登记文件的路径（未配置的跳过），用于判断语料是否变化"""
+    return [path for path in (config.get("corpus_manifest"), config.get("corpus_overlay")) if path]
+
+
+class CorpusRouter:
+    """根据查询内容选择要检索的语料，并合并多个集合的检索结果"""
+
+    def __init__(self, corpora: List[dict]):
+        self.corpora = list(corpora)
+        self._by_name: Dict[str, dict] = {c["name"]: c for c in self.corpora}
+        # 每个语料的路由词：书名 + 关键词
+        self._terms = {
+            c["name"]: [t for t in [c.get("title")] + list(c.get("keywords", [])) if t]
+            for c in self.corpora
+        }
+
+    @property
+    def names(self) -> List[str]:
+        return [c["name"] for c in self.corpora]
+
+    def get(self, name: str) -> dict:
+        return self._by_name[name]
+
+    def route(self, query: str, corpora: Optional[Iterable[str]] = None) -> List[str]:
+        """返回需要检索的语料名称
+
+        Args:
+            query (str): 查询文本
+            corpora (Iterable[str]): 调用方指定的语料，指定时不再按关键词路由
+        """
+        if corpora:
+            selected = [name for name in corpora if name in self._by_name]
+            if selected:
+                return selected
+            logger.warning(f"指定的语料不存在: {list(corpora)}，改为检索全部语料")
+            return self.names
+
+        matched = [name for name, terms in self._terms.items() if any(t in query for t in terms)]
+        return matched or self.names
+
+    @staticmethod
+    def merge(result_lists: Iterable[List[dict]], top_k: int) -> List[dict]:
+        """按距离从小到大合并多个集合的结果，取前 top_k 条"""
+        return heapq.nsmallest(
+            top_k,
+            (item for results in result_lists for item in results),
+            key=lambda item: item["distance"]
+        )
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""基于内存映射的语料存储
+
+每个语料源的每次入库生成一组带版本号的文件，放在 versions/ 子目录中：
+    versions/<source>.<version>.txt       原文的 UTF-8 字节（与源文件逐字节一致）
+    versions/<source>.<version>.offsets   每个 chunk 在原文中的 [start, end) 字节偏移，uint64 连续存放
+    versions/<source>.<version>.chapters  每个 chunk 所属章节的序号，uint32
+根目录下的 <source>.current 只记录当前版本号。三个数据文件写完后才替换指针文件，
+读取端先读指针再映射同一版本的三个文件，不会把新原文与旧偏移拼在一起。
+旧版本在下一次提交时清理；早期不带版本号的 <source>.txt/.offsets/.chapters 仍可读取。
+
+chunk 编号即其在原文中的顺序，编号相邻且章节相同的 chunk 在原文中相邻，
+上下文扩展直接查这两个数组，不需要再访问向量库。
+
+向量库只保存向量和 (source, chunk) 元数据，不再重复保存 chunk 文本。检索时按
+chunk 编号查偏移，从 mmap 中切片解码，只有真正进入提示词的 chunk 才会生成字符串。
+"""
+
+import os
+import mmap
+import time
+import array
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 每个 chunk 的偏移占两个 uint64，章节序号占一个 uint32
+_OFFSET_ITEM = "Q"
+_CHAPTER_ITEM = "I"
+# 集合元数据中的标记：该集合的 chunk 文本保存在语料存储中，Chroma 中没有 documents
+CORPUS_STORE_FLAG = "corpus_store"
+# 各版本数据文件所在的子目录与指针文件后缀
+_VERSIONS_DIR = "versions"
+_POINTER_SUFFIX = ".current"
+_DATA_SUFFIXES = (".txt", ".offsets", ".chapters")
+# 读取指针后、打开数据文件前该版本恰好被清理时的重试次数
+_RESOLVE_ATTEMPTS = 3
+
+
+def _read_pointer(root_dir: Path, source: str) -> Optional[str]:
+    """读取语料源的当前版本号，没有指针文件时返回 None"""
+    try:
+        return (root_dir / f"{source}{_POINTER_SUFFIX}").read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _version_paths(root_dir: Path, source: str, version: Optional[str]) -> Tuple[Path, Path, Path]:
+    """返回 (原文, 偏移, 章节) 文件路径；version 为 None 时对应早期不带版本号的布局"""
+    if version is None:
+        base = root_dir / source
+    else:
+        base = root_dir / _VERSIONS_DIR / f"{source}.{version}"
+    return tuple(Path(f"{base}{suffix}") for suffix in _DATA_SUFFIXES)
+
+
+def _stored_versions(root_dir: Path, source: str) -> List[str]:
+    """列出 versions/ 中该语料源的全部版本号"""
+    versions_dir = root_dir / _VERSIONS_DIR
+    if not versions_dir.exists():
+        return []
+    found = set()
+    for path in versions_dir.iterdir():
+        # 版本号不含 "."，从右侧拆分可兼容含 "." 的语料源名称
+        parts = path.name.rsplit(".", 2)
+        if len(parts) == 3 and parts[0] == source and f".{parts[2]}" in _DATA_SUFFIXES:
+            found.add(parts[1])
+    return sorted(found)
+
+
+class _MappedSource:
+    """一个语料源某个版本的只读映射"""
+
+    def __init__(self, version, blob_path: Path, offsets_path: Path, chapters_path: Path):
+        self.version = version
+        self.blob = self._map(blob_path)
+        self.offsets = memoryview(self._map(offsets_path)).cast(_OFFSET_ITEM)
+        # 没有章节文件的旧语料视为只有一章
+        self.chapters = (
+            memoryview(self._map(chapters_path)).cast(_CHAPTER_ITEM) if chapters_path.exists() else None
+        )
+
+    @staticmethod
+    def _map(path: Path):
+        with open(path, "rb") as f:
+            # 空文件无法 mmap
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def legacy_version(blob_path: Path, offsets_path: Path) -> Tuple[int, ...]:
+        """早期布局没有版本号，以两个文件的 inode 和修改时间判断是否被替换"""
+        blob, offsets = os.stat(blob_path), os.stat(offsets_path)
+        return (blob.st_ino, blob.st_mtime_ns, offsets.st_ino, offsets.st_mtime_ns)
+
+    def __len__(self) -> int:
+        return len(self.offsets) // 2
+
+    def span(self, index: int) -> Tuple[int, int]:
+        if not 0 <= index < len(self):
+            raise IndexError(f"chunk {index} 超出范围（共 {len(self)} 个）")
+        return self.offsets[2 * index], self.offsets[2 * index + 1]
+
+    def chapter(self, index: int) -> int:
+        return self.chapters[index] if self.chapters is not None else 0
+
+
+class CorpusStore:
+    """语料存储的读取端，按需映射各语料源，可在多线程和 fork 出的工作进程间共享"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = Path(root_dir)
+        self._lock = threading.Lock()
+        self._sources: Dict[str, _MappedSource] = {}
+
+    def _get(self, source: str) -> _MappedSource:
+        for _ in range(_RESOLVE_ATTEMPTS):
+            version = _read_pointer(self.root_dir, source)
+            paths = _version_paths(self.root_dir, source, version)
+            if version is None:
+                try:
+                    version = _MappedSource.legacy_version(paths[0], paths[1])
+                except FileNotFoundError:
+                    raise KeyError(f"语料源不存在: {source}")
+
+            with self._lock:
+                mapped = self._sources.get(source)
+                if mapped is not None and mapped.version == version:
+                    return mapped
+                try:
+                    mapped = _MappedSource(version, *paths)
+                except FileNotFoundError:
+                    # 读取指针后该版本已被新的提交清理，重新读取指针
+                    continue
+                self._sources[source] = mapped
+                return mapped
+        raise KeyError(f"语料源不存在: {source}")
+
+    def sources(self) -> List[str]:
+        """列出已入库的语料源"""
+        if not self.root_dir.exists():
+            return []
+        names = {p.name[:-len(_POINTER_SUFFIX)] for p in self.root_dir.glob(f"*{_POINTER_SUFFIX}")}
+        names.update(p.stem for p in self.root_dir.glob("*.offsets"))
+        return sorted(names)
+
+    def count(self, source: str) -> int:
+        """语料源的 chunk 数量"""
+        return len(self._get(source))
+
+    def span(self, source: str, index: int) -> Tuple[int, int]:
+        """chunk 在原文中的 [start, end) 字节偏移"""
+        return self._get(source).span(index)
+
+    def chapter(self, source: str, index: int) -> int:
+        """chunk 所属章节的序号"""
+        return self._get(source).chapter(index)
+
+    def neighbors(self, source: str, index: int, window: int) -> Tuple[int, int]:
+        """返回 index 前后各 window 个、且与其同一章节的 chunk 编号范围 [first, last]"""
+        mapped = self._get(source)
+        chapter = mapped.chapter(index)
+        first, last = index, index
+        while first > 0 and index - first < window and mapped.chapter(first - 1) == chapter:
+            first -= 1
+        while last < len(mapped) - 1 and last - index < window and mapped.chapter(last + 1) == chapter:
+            last += 1
+        return first, last
+
+    def view(self, source: str, start: int, end: int) -> memoryview:
+        """原文 [start, end) 字节区间的零拷贝视图"""
+        return memoryview(self._get(source).blob)[start:end]
+
+    def text_range(self, source: str, start: int, end: int) -> str:
+        """解码原文 [start, end) 字节区间"""
+        return str(self.view(source, start, end), "utf-8")
+
+    def text(self, source: str, index: int) -> str:
+        """按编号解码单个 chunk 的文本"""
+        mapped = self._get(source)
+        start, end = mapped.span(index)
+        return str(memoryview(mapped.blob)[start:end], "utf-8")
+
+
+class CorpusWriter:
+    """语料存储的写入端：复制源文件并记录 chunk 偏移，commit 时通过指针文件原子发布
+
+    用法:
+        with CorpusWriter(root_dir, source, input_file) as writer:
+            writer.add(start, end)
+    """
+
+    def __init__(self, root_dir: str, source: str, input_file: str):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.source = source
+        self.input_file = input_file
+        self.offsets = array.array(_OFFSET_ITEM)
+        self.chapters = array.array(_CHAPTER_ITEM)
+
+    def add(self, start: int, end: int, chapter: int = 0) -> int:
+        """记录一个 chunk 的字节区间与章节序号，返回其编号"""
+        self.offsets.extend((start, end))
+        self.chapters.append(chapter)
+        return len(self.chapters) - 1
+
+    def extend(self, chunks: Iterable[Tuple[int, int, int]]):
+        """批量记录 (start, end, chapter)"""
+        for start, end, chapter in chunks:
+            self.add(start, end, chapter)
+
+    def commit(self):
+        """写入新版本的原文、偏移与章节文件，最后替换指针文件发布；读取端下次访问时映射新版本"""
+        previous = _read_pointer(self.root_dir, self.source)
+        version = f"{time.time_ns():x}-{os.getpid():x}"
+        blob_path, offsets_path, chapters_path = _version_paths(self.root_dir, self.source, version)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(self.input_file, blob_path)
+        with open(offsets_path, "wb") as f:
+            self.offsets.tofile(f)
+        with open(chapters_path, "wb") as f:
+            self.chapters.tofile(f)
+
+        pointer_path = self.root_dir / f"{self.source}{_POINTER_SUFFIX}"
+        with open(f"{pointer_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(f"{pointer_path}.tmp", pointer_path)
+
+        # 保留上一个版本：刚读到旧指针的读取端仍能打开它；已映射的读取端不受删除影响
+        keep = {version, previous}
+        for old in _stored_versions(self.root_dir, self.source):
+            if old not in keep:
+                _remove_files(_version_paths(self.root_dir, self.source, old))
+        _remove_files(_version_paths(self.root_dir, self.source, None))
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+
+def _remove_files(paths: Iterable[Path]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_source(root_dir: Optional[str], source: Optional[str]):
+    """删除语料源的指针文件和全部版本的数据文件，不存在时忽略"""
+    if not root_dir or not source:
+        return
+    root = Path(root_dir)
+    _remove_files([root / f"{source}{_POINTER_SUFFIX}"])
+    for version in [None] + _stored_versions(root, source):
+        _remove_files(_version_paths(root, source, version))
+
+
+def char_spans_to_byte_spans(text: str, spans: List[Tuple[int, int]], base: int = 0) -> List[Tuple[int, int]]:
+    """将字符偏移转换为 UTF-8 字节偏移
+
+    按偏移顺序逐段编码累加字节数，不需要一次性编码整段文本。
+    """
+    positions = sorted({p for span in spans for p in span})
+    byte_at = {}
+    char_pos, byte_pos = 0, base
+    for pos in positions:
+        byte_pos += len(text[char_pos:pos].encode("utf-8"))
+        char_pos = pos
+        byte_at[pos] = byte_pos
+    return [(byte_at[start], byte_at[end]) for start, end in spans]
+
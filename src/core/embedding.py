@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""嵌入模型加载：按配置选择推理后端
+
+检索、入库与会话记忆共用配置中的 embedding 段:
+    backend: torch（默认，fp32 PyTorch）
+             int8（PyTorch 动态量化，Linear 层权重为 int8，激活按批动态量化）
+             onnx（ONNX Runtime，onnx_file 可指定量化后的模型文件）
+    num_threads: 计算线程数，0 表示使用默认值（全部核心）
+    onnx_file: ONNX 模型文件（相对模型目录），例如 onnx/model_qint8_avx512_vnni.onnx；
+               未指定且模型目录中没有 ONNX 文件时，加载时从 PyTorch 权重导出
+
+int8 与 onnx 得到的向量与 fp32 略有差异，切换前用 src/benchmarks/embedding_bench.py 检查
+延迟与检索一致性。onnx 后端需要 onnxruntime 与 optimum，未安装时退回 torch 并打印警告。
+"""
+
+import importlib.util
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.core.text_utils import estimate_tokens
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def set_num_threads(num_threads: Optional[int]):
+    """设置 PyTorch 计算线程数（ONNX Runtime 的线程数在创建会话时确定）"""
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+def _onnx_available() -> bool:
+    return all(importlib.util.find_spec(name) is not None for name in ("onnxruntime", "optimum"))
+
+
+def _load_onnx(model_name: str, num_threads: Optional[int], onnx_file: Optional[str]):
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer
+
+    session_options = onnxruntime.SessionOptions()
+    if num_threads:
+        # 单条查询的算子之间没有并行空间，只设置算子内线程
+        session_options.intra_op_num_threads = num_threads
+        session_options.inter_op_num_threads = 1
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+    if onnx_file:
+        model_kwargs["file_name"] = onnx_file
+    return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+
+
+def load_embedding_model(model_name: str, options: Optional[Dict[str, Any]] = None):
+    """按配置加载 SentenceTransformer 模型
+
+    Args:
+        model_name (str): 模型名称或本地路径
+        options (dict): 配置中的 embedding 段，缺省时使用 fp32 PyTorch
+
+    Returns:
+        SentenceTransformer: 已加载的模型，embedding_backend 属性记录实际使用的后端
+    """
+    options = options or {}
+    backend = options.get("backend", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的嵌入推理后端: {backend}，可选: {', '.join(BACKENDS)}")
+    num_threads = options.get("num_threads") or None
+
+    if backend == "onnx" and not _onnx_available():
+        print("未安装 onnxruntime 或 optimum，嵌入模型退回 torch 后端")
+        backend = "torch"
+
+    if backend == "onnx":
+        model = _load_onnx(model_name, num_threads, options.get("onnx_file"))
+    else:
+        from sentence_transformers import SentenceTransformer
+
+        set_num_threads(num_threads)
+        model = SentenceTransformer(model_name, device="cpu" if backend == "int8" else None)
+        if backend == "int8":
+            import torch
+            # 动态量化只支持 CPU；Linear 层占 BERT 类模型绝大部分计算
+            torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    model.embedding_backend = backend
+    return model
+
+
+def length_buckets(order: List[int], lengths: List[int], token_budget: int,
+                   max_batch_size: int) -> Iterator[List[int]]:
+    """把按长度降序排列的下标切成批次，每批补齐后的 token 数（批大小 x 批内最长长度）不超过预算"""
+    batch: List[int] = []
+    for i in order:
+        # 降序排列时批内第一个最长，补齐长度就是它的长度
+        if batch and ((len(batch) + 1) * lengths[batch[0]] > token_budget or len(batch) >= max_batch_size):
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
+
+
+def encode_length_bucketed(model, texts: List[str], token_budget: int = 8192,
+                           max_batch_size: int = 256) -> np.ndarray:
+    """按长度分桶编码，返回与 texts 顺序一致的向量
+
+    模型按批内最长文本补齐，短文本（标题、短句）与长 chunk 混在一批时大部分计算浪费在补齐上。
+    这里先按估计的 token 数排序，再按 token 预算决定批大小：短文本的批次更大，长文本的批次更小，
+    每批计算量接近，补齐浪费也最少。
+
+    sentence-transformers 的 encode 本身会在调用内按长度排序后分批，入库默认不使用这里的分桶
+    （vector_store.encode_token_budget 为 0），用 ingest_batch_bench 在实际模型上确认有收益后再启用。
+
+    Args:
+        model: SentenceTransformer 模型
+        texts (List[str]): 待编码文本
+        token_budget (int): 每批补齐后的 token 数上限
+        max_batch_size (int): 每批文本数上限
+
+    Returns:
+        np.ndarray: 形状为 (len(texts), 维度) 的向量
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    max_length = getattr(model, "max_seq_length", None) or 512
+    # 加上 [CLS]、[SEP]，超出模型最大长度的部分会被截断
+    lengths = [min(estimate_tokens(text) + 2, max_length) for text in texts]
+    order = sorted(range(len(texts)), key=lengths.__getitem__, reverse=True)
+    embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+    for batch in length_buckets(order, lengths, token_budget, max_batch_size):
+        vectors = model.encode([texts[i] for i in batch], batch_size=len(batch))
+        for i, vector in zip(batch, vectors):
+            embeddings[i] = vector
+    return np.stack(embeddings)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会话历史的滚动摘要
+
+每个会话的对话轮次按顺序记录在 SQLite 中。最近几轮原样放入 prompt，更早的轮次
+在回答返回后由后台线程调用 LLM 合并进该会话的摘要，请求路径上只读取已有摘要，
+从不等待摘要生成。
+
+摘要行带版本号：后台任务读取 (version, covered) 后生成新摘要，只有版本号未变时
+才写回（version + 1），多个工作进程同时更新同一会话时后完成的一方放弃写入，
+不会用较旧的摘要覆盖较新的摘要。
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.metrics import timed
+from src.prompts.templates import SUMMARY_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+
+class HistorySummarizer:
+    """按会话记录对话轮次，并在后台维护早期轮次的滚动摘要"""
+
+    def __init__(self, llm, db_path: str, recent_turns: int = 5, min_batch: int = 2, max_chars: int = 400):
+        """
+        Args:
+            llm: 生成摘要使用的聊天模型（需支持 invoke）
+            db_path (str): SQLite 文件路径
+            recent_turns (int): 原样放入 prompt 的最近轮数，更早的轮次进入摘要
+            min_batch (int): 至少积累多少轮未摘要的早期对话才调用一次 LLM
+            max_chars (int): 摘要的目标最大字数
+        """
+        self.llm = llm
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.recent_turns = recent_turns
+        self.min_batch = min_batch
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._executor = None
+        self._executor_pid = None
+        # 正在后台更新摘要的会话，避免同一会话重复排队
+        self._pending = set()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], llm, recent_turns: int) -> Optional["HistorySummarizer"]:
+        """根据配置中的 history_summary 段创建摘要器，enabled 为 false 时不启用"""
+        options = config.get("history_summary", {})
+        if not options.get("enabled", True):
+            return None
+        return cls(
+            llm=llm,
+            db_path=options.get("db_path", "resources/cache/history_summary.sqlite"),
+            recent_turns=recent_turns,
+            min_batch=options.get("min_batch", 2),
+            max_chars=options.get("max_chars", 400)
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个进程使用自己的连接：fork 出的工作进程不能复用父进程的 SQLite 连接"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, position))"
+            )
+            # covered：摘要已包含的轮次数，即摘要覆盖 position < covered 的全部轮次
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, covered INTEGER NOT NULL, "
+                "summary TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _background(self) -> ThreadPoolExecutor:
+        """父进程的线程池不能在子进程中使用，fork 后重新创建"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+            self._executor_pid = os.getpid()
+            self._pending = set()
+        return self._executor
+
+    def record(self, session_id: str, text: str):
+        """记录一轮对话；早期轮次积累够一批时提交后台摘要任务"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # 先取得写锁再读取 MAX(position)：多个工作进程同时记录同一会话时，读取与插入之间不会被其他进程插入
+                conn.execute("BEGIN IMMEDIATE")
+                total = conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM turns WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                conn.execute("INSERT INTO turns VALUES (?, ?, ?)", (session_id, total, text))
+            covered = self._summary_row(conn, session_id)[1]
+            executor = self._background()
+            due = total + 1 - self.recent_turns - covered >= self.min_batch
+            if not due or session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        executor.submit(self._update_summary, session_id)
+
+    def context(self, session_id: str) -> Tuple[str, List[str]]:
+        """返回放入 prompt 的 (摘要, 最近轮次)
+
+        最近轮次取摘要尚未覆盖的轮次中的最后 recent_turns 轮；后台摘要滞后时，
+        夹在摘要与最近窗口之间的少量轮次暂时不出现在 prompt 中，保证长度不随会话增长。
+        """
+        with self._lock:
+            conn = self._connection()
+            _, covered, summary = self._summary_row(conn, session_id)
+            rows = conn.execute(
+                "SELECT text FROM turns WHERE session_id = ? AND position >= ? ORDER BY position DESC LIMIT ?",
+                (session_id, covered, self.recent_turns)
+            ).fetchall()
+        return summary, [r[0] for r in reversed(rows)]
+
+    def remove(self, session_id: str):
+        """删除会话的轮次记录与摘要"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+
+    def flush(self, timeout: Optional[float] = None):
+        """等待已提交的摘要任务完成（测试与脚本使用）"""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.submit(lambda: None).result(timeout)
+
+    @staticmethod
+    def _summary_row(conn: sqlite3.Connection, session_id: str) -> Tuple[int, int, str]:
+        row = conn.execute(
+            "SELECT version, covered, summary FROM summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row if row else (0, 0, "")
+
+    def _update_summary(self, session_id: str):
+        """把最近窗口之外、尚未摘要的轮次合并进摘要（在后台线程中执行）
+
+        生成期间新到达的轮次在本次完成后继续合并，直到未摘要的早期轮次不足一批。
+        """
+        try:
+            while self._summarize_once(session_id):
+                pass
+        except Exception as e:
+            logger.error(f"更新会话摘要失败 ({session_id}): {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def _summarize_once(self, session_id: str) -> bool:
+        """合并一批早期轮次，返回是否还需要继续合并"""
+        with self._lock:
+            conn = self._connection()
+            version, covered, summary = self._summary_row(conn, session_id)
+            total = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT text FROM turns WHERE session_id = ? AND position >= ? AND position < ? "
+                "ORDER BY position",
+                (session_id, covered, total - self.recent_turns)
+            ).fetchall()
+        if len(rows) < self.min_batch:
+            return False
+
+        prompt = SUMMARY_TEMPLATE.format(
+            summary=summary or "（无）",
+            turns="\n\n".join(r[0] for r in rows),
+            max_chars=self.max_chars
+        )
+        with timed("history_summary"):
+            new_summary = self.llm.invoke(prompt).content.strip()
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if version == 0:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO summaries VALUES (?, 1, ?, ?, ?)",
+                        (session_id, covered + len(rows), new_summary, time.time())
+                    )
+                else:
+                    cursor = conn.execute(
+                        "UPDATE summaries SET version = ?, covered = ?, summary = ?, updated_at = ? "
+                        "WHERE session_id = ? AND version = ?",
+                        (version + 1, covered + len(rows), new_summary, time.time(), session_id, version)
+                    )
+        if cursor.rowcount == 0:
+            logger.info(f"会话 {session_id} 的摘要已被其他进程更新，放弃本次结果")
+            return False
+        return True
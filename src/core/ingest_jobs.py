@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""后台入库任务
+
+上传的文本在后端进程中后台入库：
+    1. 写入新的影子集合 <collection_name>__<任务 ID>，语料存储使用同样带任务 ID 的源名，
+       正在服务的集合和语料文件不受影响
+    2. 建完后原子切换别名（见 collection_aliases.py），检索端下一次查询时切换到新集合；
+       语料登记到数据目录下的入库登记文件（corpus_overlay），不修改受版本控制的语料清单
+       （替换已有语料时只记录新的 input_file）
+    3. 超出保留数的旧集合与旧语料文件被删除；失败或取消时删除影子集合
+
+入库按批进行，每批之后按占空比休眠，并在有聊天请求执行时进一步让出 CPU，避免拖慢查询。
+任务状态以 JSON 文件保存，多工作进程部署时任一进程都能查询；同一时间只运行一个入库任务。
+创建任务的进程在任务结束前一直持有 <任务 ID>.lock 上的文件锁，进程退出后锁自动释放；
+启动时据此把上次运行遗留在 queued/running 状态的任务标记为失败并清理影子集合。
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.collection_aliases import CollectionAliases
+from src.core.corpus_router import load_corpora, load_overlay
+from src.core.corpus_store import remove_source
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为进程内锁
+    fcntl = None
+
+# 语料名会用于集合名与文件名
+_CORPUS_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,47}$")
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class Throttle:
+    """按占空比限制入库速度：每批耗时 t 后休眠 t * (1 / duty_cycle - 1)，有查询在执行时额外等待"""
+
+    def __init__(self, duty_cycle: float = 0.5, busy: Optional[Callable[[], bool]] = None,
+                 busy_wait: float = 0.05, max_busy_wait: float = 2.0):
+        self.duty_cycle = min(1.0, max(0.05, duty_cycle))
+        self.busy = busy
+        self.busy_wait = busy_wait
+        self.max_busy_wait = max_busy_wait
+        self._batch_start = time.perf_counter()
+
+    def pause(self):
+        elapsed = time.perf_counter() - self._batch_start
+        if self.duty_cycle < 1.0:
+            time.sleep(elapsed * (1 / self.duty_cycle - 1))
+        # 查询优先：有聊天请求在执行时暂停，但不超过 max_busy_wait，保证入库最终能完成
+        waited = 0.0
+        while self.busy and self.busy() and waited < self.max_busy_wait:
+            time.sleep(self.busy_wait)
+            waited += self.busy_wait
+        self._batch_start = time.perf_counter()
+
+
+class IngestJobManager:
+    """创建、执行与查询入库任务"""
+
+    def __init__(self, config_path: str, jobs_dir: str = "resources/ingest_jobs",
+                 upload_dir: str = "resources/uploads", duty_cycle: float = 0.5,
+                 add_batch_size: int = 64, retain_previous: int = 1):
+        """
+        Args:
+            config_path (str): RAG 配置文件，入库使用其中的 vector_store 段
+            jobs_dir (str): 任务状态目录
+            upload_dir (str): 上传文件目录
+            duty_cycle (float): 入库占用时间的比例，0.5 表示每批之后休眠同样长的时间
+            add_batch_size (int): 每批编码与写入的 chunk 数，越小越容易让出 CPU
+            retain_previous (int): 切换后保留的旧集合版本数
+        """
+        self.config_path = config_path
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.duty_cycle = duty_cycle
+        self.add_batch_size = add_batch_size
+        self.retain_previous = retain_previous
+        self.lock_path = self.jobs_dir / "ingest.lock"
+        self._thread_lock = threading.Lock()
+        # 进程内串行执行；跨进程由 lock_path 上的文件锁串行
+        self._run_lock = threading.Lock()
+        # 本进程创建、尚未结束的任务持有的文件锁
+        self._claims: Dict[str, Any] = {}
+
+    @classmethod
+    def from_config(cls, config_path: str, config: Dict[str, Any]) -> "IngestJobManager":
+        """根据配置中的 ingestion 段创建任务管理器"""
+        options = config.get("ingestion", {})
+        return cls(
+            config_path=config_path,
+            jobs_dir=options.get("jobs_dir", "resources/ingest_jobs"),
+            upload_dir=options.get("upload_dir", "resources/uploads"),
+            duty_cycle=options.get("duty_cycle", 0.5),
+            add_batch_size=options.get("add_batch_size", 64),
+            retain_previous=options.get("retain_previous", 1)
+        )
+
+    # ---- 任务状态 ----
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _claim_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.lock"
+
+    def _try_lock(self, job_id: str):
+        """以非阻塞方式锁定任务的锁文件，成功时返回打开的文件，已被其他进程（或本进程）持有时返回 None"""
+        lock_file = open(self._claim_path(job_id), "a")
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _release(self, job_id: str, lock_file=None):
+        """删除锁文件并释放锁；不传 lock_file 时释放本进程创建任务时持有的锁"""
+        lock_file = lock_file or self._claims.pop(job_id, None)
+        if lock_file is None:
+            return
+        try:
+            os.remove(self._claim_path(job_id))
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+    def _write_job(self, job: Dict[str, Any]):
+        """先写临时文件再原子替换，读者不会看到写了一半的文件"""
+        job["updated_at"] = time.time()
+        path = self._job_path(job["id"])
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not re.match(r"^[0-9a-f]{32}$", job_id):
+            return None
+        try:
+            with open(self._job_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_jobs(self, limit: Optional[int] = 50) -> List[Dict[str, Any]]:
+        """按创建时间从新到旧列出任务，limit 为 None 时返回全部"""
+        jobs = []
+        for path in self.jobs_dir.glob("*.json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        jobs.sort(key=lambda job: job["created_at"], reverse=True)
+        return jobs[:limit]
+
+    def create_job(self, corpus: str, upload_path: str, filename: str, title: Optional[str] = None,
+                   keywords: Optional[List[str]] = None) -> Dict[str, Any]:
+        """登记任务，文件已保存到 upload_path"""
+        job_id = uuid.uuid4().hex
+        # 先持有锁再写任务文件，启动恢复不会把刚创建的任务误判为遗留任务
+        self._claims[job_id] = self._try_lock(job_id)
+        job = {
+            "id": job_id,
+            "corpus": corpus,
+            "title": title,
+            "keywords": keywords or [],
+            "filename": filename,
+            "upload_path": str(upload_path),
+            "status": "queued",
+            "progress": 0.0,
+            "chunks": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "collection": None,
+            "error": None,
+            "cancel_requested": False
+        }
+        self._write_job(job)
+        return job
+
+    def new_upload_path(self) -> Path:
+        return self.upload_dir / f"{uuid.uuid4().hex}.txt"
+
+    @staticmethod
+    def validate_corpus_name(corpus: str) -> bool:
+        return bool(_CORPUS_NAME_PATTERN.match(corpus or ""))
+
+    def cancel(self, job_id: str) -> bool:
+        """请求取消任务：排队中的任务直接取消，运行中的任务在下一批之后停止"""
+        with self._thread_lock:
+            job = self.get_job(job_id)
+            if job is None or job["status"] not in ("queued", "running"):
+                return False
+            job["cancel_requested"] = True
+            self._write_job(job)
+        return True
+
+    def _update(self, job_id: str, **fields) -> Dict[str, Any]:
+        """读-改-写任务状态；取消标记由其他请求写入，这里总是以磁盘上的状态为准"""
+        with self._thread_lock:
+            job = self.get_job(job_id)
+            job.update(fields)
+            self._write_job(job)
+            return job
+
+    # ---- 执行 ----
+
+    def run(self, job_id: str, model=None, busy: Optional[Callable[[], bool]] = None):
+        """执行入库任务（在后台线程中调用）
+
+        Args:
+            job_id (str): 任务 ID
+            model: 复用已加载的 SentenceTransformer，模型名与配置一致时避免重复加载
+            busy (Callable[[], bool]): 返回当前是否有查询在执行，用于让出 CPU
+        """
+        try:
+            with self._run_lock:
+                self._run_exclusive(job_id, model, busy)
+        finally:
+            self._release(job_id)
+
+    def recover_stale_jobs(self) -> List[str]:
+        """把上次运行遗留在 queued/running 状态的任务标记为失败，删除其上传文件与影子集合
+
+        任务的锁文件仍被某个存活进程持有时跳过；没有 fcntl 时无法判断，视为全部遗留
+        （这种情况下只支持单进程部署）。返回被标记为失败的任务 ID。
+        """
+        recovered = []
+        for job in self.list_jobs(limit=None):
+            if job["status"] not in ("queued", "running"):
+                continue
+            lock_file = self._try_lock(job["id"])
+            if lock_file is None:
+                continue
+            try:
+                with self._thread_lock:
+                    job = self.get_job(job["id"])
+                # 加锁前任务可能刚好正常结束
+                if job is None or job["status"] not in ("queued", "running"):
+                    continue
+                self._cleanup_stale(job)
+                self._update(job["id"], status="failed", finished_at=time.time(),
+                             error="服务在任务结束前退出，任务已中断，请重新上传")
+                recovered.append(job["id"])
+            finally:
+                self._release(job["id"], lock_file)
+        if recovered:
+            print(f"已将 {len(recovered)} 个中断的入库任务标记为失败: {recovered}")
+        return recovered
+
+    def _cleanup_stale(self, job: Dict[str, Any]):
+        """删除中断任务的上传文件与影子集合；影子集合已被别名引用（切换后进程退出）时保留"""
+        try:
+            os.remove(job["upload_path"])
+        except FileNotFoundError:
+            pass
+        shadow = job.get("collection")
+        if not shadow:
+            return
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        for entry in CollectionAliases.from_config(config).entries().values():
+            if shadow in [entry["collection"]] + [p["collection"] for p in entry.get("previous", [])]:
+                return
+        remove_source(config.get("vector_store", {}).get("corpus_dir"), f"{job['corpus']}__{job['id'][:12]}")
+        try:
+            import chromadb
+            client = chromadb.PersistentClient(path=config.get("vector_store", {}).get("db_path", "./chroma_db"))
+            client.delete_collection(name=shadow)
+        except Exception as e:
+            print(f"删除中断任务 {job['id']} 的影子集合 {shadow} 失败: {e}")
+
+    def _run_exclusive(self, job_id: str, model, busy):
+        lock_file = open(self.lock_path, "a")
+        try:
+            # 同一时间只运行一个入库任务，其余任务保持 queued 状态等待
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._thread_lock:
+                job = self.get_job(job_id)
+            if job is None:
+                return
+            if job["cancel_requested"]:
+                self._update(job_id, status="cancelled", finished_at=time.time())
+                return
+            self._run_locked(job, model, busy)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _run_locked(self, job: Dict[str, Any], model, busy):
+        from src.generate_db.write_db import ChromaVectorStore
+
+        job_id = job["id"]
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        corpora = load_corpora(config)
+        entry = next((c for c in corpora if c["name"] == job["corpus"]), None)
+        logical_name = entry["collection_name"] if entry else job["corpus"]
+        shadow = f"{logical_name}__{job_id[:12]}"
+        source = f"{job['corpus']}__{job_id[:12]}"
+        total_bytes = max(1, os.path.getsize(job["upload_path"]))
+        self._update(job_id, status="running", started_at=time.time(), collection=shadow)
+
+        throttle = Throttle(self.duty_cycle, busy)
+
+        def on_batch(num_chunks: int, bytes_done: int):
+            current = self._update(job_id, chunks=num_chunks, progress=round(min(1.0, bytes_done / total_bytes), 4))
+            if current["cancel_requested"]:
+                raise JobCancelled()
+            throttle.pause()
+
+        store = None
+        try:
+            store = ChromaVectorStore(config_file=self.config_path, collection_name=shadow, model=model)
+            num_chunks = store.store_texts_from_file(
+                job["upload_path"], add_batch_size=self.add_batch_size, source=source, on_batch=on_batch,
+                raise_errors=True
+            )
+            if not num_chunks:
+                raise RuntimeError("文件中没有可入库的文本")
+
+            # 影子集合已完整，原子切换别名；新语料登记到清单后检索端才会路由到它
+            aliases = CollectionAliases.from_config(config)
+            # generate_db 按清单入库时以语料名作为源名
+            stale = aliases.flip(logical_name, shadow, source, retain=self.retain_previous,
+                                 initial_source=entry["name"] if entry else None)
+            # 保留上传的原文，作为以后用 generate_db 重建时的 input_file
+            input_file = self.upload_dir / f"{job['corpus']}.txt"
+            os.replace(job["upload_path"], input_file)
+            self._register_corpus(config, job, logical_name, str(input_file))
+            store.drop_versions(stale)
+            self._update(job_id, status="succeeded", progress=1.0, chunks=num_chunks, finished_at=time.time())
+            print(f"入库任务 {job_id} 完成: {num_chunks} 个 chunk，{logical_name} -> {shadow}")
+        except JobCancelled:
+            self._discard_shadow(store, config, shadow, source)
+            self._update(job_id, status="cancelled", finished_at=time.time())
+        except Exception as e:
+            self._discard_shadow(store, config, shadow, source)
+            self._update(job_id, status="failed", error=f"{e}\n{traceback.format_exc()}", finished_at=time.time())
+            print(f"入库任务 {job_id} 失败: {e}")
+        finally:
+            try:
+                os.remove(job["upload_path"])
+            except FileNotFoundError:
+                pass
+
+    def _register_corpus(self, config: Dict[str, Any], job: Dict[str, Any], collection_name: str,
+                         input_file: str):
+        """把语料登记到入库登记文件（原子替换）：新语料追加完整条目，已有语料只记录新的 input_file
+
+        受版本控制的语料清单保持不变，检索端读取时合并两者（见 corpus_router.load_corpora）。
+        同一时间只运行一个入库任务，登记文件不会被并发改写。
+        """
+        overlay_path = config.get("corpus_overlay")
+        if not overlay_path:
+            # 没有登记文件时检索端只使用语料清单，新语料无法被检索到
+            print(f"未配置 corpus_overlay，语料 {job['corpus']} 已入库但不会被检索")
+            return
+        overlay = {"corpora": load_overlay(overlay_path)}
+        entry = next((c for c in overlay["corpora"] if c.get("name") == job["corpus"]), None)
+        if entry is not None:
+            # 替换已有语料时指向新上传的原文，否则 generate_db 重建会恢复旧文本
+            entry["input_file"] = input_file
+        elif any(c["name"] == job["corpus"] for c in load_corpora(config)):
+            overlay["corpora"].append({"name": job["corpus"], "input_file": input_file})
+        else:
+            overlay["corpora"].append({
+                "name": job["corpus"],
+                "title": job["title"] or job["corpus"],
+                "input_file": input_file,
+                "collection_name": collection_name,
+                "keywords": job["keywords"]
+            })
+        Path(overlay_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{overlay_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(overlay, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, overlay_path)
+
+    def _discard_shadow(self, store, config: Dict[str, Any], shadow: str, source: str):
+        """删除未完成的影子集合及其语料文件"""
+        if store is not None:
+            try:
+                store.client.delete_collection(name=shadow)
+            except Exception:
+                pass
+        remove_source(config.get("vector_store", {}).get("corpus_dir"), source)
+
+
+def copy_upload(file_obj, destination: Path, chunk_size: int = 1 << 20) -> int:
+    """把上传文件流式写入磁盘，返回字节数"""
+    size = 0
+    with open(destination, "wb") as f:
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            size += len(chunk)
+    return size
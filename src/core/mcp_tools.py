@@ -1,109 +1,122 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os
-import subprocess
-import json
 from typing import List, Dict, Any, Optional
-from urllib.parse import quote
-import requests
-from bs4 import BeautifulSoup
-from .retrieve_related import VectorRetriever
+from .tool_runtime import ToolResources, timed_tool
 
 class MCPTools:
     """Model Control Protocol Tools - A collection of utility functions for AI model interactions"""
     
+    # Long-lived resources shared by every tool call, injected once at startup
+    _resources: Optional[ToolResources] = None
+    
+    @classmethod
+    def configure(cls, resources: ToolResources) -> None:
+        """Inject the shared resources used by all tools.
+        
+        Args:
+            resources (ToolResources): Retriever, HTTP session and caches to share
+        """
+        cls._resources = resources
+    
+    @classmethod
+    def get_resources(cls) -> ToolResources:
+        """Return the shared resources, creating lazily-initialized defaults if none were injected.
+        
+        Returns:
+            ToolResources: The shared tool resources
+        """
+        if cls._resources is None:
+            cls._resources = ToolResources()
+        return cls._resources
+    
     @staticmethod
-    def search_local_database(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    @timed_tool
+    def search_local_database(query: str, top_k: int = 5, corpus: str = "") -> List[Dict[str, Any]]:
         """Search the local vector database for relevant information.
         
         Args:
             query (str): The search query
             top_k (int): Number of top results to return
+            corpus (str): Name of the book to search; searches the books matching the query when empty
             
         Returns:
             List[Dict[str, Any]]: List of search results with metadata
         """
         try:
-            # 使用 VectorRetriever 进行检索
-            retriever = VectorRetriever()
-            # 更新配置中的最大结果数
-            retriever.max_results = top_k
-            # 执行检索
-            results = retriever.retrieve(query)
-            return results
+            # 使用共享的 VectorRetriever 进行检索
+            retriever = MCPTools.get_resources().retriever
+            return retriever.retrieve(query, top_k=top_k, corpora=[corpus] if corpus else None)
         except Exception as e:
             return [{"error": str(e)}]
     
     @staticmethod
-    def baidu_search(query: str, max_results: int = 5) -> List[Dict[str, str]]:
+    @timed_tool
+    def baidu_search(query: str, max_results: int = 5, fetch_pages: bool = False) -> List[Dict[str, str]]:
         """Perform a Baidu search and extract relevant information from the results.
         
+        Results are served from the shared search cache when possible.
+        
         Args:
             query (str): Search query
             max_results (int): Maximum number of results to return
+            fetch_pages (bool): Also fetch the top result pages concurrently and include their text
             
         Returns:
-            List[Dict[str, str]]: List of search results with title and content
+            List[Dict[str, str]]: List of search results with title, content and url
         """
         try:
-            # Encode the query for URL
-            encoded_query = quote(query)
-            url = f"https://www.baidu.com/s?wd={encoded_query}"
-            
-            # Send request with proper headers
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            
-            # Parse results
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            
-            # Extract search results (implementation depends on Baidu's HTML structure)
-            # This is a simplified example
-            for result in soup.find_all('div', class_='result')[:max_results]:
-                title = result.find('h3').get_text() if result.find('h3') else ''
-                content = result.find('div', class_='content').get_text() if result.find('div', class_='content') else ''
-                results.append({
-                    "title": title,
-                    "content": content
-                })
-            
+            searcher = MCPTools.get_resources().web_searcher
+            results = searcher.search(query, max_results=max_results)
+            if fetch_pages:
+                # Copy so that page contents are not written into cached result objects
+                results = searcher.fetch_pages([dict(r) for r in results])
             return results
         except Exception as e:
             return [{"error": str(e)}]
     
     @staticmethod
-    def open_calculator() -> Dict[str, Any]:
+    def _app_result(result: Dict[str, Any], success_message: str) -> Dict[str, Any]:
+        """Convert a process runner result into the tool status format."""
+        if result.get("status") == "unsupported":
+            return {"status": "unsupported", "message": "Desktop apps are not available on this platform; nothing was opened"}
+        if result["timed_out"]:
+            return {"status": "error", "message": "Command timed out"}
+        if result["returncode"] != 0:
+            return {"status": "error", "message": result["stderr"].strip() or f"Exit code {result['returncode']}"}
+        return {"status": "success", "message": success_message}
+    
+    @staticmethod
+    @timed_tool
+    async def open_calculator() -> Dict[str, Any]:
         """Open macOS Calculator application.
         
         Returns:
             Dict[str, Any]: Status of the operation
         """
         try:
-            subprocess.Popen(['open', '-a', 'Calculator'])
-            return {"status": "success", "message": "Calculator opened successfully"}
+            result = await MCPTools.get_resources().app_backend.open_app("Calculator")
+            return MCPTools._app_result(result, "Calculator opened successfully")
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
     @staticmethod
-    def open_calendar() -> Dict[str, Any]:
+    @timed_tool
+    async def open_calendar() -> Dict[str, Any]:
         """Open macOS Calendar application.
         
         Returns:
             Dict[str, Any]: Status of the operation
         """
         try:
-            subprocess.Popen(['open', '-a', 'Calendar'])
-            return {"status": "success", "message": "Calendar opened successfully"}
+            result = await MCPTools.get_resources().app_backend.open_app("Calendar")
+            return MCPTools._app_result(result, "Calendar opened successfully")
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
     @staticmethod
-    def open_notes(content: Optional[str] = None) -> Dict[str, Any]:
+    @timed_tool
+    async def open_notes(content: Optional[str] = None) -> Dict[str, Any]:
         """Open macOS Notes application and optionally create a new note.
         
         Args:
@@ -113,21 +126,24 @@ class MCPTools:
             Dict[str, Any]: Status of the operation
         """
         try:
+            backend = MCPTools.get_resources().app_backend
             if content:
-                # Create a new note with content using AppleScript
-                apple_script = f'''
-                tell application "Notes"
-                    activate
-                    tell account "iCloud"
-                        make new note with properties {{body:"{content}"}}
+                # Create a new note using AppleScript; the content is passed as an argument
+                apple_script = '''
+                on run argv
+                    tell application "Notes"
+                        activate
+                        tell account "iCloud"
+                            make new note with properties {body:(item 1 of argv)}
+                        end tell
                     end tell
-                end tell
+                end run
                 '''
-                subprocess.run(['osascript', '-e', apple_script])
-                return {"status": "success", "message": "Notes opened with new content"}
+                result = await backend.run_applescript(apple_script, [content])
+                return MCPTools._app_result(result, "Notes opened with new content")
             else:
                 # Simply open Notes app
-                subprocess.Popen(['open', '-a', 'Notes'])
-                return {"status": "success", "message": "Notes opened successfully"}
+                result = await backend.open_app("Notes")
+                return MCPTools._app_result(result, "Notes opened successfully")
         except Exception as e:
             return {"status": "error", "message": str(e)}
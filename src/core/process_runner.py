@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 进程组只在 POSIX 上可用；Windows 上超时只能杀死直接子进程
+_POSIX = os.name == "posix"
+# 杀死进程组后等待管道关闭与进程回收的最长时间（秒）
+KILL_GRACE = 1.0
+
+
+class AsyncProcessRunner:
+    """基于 asyncio 子进程的命令执行器
+
+    所有子进程都有超时、输出大小上限和并发数限制；超时的进程会被杀死并回收，
+    不会阻塞事件循环，也不会留下僵尸进程。
+    """
+
+    def __init__(self, max_concurrency: int = 4, default_timeout: float = 10.0, max_output_bytes: int = 64 * 1024):
+        """
+        Args:
+            max_concurrency (int): 同时运行的子进程数上限
+            default_timeout (float): 默认超时时间（秒）
+            max_output_bytes (int): stdout/stderr 各自保留的最大字节数，超出部分丢弃
+        """
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.max_output_bytes = max_output_bytes
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """按事件循环创建信号量，避免跨循环复用"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _read_capped(self, stream: asyncio.StreamReader, sink: Dict[str, Any]):
+        """读取输出直到 EOF，只保留前 max_output_bytes 字节，其余持续排空以免管道写满阻塞子进程
+
+        读取结果写入 sink，读取被取消时已读到的部分仍然保留。
+        """
+        while True:
+            chunk = await stream.read(8192)
+            if not chunk:
+                break
+            room = self.max_output_bytes - len(sink["data"])
+            if room > 0:
+                sink["data"].extend(chunk[:room])
+            if len(chunk) > room:
+                sink["truncated"] = True
+
+    @staticmethod
+    async def _communicate(process: asyncio.subprocess.Process, input_data: Optional[bytes]):
+        """写入 stdin 并等待直接子进程退出；子进程不读 stdin 就退出时忽略管道错误"""
+        if input_data is not None:
+            try:
+                process.stdin.write(input_data)
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                process.stdin.close()
+        # Process.wait() 要等输出管道全部关闭才返回，后台进程占着管道时直接子进程早已退出，
+        # 这里轮询 returncode（子进程退出时由事件循环设置），间隔从 1ms 逐步增加到 50ms
+        interval = 0.001
+        while process.returncode is None:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, 0.05)
+
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process):
+        """终止子进程所在的整个进程组，包括它启动的、继承了输出管道的后台进程"""
+        try:
+            if _POSIX:
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+
+    async def run(self, args: List[str], timeout: Optional[float] = None, input_data: Optional[bytes] = None) -> Dict[str, Any]:
+        """运行命令并等待结束
+
+        timeout 限制整个调用的耗时，包括写入 stdin 与读完输出。直接子进程超时未结束时，
+        整个进程组被杀死，timed_out 为 True；直接子进程已结束、但它启动的后台进程仍占着
+        输出管道时，最多等到截止时间，然后杀死这些后台进程并返回已读到的输出（timed_out 为 False）。
+
+        Args:
+            args (List[str]): 命令及参数（不经过 shell）
+            timeout (Optional[float]): 超时时间（秒），默认使用 default_timeout
+            input_data (Optional[bytes]): 写入子进程 stdin 的数据
+
+        Returns:
+            Dict[str, Any]: 包含 returncode、stdout、stderr、timed_out、truncated、elapsed
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            deadline = loop.time() + timeout
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                # 子进程自成一个进程组，超时时可以连同它的后台进程一起杀死
+                start_new_session=_POSIX
+            )
+            stdout = {"data": bytearray(), "truncated": False}
+            stderr = {"data": bytearray(), "truncated": False}
+            readers = asyncio.gather(self._read_capped(process.stdout, stdout), self._read_capped(process.stderr, stderr))
+            timed_out = False
+            try:
+                try:
+                    await asyncio.wait_for(self._communicate(process, input_data), timeout=deadline - loop.time())
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    logger.warning(f"子进程超时 ({timeout}s)，终止: {args[0]}")
+                    self._kill(process)
+                try:
+                    await asyncio.wait_for(asyncio.shield(readers), timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    # 后台进程仍占着管道：杀死进程组后管道随即关闭
+                    self._kill(process)
+                    try:
+                        await asyncio.wait_for(asyncio.shield(readers), timeout=KILL_GRACE)
+                    except asyncio.TimeoutError:
+                        # 后台进程脱离了进程组，放弃读取剩余输出
+                        readers.cancel()
+            except asyncio.CancelledError:
+                self._kill(process)
+                readers.cancel()
+                raise
+            finally:
+                if process.returncode is None:
+                    self._kill(process)
+                    # 回收已终止的子进程，避免僵尸进程
+                    try:
+                        await asyncio.wait_for(process.wait(), timeout=KILL_GRACE)
+                    except asyncio.TimeoutError:
+                        pass
+
+            return {
+                "returncode": process.returncode,
+                "stdout": stdout["data"].decode("utf-8", errors="replace"),
+                "stderr": stderr["data"].decode("utf-8", errors="replace"),
+                "timed_out": timed_out,
+                "truncated": stdout["truncated"] or stderr["truncated"],
+                "elapsed": time.perf_counter() - start
+            }
+
+
+class AppBackend(ABC):
+    """桌面应用集成后端的接口"""
+
+    name = "base"
+
+    @abstractmethod
+    async def open_app(self, app_name: str) -> Dict[str, Any]:
+        """打开应用，返回格式同 AsyncProcessRunner.run"""
+
+    @abstractmethod
+    async def run_applescript(self, script: str, args: Optional[List[str]] = None) -> Dict[str, Any]:
+        """执行 AppleScript，args 作为 argv 传入脚本，返回格式同 AsyncProcessRunner.run"""
+
+
+class MacOSAppBackend(AppBackend):
+    """macOS 后端：通过 open 和 osascript 操作应用"""
+
+    name = "macos"
+
+    def __init__(self, runner: AsyncProcessRunner):
+        self.runner = runner
+
+    async def open_app(self, app_name: str) -> Dict[str, Any]:
+        return await self.runner.run(["open", "-a", app_name])
+
+    async def run_applescript(self, script: str, args: Optional[List[str]] = None) -> Dict[str, Any]:
+        # 参数通过 argv 传入脚本，无需在脚本文本中转义用户内容
+        return await self.runner.run(["osascript", "-e", script] + list(args or []))
+
+
+class NullAppBackend(AppBackend):
+    """非 macOS 平台的空实现：不启动任何进程，只记录最近的请求，便于在 Linux 上测试
+
+    返回的 status 为 unsupported、returncode 为 None，调用方不会把它当作执行成功。
+    """
+
+    name = "null"
+
+    def __init__(self, max_calls: int = 100):
+        """
+        Args:
+            max_calls (int): 保留的最近请求数，长期运行的服务中不会无限增长
+        """
+        self.calls: Deque[Dict[str, Any]] = deque(maxlen=max_calls)
+
+    def _skipped(self, **call) -> Dict[str, Any]:
+        self.calls.append(call)
+        return {
+            "status": "unsupported",
+            "returncode": None,
+            "stdout": "",
+            "stderr": "",
+            "timed_out": False,
+            "truncated": False,
+            "elapsed": 0.0
+        }
+
+    async def open_app(self, app_name: str) -> Dict[str, Any]:
+        return self._skipped(action="open_app", app_name=app_name)
+
+    async def run_applescript(self, script: str, args: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self._skipped(action="run_applescript", script=script, args=list(args or []))
+
+
+def detect_app_backend(runner: AsyncProcessRunner, platform: Optional[str] = None) -> AppBackend:
+    """根据运行平台选择应用集成后端"""
+    platform = platform or sys.platform
+    if platform == "darwin":
+        return MacOSAppBackend(runner)
+    return NullAppBackend()
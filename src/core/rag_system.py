@@ -3,52 +3,199 @@ warnings.filterwarnings("ignore")
 
 from pathlib import Path
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from src.prompts.manager import PromptManager
+from src.prompts.manager import PromptManager, RECENT_TURNS
 from src.core.retrieve_related import VectorRetriever
+from src.core.conversation_memory import ConversationMemory
+from src.core.context_compressor import ContextCompressor
+from src.core.history_summary import HistorySummarizer
+from src.core.tool_registry import build_default_registry
+from src.core.metrics import timed, request_context, get_request_id
 import os
+import json
+import asyncio
+import logging
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class RAGSystem:
     def __init__(self, config_path="./config/chinese_fiction.json", user_id=0):
-        # 初始化模型
+        # langchain_openai 导入较慢，在构造时才导入
+        from langchain_openai import ChatOpenAI
+        
+        # 初始化模型（LLM_BASE_URL / LLM_MODEL 可覆盖默认服务，例如基准测试使用本地桩服务）
         self.llm = ChatOpenAI(
             api_key=os.getenv("DASHSCOPE_API_KEY"),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            model="deepseek-r1-distill-qwen-32b"
+            base_url=os.getenv("LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+            model=os.getenv("LLM_MODEL", "deepseek-r1-distill-qwen-32b")
         )
         
         # 初始化向量数据库
         self.retriever = VectorRetriever(config_path=config_path)
         
-        # 初始化prompt管理器
-        self.prompt_manager = PromptManager(user_id)
+        # 初始化prompt管理器：早期对话在回答返回后由后台线程合并进会话摘要
+        self.summarizer = HistorySummarizer.from_config(self.retriever.config, self.llm, RECENT_TURNS)
+        self.prompt_manager = PromptManager(user_id, summarizer=self.summarizer)
+
+        # 会话记忆：复用检索器的嵌入模型，为最近窗口之外的早期对话建立索引
+        self.memory = ConversationMemory.from_config(self.retriever.config, self.retriever.model)
+
+        # 检索上下文后处理：去重、按原文顺序排列、裁剪与问题无关的句子（未启用时为 None）
+        self.compressor = ContextCompressor.from_config(self.retriever.config)
         
-    def query(self, question: str, use_history: bool = False, use_db: bool = True):
-        """查询系统"""
+        # 初始化工具注册表
+        self.tool_registry = build_default_registry()
+        
+    def prepare_context(self, question: str, retrieved_docs: list) -> list:
+        """对检索结果做去重与裁剪，未启用后处理时原样返回"""
+        if not self.compressor:
+            return retrieved_docs
+        return self.compressor.compress(question, retrieved_docs)
+
+    def recall_memories(self, question: str, use_history: bool, session_id: str = None) -> list:
+        """从会话记忆中召回与问题相关的早期对话，未启用记忆或未指定会话时返回空列表"""
+        if not (use_history and session_id and self.memory):
+            return []
+        return self.memory.recall(session_id, question)
+
+    def remember(self, question: str, answer: str, session_id: str = None):
+        """记录本轮对话：写入最近历史，并提交会话摘要与会话记忆的后台任务
+
+        此时回答已经生成，记录失败（例如 SQLite 被其他进程长时间锁住）只记日志，不让请求失败。
+        """
+        try:
+            self.prompt_manager.add_to_history(question, answer, session_id)
+            if session_id and self.memory:
+                self.memory.add_turn(session_id, question, answer)
+        except Exception as e:
+            logger.error(f"[{get_request_id()}] 记录对话失败: {e}")
+
+    def query(self, question: str, use_history: bool = False, use_db: bool = True, request_id: str = None,
+              session_id: str = None):
+        """查询系统
+
+        Args:
+            question (str): 用户问题
+            use_history (bool): 是否使用历史对话
+            use_db (bool): 是否检索本地知识库
+            request_id (str): 请求 ID，用于关联日志与各阶段耗时，默认沿用当前上下文中的 ID
+            session_id (str): 会话 ID，指定时召回该会话中与问题相关的早期对话
+        """
+        with request_context(request_id):
+            if use_db:
+                retrieved_docs = self.prepare_context(question, self.retriever.retrieve(question))
+            else:
+                retrieved_docs = []
+            memories = self.recall_memories(question, use_history, session_id)
+            
+            # 使用prompt管理器格式化prompt
+            with timed("prompt_build"):
+                prompt = self.prompt_manager.get_qa_prompt(
+                    retrieved_docs=retrieved_docs,
+                    question=question,
+                    use_history=use_history,
+                    memories=memories,
+                    session_id=session_id
+                )
+            
+            # 调用模型生成回答
+            with timed("llm_call"):
+                response = self.llm.invoke(prompt)
+            
+            # 添加到历史记录
+            self.remember(question, response.content, session_id)
+            
+            return response.content
+
+    async def aquery_with_tools(
+        self,
+        question: str,
+        use_history: bool = False,
+        use_db: bool = True,
+        max_steps: int = 4,
+        tool_timeout: float = 10.0,
+        time_budget: float = 60.0,
+        request_id: str = None,
+        session_id: str = None
+    ) -> dict:
+        """带工具调用的查询：模型请求的工具并发执行，结果回传给模型后继续生成
+
+        Args:
+            question (str): 用户问题
+            use_history (bool): 是否使用历史对话
+            use_db (bool): 是否检索本地知识库
+            max_steps (int): 最多允许的工具调用轮数
+            tool_timeout (float): 单个工具的超时时间（秒）
+            time_budget (float): 整个工具循环的总时间预算（秒）
+            request_id (str): 请求 ID，默认沿用当前上下文中的 ID
+            session_id (str): 会话 ID，指定时召回该会话中与问题相关的早期对话
+
+        Returns:
+            dict: 包含 response（回答）和 tool_calls（工具执行记录）
+        """
+        with request_context(request_id):
+            return await self._run_tool_loop(question, use_history, use_db, max_steps, tool_timeout, time_budget,
+                                             session_id)
+
+    async def _run_tool_loop(self, question, use_history, use_db, max_steps, tool_timeout, time_budget,
+                             session_id=None) -> dict:
+        """aquery_with_tools 的实现，在请求上下文中执行"""
+        from langchain_core.messages import HumanMessage, ToolMessage
 
         if use_db:
-            retrieved_docs = self.retriever.retrieve(question)
+            retrieved_docs = await asyncio.to_thread(self.retriever.retrieve, question)
+            retrieved_docs = await asyncio.to_thread(self.prepare_context, question, retrieved_docs)
         else:
             retrieved_docs = []
-        
-        # 使用prompt管理器格式化prompt
-        prompt = self.prompt_manager.get_qa_prompt(
-            retrieved_docs=retrieved_docs,
-            question=question,
-            use_history=use_history
-        )
-        # print(prompt)
-        # self.prompt_manager.add_to_history(question, "测试回答")
-        
-        # 调用模型生成回答
-        response = self.llm.invoke(prompt)
-        
-        # 添加到历史记录
-        self.prompt_manager.add_to_history(question, response.content)
-        
-        return response.content
-        # return prompt
-        
\ No newline at end of file
+        memories = await asyncio.to_thread(self.recall_memories, question, use_history, session_id)
+
+        # 读取会话摘要要访问 SQLite，可能等待其他进程的写锁，不能在事件循环中执行
+        with timed("prompt_build"):
+            prompt = await asyncio.to_thread(
+                self.prompt_manager.get_qa_prompt,
+                retrieved_docs=retrieved_docs,
+                question=question,
+                use_history=use_history,
+                memories=memories,
+                session_id=session_id
+            )
+
+        llm_with_tools = self.llm.bind_tools(self.tool_registry.schemas())
+        messages = [HumanMessage(content=prompt)]
+        tool_records = []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_budget
+
+        response = None
+        for _ in range(max_steps):
+            with timed("llm_call"):
+                response = await llm_with_tools.ainvoke(messages)
+            if not response.tool_calls:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                # 时间预算耗尽，不再执行本轮工具调用
+                break
+            messages.append(response)
+            records = await self.tool_registry.execute_many(
+                response.tool_calls,
+                timeout=min(tool_timeout, remaining)
+            )
+            tool_records.extend(records)
+            for record in records:
+                messages.append(ToolMessage(
+                    content=json.dumps(record["result"], ensure_ascii=False, default=str),
+                    tool_call_id=record["id"]
+                ))
+
+        if response is None or response.tool_calls:
+            # 步数或时间预算耗尽，要求模型基于已有工具结果直接作答
+            with timed("llm_call"):
+                response = await self.llm.ainvoke(messages)
+
+        # 写历史文件与会话记忆都是阻塞 IO
+        await asyncio.to_thread(self.remember, question, response.content, session_id)
+
+        return {"response": response.content, "tool_calls": tool_records}
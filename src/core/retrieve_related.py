@@ -1,9 +1,14 @@
+import os
 import json
 import logging
+import threading
 from pathlib import Path
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
+from src.core.metrics import timed, get_request_id
+from src.core.corpus_store import CORPUS_STORE_FLAG, CorpusStore
+from src.core.corpus_router import CorpusRouter, load_corpora, manifest_paths
+from src.core.collection_aliases import CollectionAliases
+from src.core.embedding import load_embedding_model, set_num_threads
+from concurrent.futures import ThreadPoolExecutor
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,12 +17,12 @@ logger = logging.getLogger(__name__)
 class VectorRetriever:
     """从 Chroma 向量数据库检索相关内容的类"""
     
-    def __init__(self, config_path: str = "./config.json"):
+    def __init__(self, config_path: str = "./config/chinese_fiction.json"):
         """
         初始化 VectorRetriever，加载配置并连接 Chroma 数据库
         
         Args:
-            config_path (str): 配置文件路径，默认为 ./config.json
+            config_path (str): 配置文件路径，默认为 ./config/chinese_fiction.json
         """
         # 加载配置文件
         self.config = self._load_config(config_path)
@@ -27,18 +32,47 @@ class VectorRetriever:
         self.collection_name = self.config["collection_name"]
         self.embedding_model = self.config["embedding_model"]
         self.max_results = self.config["max_results"]
+        # 上下文扩展窗口：命中 chunk 前后各取几个同章节的相邻 chunk，0 表示不扩展
+        self.context_window = self.config.get("context_window", 0)
+        # 逻辑集合名到实际集合的别名，后台重建索引完成后切换
+        self.aliases = CollectionAliases.from_config(self.config)
+        self._refresh_lock = threading.Lock()
         
-        # 初始化嵌入函数
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=self.embedding_model
-        )
+        # 初始化嵌入模型（只加载一次，供所有查询复用）
+        # chromadb / sentence_transformers 导入开销很大，延迟到真正需要时再导入
+        # 推理后端（fp32 / int8 / ONNX）由配置中的 embedding 段选择，见 src/core/embedding.py
+        self.model = load_embedding_model(self.embedding_model, self.config.get("embedding"))
         # logger.info(f"初始化嵌入模型: {self.embedding_model}")
         
         # 连接 Chroma 数据库
         self.client = self._connect_to_chroma()
-        
-        # 获取集合
-        self.collection = self._get_collection()
+        self._executor = None
+        self._load_collections()
+
+    def reconnect(self):
+        """重新连接 Chroma 数据库
+
+        fork 出的工作进程不能复用父进程的 SQLite 连接，需要在子进程中重新建立。
+        """
+        try:
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except (ImportError, AttributeError):
+            pass
+        self.client = self._connect_to_chroma()
+        self._load_collections()
+        # 父进程的线程池不能在子进程中使用
+        self._executor = None
+
+    def warm_up(self, num_threads: int = None):
+        """预热嵌入模型，使首个查询不承担初始化开销
+
+        Args:
+            num_threads (int): 设置 PyTorch 计算线程数，多工作进程时用于避免线程超额订阅
+                （onnx 后端的线程数在加载时由 embedding.num_threads 确定）
+        """
+        set_num_threads(num_threads)
+        self.model.encode(["预热"])
 
     def _load_config(self, config_path: str) -> dict:
         """加载配置文件"""
@@ -54,8 +88,9 @@ class VectorRetriever:
             logger.error(f"配置文件格式错误: {config_path}")
             raise
 
-    def _connect_to_chroma(self) -> chromadb.Client:
+    def _connect_to_chroma(self) -> "chromadb.ClientAPI":
         """连接到 Chroma 数据库"""
+        import chromadb
         try:
             client = chromadb.PersistentClient(path=self.db_path)
             # logger.info(f"成功连接到 Chroma 数据库: {self.db_path}")
@@ -64,51 +99,223 @@ class VectorRetriever:
             logger.error(f"连接 Chroma 数据库失败: {e}")
             raise
 
-    def _get_collection(self) -> chromadb.Collection:
-        """获取 Chroma 集合"""
-        try:
-            collection = self.client.get_collection(name=self.collection_name)
-            # logger.info(f"成功获取集合: {self.collection_name}")
-            return collection
-        except Exception as e:
-            logger.error(f"获取集合失败: {e}")
-            raise
+    def _change_stamp(self) -> tuple:
+        """别名文件、语料清单与入库登记文件的修改标记，任一变化都需要重新加载集合"""
+        mtimes = []
+        for path in manifest_paths(self.config):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return self.aliases.stamp(), tuple(mtimes)
+
+    def _load_collections(self):
+        """加载语料清单、解析别名并获取集合
+
+        入库时标记了 corpus_store 的集合不在 Chroma 中保存 chunk 文本，检索后按 chunk 编号从 mmap 中读取；
+        其余集合（旧方式构建、文本保存在 Chroma 中）仍从 Chroma 读取文本。是否请求 documents 按集合分别决定，
+        保留旧向量库后再入库新语料时两种集合可以并存。
+        """
+        stamp = self._change_stamp()
+        # 配置了语料清单（或有后台入库登记的语料）时每本书一个集合，否则只使用 collection_name
+        router = CorpusRouter(
+            load_corpora(self.config)
+            or [{"name": self.collection_name, "collection_name": self.collection_name}]
+        )
+        collections = self._get_collections(router)
+        corpus = CorpusStore(self.config["corpus_dir"]) if self.config.get("corpus_dir") else None
+        corpus = corpus if corpus and corpus.sources() else None
+
+        self.router, self.collections, self.corpus = router, collections, corpus
+        self.collection = next(iter(collections.values()))
+        self.includes = {name: self._include_for(collection, corpus) for name, collection in collections.items()}
+        self._stamp = stamp
+
+    def refresh_if_changed(self):
+        """别名或语料清单变化后（后台入库完成切换集合时）重新加载集合，否则只有几次 stat 的开销"""
+        if self._change_stamp() == self._stamp:
+            return
+        with self._refresh_lock:
+            if self._change_stamp() != self._stamp:
+                self._load_collections()
+                logger.info(f"集合已切换: {self.aliases.entries()}")
+
+    def _get_collections(self, router: CorpusRouter) -> dict:
+        """获取清单中全部语料的集合（按别名解析实际集合名），尚未入库的语料跳过"""
+        collections = {}
+        for corpus in router.corpora:
+            try:
+                collections[corpus["name"]] = self.client.get_collection(
+                    name=self.aliases.resolve(corpus["collection_name"])
+                )
+            except Exception as e:
+                logger.warning(f"语料 {corpus['name']} 的集合不可用，已跳过: {e}")
+        if not collections:
+            raise RuntimeError(f"没有可用的集合: {router.names}")
+        return collections
+
+    @staticmethod
+    def _include_for(collection, corpus: CorpusStore = None) -> list:
+        """集合查询时需要 Chroma 返回的字段：只有文本保存在语料存储中的集合不取 documents"""
+        if corpus and (collection.metadata or {}).get(CORPUS_STORE_FLAG):
+            return ["metadatas", "distances"]
+        return ["documents", "metadatas", "distances"]
+
+    def _query_collections(self, collections: dict, assignments: dict, n_results: int, includes: dict) -> dict:
+        """并发查询多个集合
+
+        Args:
+            collections (dict): 语料名称 -> 集合（本次检索开始时的快照）
+            assignments (dict): 语料名称 -> 该集合需要查询的嵌入列表
+            n_results (int): 每个查询返回的结果数
+            includes (dict): 语料名称 -> 该集合需要 Chroma 返回的字段
 
-    def retrieve(self, query: str) -> list:
+        Returns:
+            dict: 语料名称 -> Chroma 查询结果
+        """
+        def query(name):
+            return collections[name].query(
+                query_embeddings=assignments[name],
+                n_results=n_results,
+                include=includes[name]
+            )
+
+        names = list(assignments)
+        if len(names) == 1:
+            return {names[0]: query(names[0])}
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.collections), thread_name_prefix="corpus-query")
+        return dict(zip(names, self._executor.map(query, names)))
+
+    def retrieve(self, query: str, top_k: int = None, corpora: list = None, window: int = None) -> list:
         """
         从 Chroma 数据库检索与查询相关的文本内容
         
         Args:
             query (str): 查询文本
+            top_k (int): 返回结果数，默认使用配置中的 max_results
+            corpora (list): 限定检索的语料名称，默认按查询内容路由
+            window (int): 上下文扩展窗口，默认使用配置中的 context_window
             
         Returns:
-            list: 包含检索结果的列表，每个元素为 dict，包含 text、metadata、distance
+            list: 包含检索结果的列表，每个元素为 dict，包含 text、metadata、distance、corpus
+        """
+        return self.retrieve_batch([query], top_k=top_k, corpora=corpora, window=window)[0]
+
+    def retrieve_batch(self, queries: list, top_k: int = None, corpora: list = None, window: int = None) -> list:
         """
+        批量检索：一次编码全部查询，每个集合只查询一次（包含路由到该集合的全部查询）
+
+        Args:
+            queries (list): 查询文本列表
+            top_k (int): 每个查询返回的结果数，默认使用配置中的 max_results
+            corpora (list): 限定检索的语料名称，默认按查询内容路由
+            window (int): 上下文扩展窗口，默认使用配置中的 context_window
+
+        Returns:
+            list: 与 queries 一一对应的结果列表，每项格式同 retrieve
+        """
+        if not queries:
+            return []
+        top_k = top_k or self.max_results
+        window = self.context_window if window is None else window
         try:
-            # 生成查询嵌入
-            model = SentenceTransformer(self.embedding_model)
-            query_embedding = model.encode([query])[0].tolist()
-            # logger.info(f"生成查询嵌入，维度: {len(query_embedding)}")
-
-            # 执行检索
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=self.max_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            self.refresh_if_changed()
+            # 集合可能在检索过程中被切换，本次检索始终使用同一份快照
+            router, collections, corpus, includes = self.router, self.collections, self.corpus, self.includes
+            with timed("embedding"):
+                query_embeddings = self.model.encode(list(queries), batch_size=32).tolist()
 
-            # 格式化结果
-            retrieved_content = []
-            for doc, meta, dist in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
-                retrieved_content.append({
-                    "text": doc,
-                    "metadata": meta,
-                    "distance": dist
-                })
-            
-            # logger.info(f"检索到 {len(retrieved_content)} 条相关内容")
-            return retrieved_content
+            # 语料名称 -> 路由到该语料的查询下标
+            routes = {}
+            for i, query in enumerate(queries):
+                for name in router.route(query, corpora):
+                    if name in collections:
+                        routes.setdefault(name, []).append(i)
+            if not routes:
+                routes = {name: list(range(len(queries))) for name in collections}
+
+            with timed("ann_query"):
+                results = self._query_collections(
+                    collections,
+                    {name: [query_embeddings[i] for i in indices] for name, indices in routes.items()},
+                    top_k,
+                    includes
+                )
+
+            candidates = [[] for _ in queries]
+            for name, indices in routes.items():
+                for position, i in enumerate(indices):
+                    candidates[i].append(self._collect(results[name], position, name))
+
+            merged = [router.merge(lists, top_k) for lists in candidates]
+            if window > 0 and corpus:
+                return [self._expand(items, window, corpus) for items in merged]
+            return [self._resolve(items, corpus) for items in merged]
 
         except Exception as e:
-            logger.error(f"检索失败: {e}")
+            logger.error(f"[{get_request_id()}] 检索失败: {e}")
             raise
+
+    def _collect(self, results: dict, index: int, corpus_name: str) -> list:
+        """将 Chroma 第 index 个查询的结果整理为 text、metadata、distance、corpus 字典列表"""
+        documents = results["documents"][index] if results.get("documents") else None
+        return [
+            {
+                "text": documents[j] if documents else None,
+                "metadata": meta,
+                "distance": dist,
+                "corpus": corpus_name
+            }
+            for j, (meta, dist) in enumerate(zip(results["metadatas"][index], results["distances"][index]))
+        ]
+
+    def _resolve(self, items: list, corpus: CorpusStore = None) -> list:
+        """为合并后最终返回的 chunk 从语料存储中读取文本；来自旧集合的 chunk 已带有文本"""
+        if corpus:
+            for item in items:
+                meta = item["metadata"] or {}
+                if item["text"] is None and "source" in meta and "chunk" in meta:
+                    item["text"] = corpus.text(meta["source"], meta["chunk"])
+        return items
+
+    def _expand(self, items: list, window: int, corpus: CorpusStore) -> list:
+        """
+        将命中的 chunk 扩展为前后各 window 个同章节相邻 chunk 组成的段落
+
+        相邻关系来自语料存储中的偏移与章节数组，不需要额外查询向量库。重叠或首尾相接的
+        段落合并为一段，取其中最小的距离，结果按距离排序。
+        """
+        ranges = []
+        passthrough = []
+        for item in items:
+            meta = item["metadata"] or {}
+            # 已带文本的 chunk 来自旧集合，语料存储中没有它的偏移
+            if item["text"] is not None or "source" not in meta or "chunk" not in meta:
+                passthrough.append(item)
+                continue
+            first, last = corpus.neighbors(meta["source"], meta["chunk"], window)
+            ranges.append((meta["source"], first, last, item))
+
+        passages = []
+        for source, first, last, item in sorted(ranges, key=lambda r: (r[0], r[1])):
+            previous = passages[-1] if passages else None
+            if (previous and previous["source"] == source and first <= previous["last"] + 1
+                    and corpus.chapter(source, first) == corpus.chapter(source, previous["last"])):
+                previous["last"] = max(previous["last"], last)
+                previous["hits"].append(item)
+            else:
+                passages.append({"source": source, "first": first, "last": last, "hits": [item]})
+
+        results = self._resolve(passthrough, corpus)
+        for passage in passages:
+            best = min(passage["hits"], key=lambda hit: hit["distance"])
+            start, _ = corpus.span(passage["source"], passage["first"])
+            _, end = corpus.span(passage["source"], passage["last"])
+            results.append({
+                "text": corpus.text_range(passage["source"], start, end),
+                "metadata": {**best["metadata"], "chunk_range": [passage["first"], passage["last"]]},
+                "distance": best["distance"],
+                "corpus": best["corpus"]
+            })
+        return sorted(results, key=lambda item: item["distance"])
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""聊天请求的限流与公平调度
+
+请求进入 RAG 系统前先经过两层控制：
+    1. 令牌桶限流：每个会话、每个客户端各一个桶，桶空时直接拒绝并给出重试等待时间
+    2. 公平队列：同时执行的请求数有上限，排队的请求按会话轮转出队，
+       一个会话连续发送大量请求也只能轮流占用执行槽位；短请求优先于长请求
+
+调度器运行在事件循环中，只负责决定何时开始执行；实际的 RAG 调用由调用方放到线程中，
+不阻塞事件循环。多工作进程部署时每个进程各自调度。
+"""
+
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from src.core.metrics import REGISTRY
+
+# 优先级：数值越小越先执行
+PRIORITY_SHORT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_NAMES = {PRIORITY_SHORT: "short", PRIORITY_NORMAL: "normal"}
+
+# 长时间未使用的令牌桶会被清理，避免随会话数无限增长
+MAX_BUCKETS = 10000
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    "scheduler_queue_depth",
+    "Chat requests waiting for an execution slot",
+    labelnames=("priority",)
+)
+ACTIVE_REQUESTS = REGISTRY.gauge(
+    "scheduler_active_requests",
+    "Chat requests currently executing"
+)
+REJECTED_REQUESTS = REGISTRY.counter(
+    "scheduler_rejected_total",
+    "Chat requests rejected by rate limiting or a full queue",
+    labelnames=("reason",)
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "scheduler_queue_wait_seconds",
+    "Time chat requests spend waiting in the fair queue",
+    labelnames=("priority",)
+)
+
+
+class RateLimited(Exception):
+    """请求被限流或队列已满"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶：以 rate 个/秒的速度补充，最多积累 burst 个"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离有一个可用令牌还需等待的秒数，0 表示现在可用"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _BucketSet:
+    """按键（会话 ID 或客户端 ID）划分的令牌桶，最近最少使用的桶先被清理"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            while len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+class FairScheduler:
+    """按会话轮转的公平调度器，需在同一个事件循环中使用"""
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 64,
+                 session_rate: float = 0.5, session_burst: float = 5,
+                 client_rate: float = 1.0, client_burst: float = 10,
+                 short_chars: int = 30):
+        """
+        Args:
+            max_concurrency (int): 同时执行的请求数上限
+            max_queue (int): 排队请求数上限，超过时拒绝新请求
+            session_rate (float): 每个会话每秒补充的令牌数，0 表示不限流
+            session_burst (float): 每个会话令牌桶的容量
+            client_rate (float): 每个客户端每秒补充的令牌数，0 表示不限流
+            client_burst (float): 每个客户端令牌桶的容量
+            short_chars (int): 问题不超过该字数且不使用工具的请求视为短请求，优先调度
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.short_chars = short_chars
+        self._session_buckets = _BucketSet(session_rate, session_burst) if session_rate > 0 else None
+        self._client_buckets = _BucketSet(client_rate, client_burst) if client_rate > 0 else None
+        # 优先级 -> (会话 ID -> 该会话排队请求的 future 队列)，会话按轮转顺序排列
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self._queued = 0
+        self._active = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "FairScheduler":
+        """根据配置中的 scheduler 段创建调度器"""
+        options = config.get("scheduler", {})
+        return cls(
+            max_concurrency=options.get("max_concurrency", 4),
+            max_queue=options.get("max_queue", 64),
+            session_rate=options.get("session_rate", 0.5),
+            session_burst=options.get("session_burst", 5),
+            client_rate=options.get("client_rate", 1.0),
+            client_burst=options.get("client_burst", 10),
+            short_chars=options.get("short_chars", 30)
+        )
+
+    def priority_for(self, question: str, use_tools: bool = False) -> int:
+        """短问题且不调用工具的请求检索和生成都更快，优先执行"""
+        return PRIORITY_SHORT if not use_tools and len(question) <= self.short_chars else PRIORITY_NORMAL
+
+    def _admit(self, session_id: str, client_id: str):
+        """检查令牌桶与队列容量，不允许时抛出 RateLimited"""
+        now = time.monotonic()
+        buckets = []
+        if self._session_buckets:
+            buckets.append(self._session_buckets.get(session_id))
+        if self._client_buckets:
+            buckets.append(self._client_buckets.get(client_id))
+        wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+        if wait > 0:
+            REJECTED_REQUESTS.inc(reason="rate_limited")
+            raise RateLimited(f"请求过于频繁，请 {wait:.1f} 秒后再试", wait)
+        if self._active >= self.max_concurrency and self._queued >= self.max_queue:
+            REJECTED_REQUESTS.inc(reason="queue_full")
+            raise RateLimited("服务繁忙，请稍后再试", 1.0)
+        # 两个桶都有令牌时才扣除，避免被拒绝的请求消耗另一个桶
+        for bucket in buckets:
+            bucket.take()
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, client_id: str, priority: int = PRIORITY_NORMAL):
+        """获取一个执行槽位，退出时释放并调度下一个请求
+
+        Raises:
+            RateLimited: 会话或客户端超出速率，或排队请求已满
+        """
+        self._admit(session_id, client_id)
+        if self._active < self.max_concurrency and self._queued == 0:
+            self._active += 1
+            ACTIVE_REQUESTS.set(self._active)
+        else:
+            await self._wait_in_queue(session_id, priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _wait_in_queue(self, session_id: str, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(session_id, deque()).append(future)
+        self._queued += 1
+        QUEUE_DEPTH.inc(priority=PRIORITY_NAMES[priority])
+        start = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 客户端断开：还在队列中时移除；已被分配槽位时归还
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self._remove(session_id, priority, future)
+            raise
+        QUEUE_WAIT.observe(time.perf_counter() - start, priority=PRIORITY_NAMES[priority])
+
+    def _remove(self, session_id: str, priority: int, future: asyncio.Future):
+        queue = self._queues[priority].get(session_id)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._queues[priority][session_id]
+            self._queued -= 1
+            QUEUE_DEPTH.dec(priority=PRIORITY_NAMES[priority])
+
+    def _release(self):
+        """归还槽位；有排队请求时直接转交给下一个请求"""
+        following = self._next()
+        if following is None:
+            self._active -= 1
+            ACTIVE_REQUESTS.set(self._active)
+        else:
+            following.set_result(None)
+
+    def _next(self) -> Optional[asyncio.Future]:
+        """按优先级取出下一个请求：同一优先级内按会话轮转，取出后该会话移到队尾"""
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            while sessions:
+                session_id, queue = next(iter(sessions.items()))
+                future = queue.popleft()
+                if queue:
+                    sessions.move_to_end(session_id)
+                else:
+                    del sessions[session_id]
+                self._queued -= 1
+                QUEUE_DEPTH.dec(priority=PRIORITY_NAMES[priority])
+                if not future.done():
+                    return future
+        return None
+
+    @property
+    def active(self) -> int:
+        """正在执行的请求数；只读一个整数，可以在事件循环之外的线程中调用（stats 会遍历排队字典）"""
+        return self._active
+
+    def stats(self) -> Dict[str, Any]:
+        """当前调度状态（/ready 接口返回），需在事件循环中调用"""
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "queued_by_priority": {
+                PRIORITY_NAMES[p]: sum(len(q) for q in sessions.values()) for p, sessions in self._queues.items()
+            },
+            "queued_sessions": len({s for sessions in self._queues.values() for s in sessions})
+        }
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会话归档：把长期不活跃的会话压缩写入分段文件，按需解压
+
+每个会话压缩为一个独立的帧（gzip member 或 zstd frame）追加到当前分段文件
+segment-<n>.<ext> 中，SQLite 索引记录会话所在的分段、偏移和长度。读取单个会话时
+只读取并解压它自己的帧，不需要解压整个分段。
+
+恢复或删除会话只删除索引行，帧仍留在分段中；compact 把垃圾比例较高的分段中仍在索引里的帧
+复制到新分段、更新索引后删除旧分段，回收这部分空间。
+
+安装了 zstandard 时使用 zstd，否则使用标准库 gzip。
+"""
+
+import os
+import gzip
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 分段文件达到该大小后开始写入新分段
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+# 分段中不再被索引引用的字节达到该比例时压实
+DEFAULT_COMPACT_RATIO = 0.5
+
+CODEC_EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def compress(data: bytes, codec: Optional[str] = None) -> Tuple[str, bytes]:
+    """压缩数据，返回 (codec, 压缩后的字节)"""
+    codec = codec or default_codec()
+    if codec == "zstd":
+        return codec, zstandard.ZstdCompressor(level=10).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=9)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("该会话使用 zstd 压缩，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class SessionArchive:
+    """会话归档存储，调用方负责跨进程加锁（SessionManager 在会话锁内调用写操作）"""
+
+    def __init__(self, archive_dir: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.index_path = self.archive_dir / "index.sqlite"
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个进程使用自己的连接：fork 出的工作进程不能复用父进程的 SQLite 连接"""
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, timeout=30)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS archived ("
+                "session_id TEXT PRIMARY KEY, segment TEXT NOT NULL, offset INTEGER NOT NULL, "
+                "length INTEGER NOT NULL, codec TEXT NOT NULL, title TEXT, time TEXT, "
+                "message_count INTEGER NOT NULL, archived_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def _current_segment(self, codec: str) -> Path:
+        """返回可继续追加的分段文件，当前分段已满时新建"""
+        ext = CODEC_EXTENSIONS[codec]
+        segments = sorted(self.archive_dir.glob(f"segment-*.{ext}"))
+        if segments and segments[-1].stat().st_size < self.segment_bytes:
+            return segments[-1]
+        return self._new_segment(ext)
+
+    def _new_segment(self, ext: str) -> Path:
+        segments = sorted(self.archive_dir.glob(f"segment-*.{ext}"))
+        number = int(segments[-1].name.split("-")[1].split(".")[0]) + 1 if segments else 1
+        return self.archive_dir / f"segment-{number:06d}.{ext}"
+
+    def add(self, session: Dict[str, Any], messages: List[Dict[str, Any]], archived_at: float) -> int:
+        """追加一个会话，返回压缩后的字节数"""
+        codec, data = compress(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            segment = self._current_segment(codec)
+            with open(segment, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO archived VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session["id"], segment.name, offset, len(data), codec,
+                 session.get("title"), session.get("time"), len(messages), archived_at)
+            )
+            conn.commit()
+        return len(data)
+
+    def contains(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM archived WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None
+
+    def load(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """读取并解压单个归档会话，不存在时返回 None"""
+        for attempt in range(2):
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT segment, offset, length, codec FROM archived WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            segment, offset, length, codec = row
+            try:
+                with open(self.archive_dir / segment, "rb") as f:
+                    f.seek(offset)
+                    data = f.read(length)
+            except FileNotFoundError:
+                # 其他进程刚压实并删除了该分段，索引已指向新分段，重新查询一次
+                if attempt:
+                    raise
+                continue
+            return json.loads(decompress(data, codec))
+
+    def remove(self, session_id: str) -> bool:
+        """从索引中移除会话（恢复或删除时调用），分段中的帧在 compact 时回收"""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute("DELETE FROM archived WHERE session_id = ?", (session_id,))
+            conn.commit()
+        return cursor.rowcount > 0
+
+    def compact(self, min_garbage_ratio: float = DEFAULT_COMPACT_RATIO) -> Dict[str, int]:
+        """压实分段文件
+
+        不再被索引引用的字节占分段大小的比例达到 min_garbage_ratio 时，把该分段中仍在索引里的帧
+        按原顺序追加到本次新建的分段并 fsync，更新索引后删除旧分段；没有有效帧的分段直接删除。
+        先提交索引再删除旧分段，任何时刻索引指向的帧都完整存在。调用方负责跨进程加锁。
+
+        Returns:
+            Dict[str, int]: 压实的分段数与回收的字节数
+        """
+        result = {"compacted_segments": 0, "reclaimed_bytes": 0}
+        with self._lock:
+            conn = self._connection()
+            live = dict(conn.execute("SELECT segment, SUM(length) FROM archived GROUP BY segment").fetchall())
+            for ext in CODEC_EXTENSIONS.values():
+                target = None
+                for path in sorted(self.archive_dir.glob(f"segment-*.{ext}")):
+                    size = path.stat().st_size
+                    live_bytes = live.get(path.name, 0)
+                    if size and size - live_bytes < size * min_garbage_ratio:
+                        continue
+                    rows = conn.execute(
+                        "SELECT session_id, offset, length FROM archived WHERE segment = ? ORDER BY offset",
+                        (path.name,)
+                    ).fetchall()
+                    if rows:
+                        # 本次压实中新建的分段，写满 segment_bytes 后再新建一个
+                        if target is None or target.stat().st_size >= self.segment_bytes:
+                            target = self._new_segment(ext)
+                        moved = []
+                        with open(path, "rb") as src, open(target, "ab") as dst:
+                            for session_id, offset, length in rows:
+                                src.seek(offset)
+                                moved.append((target.name, dst.tell(), session_id))
+                                dst.write(src.read(length))
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        conn.executemany("UPDATE archived SET segment = ?, offset = ? WHERE session_id = ?", moved)
+                        conn.commit()
+                    path.unlink()
+                    result["compacted_segments"] += 1
+                    result["reclaimed_bytes"] += size - live_bytes
+        return result
+
+    def list_sessions(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """分页列出归档会话（按会话 ID 倒序，即时间从新到旧）"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT session_id, title, time, message_count, archived_at FROM archived "
+                "ORDER BY session_id DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [
+            {"id": r[0], "title": r[1], "time": r[2], "message_count": r[3], "archived_at": r[4]}
+            for r in rows
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM archived").fetchone()[0]
+
+    def iter_ids(self, batch_size: int = 500) -> Iterator[str]:
+        """分批遍历全部归档会话 ID，不一次性加载整个索引"""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._connection().execute(
+                    "SELECT session_id FROM archived WHERE session_id > ? ORDER BY session_id LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for (session_id,) in rows:
+                yield session_id
+            last = rows[-1][0]
@@ -2,22 +2,102 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import json
 import time
 import datetime
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from pathlib import Path
+from src.core.metrics import timed
+from src.core.session_archive import SessionArchive
+from src.core.session_search import SessionSearchIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为进程内锁
+    fcntl = None
+
+DEFAULT_CLIENT_ID = "default"
+
+# 导入会话时只接受这种形式的会话 ID，避免写出会话目录
+_SESSION_ID_PATTERN = re.compile(r"^[\w\-]{1,64}$")
+
 
 class SessionManager:
-    """管理用户对话会话"""
-    
-    def __init__(self):
+    """管理用户对话会话
+
+    会话文件可能被多个后端工作进程同时读写：写操作在目录级文件锁内完成并以
+    原子替换方式落盘；会话列表缓存在内存中，通过共享的版本文件感知其他进程的修改。
+    “当前会话”按客户端区分，保存在共享状态文件中。
+    长期不活跃的会话可归档到压缩分段文件中（见 session_archive.py），热目录只保留活跃会话。
+    """
+
+    def __init__(self, base_dir: str = "resources/default_history"):
         """初始化会话管理器"""
-        self.base_dir = Path("resources/default_history")
+        self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
-        self.current_session_id = None
+        self.state_dir = self.base_dir / ".state"
+        self.state_dir.mkdir(exist_ok=True)
+        self.lock_path = self.state_dir / "sessions.lock"
+        self.version_path = self.state_dir / "version"
+        self.clients_path = self.state_dir / "clients.json"
+        self._thread_lock = threading.Lock()
+        self.archive = SessionArchive(self.base_dir / ".archive")
+        # 消息全文索引，保存消息时增量更新，首次检索时补建已有会话的索引
+        self.search_index = SessionSearchIndex(self.state_dir / "search.sqlite")
+        self._version = None
+        self.sessions = []
+        if self._current_version() is None:
+            with self._locked():
+                if self._current_version() is None:
+                    self._bump_version()
+        self._refresh()
+
+    @contextmanager
+    def _locked(self):
+        """跨进程互斥锁，保护会话文件的读-改-写"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_json(path: Path, data: Any):
+        """先写临时文件再原子替换，读者不会看到写了一半的文件"""
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _current_version(self) -> Optional[int]:
+        try:
+            return int(self.version_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _bump_version(self):
+        """递增共享版本号，通知所有进程（包括本进程）重新加载会话列表（需在锁内调用）"""
+        version = (self._current_version() or 0) + 1
+        tmp_path = self.version_path.with_name(f".version.{os.getpid()}.tmp")
+        tmp_path.write_text(str(version))
+        os.replace(tmp_path, self.version_path)
+
+    def _refresh(self):
+        """如果其他进程修改过会话列表，则重新加载"""
+        version = self._current_version()
+        if version is not None and version == self._version:
+            return
         self.sessions = self._load_sessions()
-    
+        self._version = version
+
     def _load_sessions(self) -> List[Dict[str, Any]]:
         """加载所有现有会话"""
         sessions = []
@@ -26,7 +106,7 @@ class SessionManager:
                 session_id = file_path.stem
                 with open(file_path, 'r', encoding='utf-8') as f:
                     content = json.load(f)
-                    
+
                 # 提取标题 (第一个用户消息，如果存在的话)
                 title = "新会话"
                 if content and len(content) > 0:
@@ -36,14 +116,14 @@ class SessionManager:
                             if len(msg.get('content', '')) > 30:
                                 title += "..."
                             break
-                
+
                 # 格式化时间作为可读的会话时间
                 try:
                     timestamp = int(session_id.split('_')[0])
                     formatted_time = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
                 except (ValueError, IndexError):
                     formatted_time = file_path.stem  # 回退到文件名
-                
+
                 sessions.append({
                     "id": session_id,
                     "title": title,
@@ -52,117 +132,259 @@ class SessionManager:
                 })
             except Exception as e:
                 print(f"加载会话 {file_path} 时出错: {e}")
-                
+
         return sessions
-    
+
+    def _find_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        for session in self.sessions:
+            if session["id"] == session_id:
+                return session
+        return None
+
+    def _load_clients(self) -> Dict[str, str]:
+        try:
+            with open(self.clients_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _set_client_session(self, client_id: str, session_id: Optional[str]):
+        """更新客户端的当前会话（需在锁内调用）"""
+        clients = self._load_clients()
+        if session_id is None:
+            clients.pop(client_id, None)
+        else:
+            clients[client_id] = session_id
+        self._write_json(self.clients_path, clients)
+
     def get_sessions(self) -> List[Dict[str, Any]]:
         """获取所有会话的列表"""
+        self._refresh()
         return self.sessions
-    
-    def create_session(self) -> str:
-        """创建新的会话"""
+
+    def create_session(self, client_id: str = DEFAULT_CLIENT_ID) -> str:
+        """创建新的会话，并设为该客户端的当前会话"""
         timestamp = int(time.time())
         session_id = f"{timestamp}_{os.urandom(4).hex()}"
         file_path = self.base_dir / f"{session_id}.json"
-        
-        # 初始化空会话
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
-        
+
+        with self._locked():
+            # 初始化空会话
+            self._write_json(file_path, [])
+            self._set_client_session(client_id, session_id)
+            self._bump_version()
+
         # 添加到会话列表
-        self.sessions.insert(0, {
-            "id": session_id,
-            "title": "新会话",
-            "time": datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M"),
-            "path": str(file_path)
-        })
-        
-        self.current_session_id = session_id
+        self._refresh()
         return session_id
-    
+
     def get_session(self, session_id: str) -> List[Dict[str, str]]:
-        """获取指定会话的内容"""
-        for session in self.sessions:
-            if session["id"] == session_id:
-                file_path = Path(session["path"])
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                except Exception as e:
-                    print(f"读取会话 {session_id} 时出错: {e}")
-                    return []
-        return []
-    
+        """获取指定会话的内容，已归档的会话按需解压读取"""
+        session = self._find_session(session_id)
+        if session is None:
+            try:
+                with timed("session_io"):
+                    return self.archive.load(session_id) or []
+            except Exception as e:
+                print(f"读取归档会话 {session_id} 时出错: {e}")
+                return []
+        try:
+            with timed("session_io"), open(session["path"], 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取会话 {session_id} 时出错: {e}")
+            return []
+
     def save_message(self, session_id: str, message: Dict[str, str]) -> bool:
         """保存消息到会话"""
-        # 查找会话
-        session_path = None
-        for session in self.sessions:
-            if session["id"] == session_id:
-                session_path = Path(session["path"])
-                break
-        
-        if not session_path:
+        # 查找会话，已归档的会话先恢复到热目录再继续对话
+        session = self._find_session(session_id)
+        if session is None and self.restore_session(session_id):
+            session = self._find_session(session_id)
+        if session is None:
             print(f"未找到会话 {session_id}")
             return False
-        
-        # 读取当前消息
-        try:
-            with open(session_path, 'r', encoding='utf-8') as f:
-                messages = json.load(f)
-        except Exception:
-            messages = []
-        
-        # 添加新消息
-        messages.append(message)
-        
-        # 保存回文件
+        session_path = Path(session["path"])
+
         try:
-            with open(session_path, 'w', encoding='utf-8') as f:
-                json.dump(messages, f, ensure_ascii=False, indent=2)
-            
-            # 如果这是第一条用户消息，更新标题
-            if message.get('role') == 'user' and (len(messages) <= 2):
-                for i, session in enumerate(self.sessions):
-                    if session["id"] == session_id:
-                        content = message.get('content', '')
-                        title = content[:30] + ("..." if len(content) > 30 else "")
-                        self.sessions[i]["title"] = title
-                        break
-            
+            with timed("session_io"), self._locked():
+                # 在锁内读取当前消息，避免并发追加时互相覆盖
+                try:
+                    with open(session_path, 'r', encoding='utf-8') as f:
+                        messages = json.load(f)
+                except Exception:
+                    messages = []
+
+                # 添加新消息并保存回文件
+                messages.append(message)
+                self._write_json(session_path, messages)
+                self.search_index.add(session_id, len(messages) - 1, message)
+
+                # 如果这是第一条用户消息，更新标题
+                if message.get('role') == 'user' and (len(messages) <= 2):
+                    self._bump_version()
+
+            self._refresh()
             return True
         except Exception as e:
             print(f"保存消息到会话 {session_id} 时出错: {e}")
             return False
-    
-    def set_current_session(self, session_id: str) -> bool:
-        """设置当前会话"""
-        for session in self.sessions:
-            if session["id"] == session_id:
-                self.current_session_id = session_id
-                return True
-        return False
-    
-    def get_current_session_id(self) -> Optional[str]:
-        """获取当前会话ID"""
-        return self.current_session_id
-    
+
+    def set_current_session(self, session_id: str, client_id: str = DEFAULT_CLIENT_ID) -> bool:
+        """设置客户端的当前会话"""
+        if self._find_session(session_id) is None and not self.restore_session(session_id):
+            return False
+        with self._locked():
+            self._set_client_session(client_id, session_id)
+        return True
+
+    def get_current_session_id(self, client_id: str = DEFAULT_CLIENT_ID) -> Optional[str]:
+        """获取客户端的当前会话ID"""
+        session_id = self._load_clients().get(client_id)
+        if session_id and self._find_session(session_id) is None:
+            return None
+        return session_id
+
     def delete_session(self, session_id: str) -> bool:
         """删除会话"""
-        for i, session in enumerate(self.sessions):
-            if session["id"] == session_id:
-                file_path = Path(session["path"])
+        session = self._find_session(session_id)
+        if session is None:
+            with self._locked():
+                self.search_index.remove(session_id)
+                return self.archive.remove(session_id)
+        file_path = Path(session["path"])
+        try:
+            with self._locked():
+                if file_path.exists():
+                    file_path.unlink()
+                self.archive.remove(session_id)
+                self.search_index.remove(session_id)
+
+                # 如果删除的是某些客户端的当前会话，重置这些客户端的当前会话
+                clients = self._load_clients()
+                remaining = {cid: sid for cid, sid in clients.items() if sid != session_id}
+                if remaining != clients:
+                    self._write_json(self.clients_path, remaining)
+                self._bump_version()
+
+            self._refresh()
+            return True
+        except Exception as e:
+            print(f"删除会话 {session_id} 时出错: {e}")
+            return False
+
+    def archive_sessions(self, older_than_days: float) -> Dict[str, int]:
+        """将超过指定天数未更新的会话压缩归档，各客户端的当前会话不归档
+
+        Returns:
+            Dict[str, int]: 归档的会话数、归档前后的字节数，以及压实的分段数与回收的字节数
+        """
+        cutoff = time.time() - older_than_days * 86400
+        result = {"archived": 0, "original_bytes": 0, "compressed_bytes": 0}
+        with self._locked():
+            self._refresh()
+            active = set(self._load_clients().values())
+            for session in list(self.sessions):
+                path = Path(session["path"])
                 try:
-                    if file_path.exists():
-                        file_path.unlink()
-                    self.sessions.pop(i)
-                    
-                    # 如果删除的是当前会话，重置当前会话
-                    if self.current_session_id == session_id:
-                        self.current_session_id = None
-                    
-                    return True
+                    stat = path.stat()
+                    if stat.st_mtime >= cutoff or session["id"] in active:
+                        continue
+                    with open(path, 'r', encoding='utf-8') as f:
+                        messages = json.load(f)
+                    result["compressed_bytes"] += self.archive.add(session, messages, time.time())
+                    result["original_bytes"] += stat.st_size
+                    path.unlink()
+                    result["archived"] += 1
                 except Exception as e:
-                    print(f"删除会话 {session_id} 时出错: {e}")
-                    return False
-        return False 
\ No newline at end of file
+                    print(f"归档会话 {session['id']} 时出错: {e}")
+            if result["archived"]:
+                self._bump_version()
+            # 恢复与删除留下的无效帧在这里回收
+            result.update(self.archive.compact())
+        self._refresh()
+        return result
+
+    def restore_session(self, session_id: str) -> bool:
+        """将归档会话恢复到热目录，会话不在归档中时返回 False"""
+        with self._locked():
+            messages = self.archive.load(session_id)
+            if messages is None:
+                return False
+            self._write_json(self.base_dir / f"{session_id}.json", messages)
+            self.archive.remove(session_id)
+            self._bump_version()
+        self._refresh()
+        return True
+
+    def list_archived(self, offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """分页列出归档会话"""
+        return {"sessions": self.archive.list_sessions(offset, limit), "total": self.archive.count()}
+
+    def iter_export(self) -> Iterator[Dict[str, Any]]:
+        """逐个产出全部会话（热目录与归档），每次只在内存中保留一个会话"""
+        for session in list(self.get_sessions()):
+            messages = self.get_session(session["id"])
+            yield {"id": session["id"], "archived": False, "messages": messages}
+        for session_id in self.archive.iter_ids():
+            messages = self.archive.load(session_id)
+            if messages is not None:
+                yield {"id": session_id, "archived": True, "messages": messages}
+
+    def import_sessions(self, records: Iterable[Dict[str, Any]], overwrite: bool = False) -> Dict[str, int]:
+        """导入会话记录（格式同 iter_export），导入的会话写入热目录
+
+        Args:
+            records (Iterable[Dict[str, Any]]): 会话记录，包含 id 和 messages
+            overwrite (bool): 已存在同 ID 会话时是否覆盖
+        """
+        result = {"imported": 0, "skipped": 0, "invalid": 0}
+        with self._locked():
+            for record in records:
+                session_id = str(record.get("id", ""))
+                messages = record.get("messages")
+                if not _SESSION_ID_PATTERN.match(session_id) or not isinstance(messages, list):
+                    result["invalid"] += 1
+                    continue
+                path = self.base_dir / f"{session_id}.json"
+                exists = path.exists() or self.archive.contains(session_id)
+                if exists and not overwrite:
+                    result["skipped"] += 1
+                    continue
+                self._write_json(path, messages)
+                self.archive.remove(session_id)
+                self.search_index.index_session(session_id, messages)
+                result["imported"] += 1
+            if result["imported"]:
+                self._bump_version()
+        self._refresh()
+        return result
+
+    def _ensure_search_index(self):
+        """首次检索时为已有会话（包括归档会话）建立全文索引"""
+        if self.search_index.is_built():
+            return
+        with self._locked():
+            if self.search_index.is_built():
+                return
+            self.search_index.index_sessions(
+                (record["id"], record["messages"]) for record in self.iter_export()
+            )
+            self.search_index.mark_built()
+
+    def search_sessions(self, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """全文检索全部会话的消息，按相关度排序并分页
+
+        Returns:
+            Dict[str, Any]: results（命中消息及其所在会话、片段）、total、page、page_size
+        """
+        self._ensure_search_index()
+        page, page_size = max(1, page), max(1, min(page_size, 100))
+        with timed("session_search"):
+            results, total = self.search_index.search(query, (page - 1) * page_size, page_size)
+        titles = {session["id"]: session["title"] for session in self.get_sessions()}
+        for result in results:
+            result["title"] = titles.get(result["session_id"])
+            result["archived"] = result["session_id"] not in titles
+        return {"results": results, "total": total, "page": page, "page_size": page_size}
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会话全文检索：基于 SQLite FTS5 trigram 分词的增量倒排索引
+
+trigram 分词不依赖中文分词器，任意长度不少于 3 个字符的子串都能走索引；
+更短的检索词（如“宝玉”）退化为 LIKE 扫描，在 FTS 表上仍然很快。
+索引由 SessionManager 在保存消息时增量更新。
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+# trigram 分词下能走索引的最短检索词长度
+MIN_INDEXED_TERM = 3
+SNIPPET_CHARS = 24
+
+
+def _quote(term: str) -> str:
+    """将检索词转为 FTS5 字符串字面量，避免被解析为查询语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def make_snippet(content: str, terms: List[str], width: int = SNIPPET_CHARS) -> str:
+    """截取第一个命中检索词附近的文本并用 <mark> 标记命中"""
+    lowered = content.lower()
+    positions = [lowered.find(t.lower()) for t in terms]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width) if positions else 0
+    end = min(len(content), start + width * 2 + max((len(t) for t in terms), default=0))
+    snippet = content[start:end]
+    # 在截取的片段中找出全部命中区间，合并重叠后统一加标记
+    lowered = snippet.lower()
+    spans = []
+    for term in set(t.lower() for t in terms):
+        index = lowered.find(term)
+        while index >= 0:
+            spans.append((index, index + len(term)))
+            index = lowered.find(term, index + len(term))
+    marked, cursor = [], 0
+    for span_start, span_end in sorted(spans):
+        if span_start < cursor:
+            if span_end > cursor:
+                marked.insert(-1, snippet[cursor:span_end])
+                cursor = span_end
+            continue
+        marked.extend([snippet[cursor:span_start], "<mark>", snippet[span_start:span_end], "</mark>"])
+        cursor = span_end
+    snippet = "".join(marked) + snippet[cursor:]
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+
+class SessionSearchIndex:
+    """会话消息的全文索引，每条消息一行"""
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个进程使用自己的连接：fork 出的工作进程不能复用父进程的 SQLite 连接"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                "content, session_id UNINDEXED, role UNINDEXED, position UNINDEXED, tokenize='trigram')"
+            )
+            # FTS5 的 UNINDEXED 列不能走索引，按会话删除时通过该表定位行
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_rows (session_id TEXT NOT NULL, row INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS session_rows_session ON session_rows (session_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def is_built(self) -> bool:
+        """是否已完成首次全量建索引"""
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+        return row is not None
+
+    def mark_built(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('built', '1')")
+            conn.commit()
+
+    def add(self, session_id: str, position: int, message: Dict[str, Any]):
+        """索引一条新消息"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._insert(conn, session_id, position, message)
+
+    def index_session(self, session_id: str, messages: Iterable[Dict[str, Any]]):
+        """重建单个会话的索引（导入会话时使用）"""
+        self.index_sessions([(session_id, messages)])
+
+    def index_sessions(self, sessions: Iterable[Tuple[str, Iterable[Dict[str, Any]]]]):
+        """在一个事务中重建多个会话的索引（全量建索引时使用）"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for session_id, messages in sessions:
+                    self._delete(conn, session_id)
+                    for position, message in enumerate(messages):
+                        self._insert(conn, session_id, position, message)
+
+    def remove(self, session_id: str):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._delete(conn, session_id)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, session_id: str, position: int, message: Dict[str, Any]):
+        content = message.get("content")
+        if not isinstance(content, str) or not content.strip():
+            return
+        cursor = conn.execute(
+            "INSERT INTO messages (content, session_id, role, position) VALUES (?, ?, ?, ?)",
+            (content, session_id, message.get("role", ""), position)
+        )
+        conn.execute("INSERT INTO session_rows VALUES (?, ?)", (session_id, cursor.lastrowid))
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, session_id: str):
+        conn.execute(
+            "DELETE FROM messages WHERE rowid IN (SELECT row FROM session_rows WHERE session_id = ?)",
+            (session_id,)
+        )
+        conn.execute("DELETE FROM session_rows WHERE session_id = ?", (session_id,))
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+        """按相关度检索消息
+
+        Args:
+            query (str): 检索词，空格分隔的多个词需同时命中
+            offset (int): 分页偏移
+            limit (int): 每页条数
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: 当前页结果（session_id、role、position、snippet、score）与总命中数
+        """
+        terms = [t for t in query.split() if t]
+        if not terms:
+            return [], 0
+        indexed = [t for t in terms if len(t) >= MIN_INDEXED_TERM]
+        scanned = [t for t in terms if len(t) < MIN_INDEXED_TERM]
+
+        conditions, params = [], []
+        if indexed:
+            conditions.append("messages MATCH ?")
+            params.append(" AND ".join(_quote(t) for t in indexed))
+        for term in scanned:
+            conditions.append("content LIKE ? ESCAPE '\\'")
+            params.append(f"%{_escape_like(term)}%")
+        where = " AND ".join(conditions)
+        # 有可用的全文条件时按 BM25 排序，否则按时间从新到旧
+        order = "bm25(messages)" if indexed else "session_id DESC, position DESC"
+        score = "bm25(messages)" if indexed else "0"
+
+        with self._lock:
+            conn = self._connection()
+            total = conn.execute(f"SELECT COUNT(*) FROM messages WHERE {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT session_id, role, position, content, {score} FROM messages "
+                f"WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return [
+            {
+                "session_id": session_id,
+                "role": role,
+                "position": position,
+                "snippet": make_snippet(content, terms),
+                "score": round(-rank, 4) if indexed else None
+            }
+            for session_id, role, position, content, rank in rows
+        ], total
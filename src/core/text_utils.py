@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""文本相关的小工具，供会话记忆、入库编码与上下文后处理共用，不依赖模型和数据库"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数：中日韩字符按每字 1 个 token，其他字符按 4 个字符 1 个 token"""
+    cjk = sum(1 for c in text if "\u3000" <= c <= "\u9fff" or "\uff00" <= c <= "\uffef")
+    return cjk + (len(text) - cjk + 3) // 4
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import json
+import asyncio
+import inspect
+import typing
+from typing import Any, Callable, Dict, List, Optional
+
+# Python 类型到 JSON Schema 类型的映射
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object"
+}
+
+_ARG_LINE = re.compile(r"^\s*(\w+)\s*(?:\([^)]*\))?\s*:\s*(.+)$")
+
+
+def _json_type(annotation: Any) -> Dict[str, Any]:
+    """将类型注解转换为 JSON Schema 片段，Optional[X] 按 X 处理"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _json_type(args[0]) if args else {}
+    if origin is not None:
+        annotation = origin
+    json_type = _JSON_TYPES.get(annotation)
+    return {"type": json_type} if json_type else {}
+
+
+def _parse_docstring(doc: str):
+    """解析 Google 风格 docstring，返回 (描述, {参数名: 参数说明})"""
+    if not doc:
+        return "", {}
+    lines = inspect.cleandoc(doc).splitlines()
+    summary = []
+    for line in lines:
+        if not line.strip():
+            break
+        summary.append(line.strip())
+
+    arg_docs = {}
+    in_args = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped in ("Args:", "Arguments:", "参数:"):
+            in_args = True
+            continue
+        if in_args:
+            if stripped.endswith(":") and not _ARG_LINE.match(line):
+                break
+            match = _ARG_LINE.match(line)
+            if match:
+                arg_docs[match.group(1)] = match.group(2).strip()
+    return " ".join(summary), arg_docs
+
+
+def build_schema(func: Callable) -> Dict[str, Any]:
+    """根据函数签名和 docstring 生成 JSON Schema 参数定义"""
+    signature = inspect.signature(func)
+    hints = typing.get_type_hints(func)
+    _, arg_docs = _parse_docstring(func.__doc__)
+
+    properties = {}
+    required = []
+    for name, param in signature.parameters.items():
+        if name in ("self", "cls") or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        prop = _json_type(hints.get(name, str))
+        if name in arg_docs:
+            prop["description"] = arg_docs[name]
+        if param.default is inspect.Parameter.empty:
+            required.append(name)
+        else:
+            prop["default"] = param.default
+        properties[name] = prop
+
+    return {"type": "object", "properties": properties, "required": required}
+
+
+class ToolSpec:
+    """单个已注册工具的描述"""
+
+    def __init__(self, name: str, func: Callable, description: str, parameters: Dict[str, Any],
+                 timeout: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.description = description
+        self.parameters = parameters
+        self.timeout = timeout
+
+    def schema(self) -> Dict[str, Any]:
+        """OpenAI function calling 格式的工具定义"""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        }
+
+
+class ToolRegistry:
+    """工具注册表：发布工具的 JSON Schema，并发执行模型请求的工具调用"""
+
+    def __init__(self, default_timeout: float = 10.0):
+        """
+        Args:
+            default_timeout (float): 未单独指定超时的工具使用的超时时间（秒）
+        """
+        self.default_timeout = default_timeout
+        self._tools: Dict[str, ToolSpec] = {}
+
+    def register(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None,
+                 timeout: Optional[float] = None) -> ToolSpec:
+        """注册工具，名称和描述默认取自函数名和 docstring"""
+        summary, _ = _parse_docstring(func.__doc__)
+        spec = ToolSpec(
+            name=name or func.__name__,
+            func=func,
+            description=description or summary,
+            parameters=build_schema(func),
+            timeout=timeout
+        )
+        self._tools[spec.name] = spec
+        return spec
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._tools.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """所有工具的 JSON Schema 列表"""
+        return [spec.schema() for spec in self._tools.values()]
+
+    async def execute(self, call: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """执行一次工具调用，超时或出错时返回 status=error 的记录而不是抛出异常
+
+        Args:
+            call (Dict[str, Any]): 包含 id、name、args 的工具调用
+            timeout (Optional[float]): 本次调用允许的最长时间，与工具自身超时取较小值
+
+        Returns:
+            Dict[str, Any]: 包含 id、name、arguments、status、result、elapsed 的执行记录
+        """
+        name = call.get("name", "")
+        arguments = call.get("args") or {}
+        record = {"id": call.get("id"), "name": name, "arguments": arguments}
+        if isinstance(arguments, str):
+            # 模型生成的参数可能不是合法 JSON，只让这一次调用失败，不影响同一轮的其他工具
+            try:
+                arguments = record["arguments"] = json.loads(arguments or "{}")
+            except ValueError as e:
+                record.update(status="error", result=f"工具参数不是合法的 JSON: {e}", elapsed=0.0)
+                return record
+
+        spec = self._tools.get(name)
+        if spec is None:
+            record.update(status="error", result=f"未知工具: {name}", elapsed=0.0)
+            return record
+
+        limits = [t for t in (spec.timeout, timeout) if t is not None]
+        limit = min(limits) if limits else self.default_timeout
+
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(spec.func):
+                awaitable = spec.func(**arguments)
+            else:
+                awaitable = asyncio.to_thread(spec.func, **arguments)
+            record["result"] = await asyncio.wait_for(awaitable, timeout=limit)
+            record["status"] = "success"
+        except asyncio.TimeoutError:
+            record.update(status="error", result=f"工具 {name} 执行超时 ({limit}s)")
+        except Exception as e:
+            record.update(status="error", result=str(e))
+        record["elapsed"] = time.perf_counter() - start
+        return record
+
+    async def execute_many(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """并发执行多个工具调用，总耗时取决于最慢的工具而非耗时之和"""
+        return list(await asyncio.gather(*(self.execute(call, timeout) for call in calls)))
+
+
+def build_default_registry() -> ToolRegistry:
+    """注册 MCPTools 中的全部工具"""
+    from .mcp_tools import MCPTools
+
+    registry = ToolRegistry()
+    registry.register(MCPTools.search_local_database, timeout=15.0)
+    registry.register(MCPTools.baidu_search, timeout=15.0)
+    registry.register(MCPTools.open_calculator, timeout=5.0)
+    registry.register(MCPTools.open_calendar, timeout=5.0)
+    registry.register(MCPTools.open_notes, timeout=5.0)
+    return registry
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import threading
+import asyncio
+import functools
+from typing import Any, Callable, Dict, Optional
+from .metrics import REGISTRY, STAGE_LATENCY
+
+TOOL_LATENCY = REGISTRY.histogram(
+    "mcp_tool_duration_seconds",
+    "Latency of each MCP tool call",
+    labelnames=("tool",)
+)
+TOOL_ERRORS = REGISTRY.counter(
+    "mcp_tool_errors_total",
+    "Number of MCP tool calls that returned or raised an error",
+    labelnames=("tool",)
+)
+
+DEFAULT_CONFIG_PATH = "./config/chinese_fiction.json"
+
+
+class ToolMetrics:
+    """记录每个工具的调用次数、耗时和错误数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, tool_name: str, elapsed: float, error: bool = False):
+        """记录一次工具调用"""
+        STAGE_LATENCY.observe(elapsed, stage="tool_call")
+        TOOL_LATENCY.observe(elapsed, tool=tool_name)
+        if error:
+            TOOL_ERRORS.inc(tool=tool_name)
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {
+                "calls": 0,
+                "errors": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0
+            })
+            stats["calls"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if error:
+                stats["errors"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """返回当前统计数据的副本，附带平均耗时"""
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                item = dict(stats)
+                item["avg_seconds"] = stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0
+                result[name] = item
+            return result
+
+
+class ToolResources:
+    """工具共享的长生命周期资源（检索器、HTTP 会话、缓存）
+
+    在后端启动时创建一次并通过 MCPTools.configure 注入，
+    工具调用只承担实际工作的开销，而不是每次重新初始化。
+    未显式传入的资源在首次使用时惰性创建。
+    """
+
+    def __init__(
+        self,
+        config_path: str = DEFAULT_CONFIG_PATH,
+        retriever: Optional[Any] = None,
+        http_session: Optional[Any] = None
+    ):
+        """
+        Args:
+            config_path (str): 检索器配置文件路径
+            retriever (Optional[VectorRetriever]): 复用已有的检索器，例如 RAGSystem 的检索器
+            http_session (Optional[requests.Session]): 复用已有的 HTTP 会话
+        """
+        self.config_path = config_path
+        self._config: Optional[Dict[str, Any]] = None
+        self._retriever = retriever
+        self._http_session = http_session
+        self._web_searcher = None
+        self._process_runner = None
+        self._app_backend = None
+        self._lock = threading.RLock()
+        self.cache: Dict[str, Any] = {}
+        self.metrics = ToolMetrics()
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """工具相关配置，配置文件不存在时为空字典"""
+        if self._config is None:
+            try:
+                with open(self.config_path, 'r', encoding='utf-8') as f:
+                    self._config = json.load(f)
+            except FileNotFoundError:
+                self._config = {}
+        return self._config
+
+    @property
+    def retriever(self):
+        """共享的 VectorRetriever 实例"""
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    from .retrieve_related import VectorRetriever
+                    self._retriever = VectorRetriever(config_path=self.config_path)
+        return self._retriever
+
+    @property
+    def http_session(self):
+        """共享的 requests.Session，复用底层连接"""
+        if self._http_session is None:
+            with self._lock:
+                if self._http_session is None:
+                    from .web_search import create_http_session
+                    pool_size = self.config.get("web_search", {}).get("max_workers", 4) * 2
+                    self._http_session = create_http_session(pool_size=pool_size)
+        return self._http_session
+
+    @property
+    def web_searcher(self):
+        """共享的 WebSearcher，与其他工具共用 HTTP 会话"""
+        if self._web_searcher is None:
+            with self._lock:
+                if self._web_searcher is None:
+                    from .web_search import WebSearcher
+                    self._web_searcher = WebSearcher.from_config(self.config, session=self.http_session)
+        return self._web_searcher
+
+    @property
+    def process_runner(self):
+        """共享的异步子进程执行器，限制所有工具的子进程总并发"""
+        if self._process_runner is None:
+            with self._lock:
+                if self._process_runner is None:
+                    from .process_runner import AsyncProcessRunner
+                    options = self.config.get("process_runner", {})
+                    self._process_runner = AsyncProcessRunner(
+                        max_concurrency=options.get("max_concurrency", 4),
+                        default_timeout=options.get("timeout", 10.0),
+                        max_output_bytes=options.get("max_output_bytes", 64 * 1024)
+                    )
+        return self._process_runner
+
+    @property
+    def app_backend(self):
+        """按平台选择的应用集成后端，非 macOS 平台为不启动进程的空实现"""
+        if self._app_backend is None:
+            with self._lock:
+                if self._app_backend is None:
+                    from .process_runner import detect_app_backend
+                    self._app_backend = detect_app_backend(self.process_runner)
+        return self._app_backend
+
+    def close(self):
+        """释放持有的网络资源"""
+        if self._web_searcher is not None:
+            self._web_searcher.close()
+            self._web_searcher = None
+            self._http_session = None
+        if self._http_session is not None:
+            self._http_session.close()
+            self._http_session = None
+
+
+def timed_tool(func: Callable) -> Callable:
+    """记录工具调用耗时的装饰器，支持同步和异步工具，错误结果同样计入统计"""
+
+    def record(start: float, error: bool):
+        # 延迟导入，避免与 mcp_tools 循环依赖
+        from .mcp_tools import MCPTools
+        MCPTools.get_resources().metrics.record(func.__name__, time.perf_counter() - start, error)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = True
+            try:
+                result = await func(*args, **kwargs)
+                error = _is_error_result(result)
+                return result
+            finally:
+                record(start, error)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = func(*args, **kwargs)
+            error = _is_error_result(result)
+            return result
+        finally:
+            record(start, error)
+
+    return wrapper
+
+
+def _is_error_result(result: Any) -> bool:
+    """判断工具返回值是否表示错误（工具约定以 error 字段或 status=error 返回错误）"""
+    if isinstance(result, dict):
+        return result.get("status") == "error" or "error" in result
+    if isinstance(result, list) and len(result) == 1 and isinstance(result[0], dict):
+        return "error" in result[0]
+    return False
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+}
+
+
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    """创建带连接池的 HTTP 会话
+
+    Args:
+        pool_size (int): 每个主机保持的最大连接数
+
+    Returns:
+        requests.Session: 复用 TCP/TLS 连接的会话
+    """
+    session = requests.Session()
+    # 连接失败重试一次；读取超时不重试，否则一次请求最长要等两倍的读取超时
+    retries = Retry(total=1, read=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def select_parser(parser: str = "auto") -> str:
+    """选择 HTML 解析器，auto 时优先使用 C 实现的 lxml"""
+    if parser != "auto":
+        return parser
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+def _has_result_class(value: Any) -> bool:
+    """匹配 class 中包含 result 的结果块（解析阶段 class 可能仍是未拆分的字符串）"""
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return "result" in classes
+
+
+class SearchCache:
+    """基于 SQLite 的持久化 TTL 缓存，键为查询，值为解析后的结果"""
+
+    def __init__(self, db_path: Union[str, Path] = "resources/cache/web_search.sqlite", ttl: float = 3600):
+        """
+        Args:
+            db_path (Union[str, Path]): 缓存文件路径，":memory:" 表示仅内存缓存
+            ttl (float): 缓存有效期（秒）
+        """
+        self.ttl = ttl
+        if str(db_path) != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """根据查询参数生成缓存键"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取未过期的缓存值，不存在或已过期时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        """写入缓存值"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + self.ttl)
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """删除过期条目，返回删除数量"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WebSearcher:
+    """百度搜索客户端：连接池、严格超时、TTL 缓存以及并发的多查询/网页抓取"""
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[SearchCache] = None,
+        search_url: str = "https://www.baidu.com/s",
+        timeout: Tuple[float, float] = (3.05, 5.0),
+        parser: str = "auto",
+        max_workers: int = 4
+    ):
+        """
+        Args:
+            session (Optional[requests.Session]): 共享的 HTTP 会话，默认创建带连接池的会话
+            cache (Optional[SearchCache]): 结果缓存，为 None 时不缓存
+            search_url (str): 搜索地址，可指向本地测试服务器
+            timeout (Tuple[float, float]): (连接超时, 读取超时)，单位秒
+            parser (str): HTML 解析器，auto / lxml / html.parser
+            max_workers (int): 并发请求的最大线程数
+        """
+        self.session = session or create_http_session(pool_size=max_workers * 2)
+        self.cache = cache
+        self.search_url = search_url
+        self.timeout = timeout
+        self.parser = select_parser(parser)
+        self.max_workers = max_workers
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], session: Optional[requests.Session] = None) -> "WebSearcher":
+        """根据配置中的 web_search 段创建搜索器"""
+        options = config.get("web_search", {})
+        cache = None
+        if options.get("cache_ttl", 3600) > 0:
+            cache = SearchCache(
+                db_path=options.get("cache_path", "resources/cache/web_search.sqlite"),
+                ttl=options.get("cache_ttl", 3600)
+            )
+        return cls(
+            session=session,
+            cache=cache,
+            search_url=options.get("search_url", "https://www.baidu.com/s"),
+            timeout=(options.get("connect_timeout", 3.05), options.get("read_timeout", 5.0)),
+            parser=options.get("parser", "auto"),
+            max_workers=options.get("max_workers", 4)
+        )
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        """执行一次搜索，命中缓存时不发起网络请求
+
+        Args:
+            query (str): 搜索词
+            max_results (int): 最大结果数
+
+        Returns:
+            List[Dict[str, str]]: 包含 title、content、url 的结果列表
+        """
+        key = SearchCache.make_key("search", self.search_url, query, max_results)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = self.session.get(self.search_url, params={"wd": query}, timeout=self.timeout)
+        response.raise_for_status()
+        results = self.parse_results(response.text, max_results)
+
+        if self.cache is not None:
+            self.cache.set(key, results)
+        return results
+
+    def parse_results(self, html: str, max_results: int) -> List[Dict[str, str]]:
+        """从搜索结果页中提取结果，只为结果块构建解析树"""
+        only_results = SoupStrainer("div", class_=_has_result_class)
+        soup = BeautifulSoup(html, self.parser, parse_only=only_results)
+        results = []
+        for result in soup.find_all("div", class_="result", limit=max_results):
+            heading = result.find("h3")
+            link = heading.find("a") if heading else None
+            content = result.find("div", class_="content")
+            results.append({
+                "title": heading.get_text(strip=True) if heading else "",
+                "content": content.get_text(strip=True) if content else "",
+                "url": link.get("href", "") if link else ""
+            })
+        return results
+
+    def search_many(self, queries: List[str], max_results: int = 5) -> Dict[str, List[Dict[str, str]]]:
+        """并发执行多个查询，单个查询失败时返回包含 error 的结果"""
+        unique_queries = list(dict.fromkeys(queries))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_queries) or 1)) as executor:
+            futures = {q: executor.submit(self.search, q, max_results) for q in unique_queries}
+        results = {}
+        for query, future in futures.items():
+            try:
+                results[query] = future.result()
+            except Exception as e:
+                logger.warning(f"搜索 {query} 失败: {e}")
+                results[query] = [{"error": str(e)}]
+        return results
+
+    def fetch_page(self, url: str, max_chars: int = 2000) -> str:
+        """抓取网页并提取正文文本（截断到 max_chars）"""
+        key = SearchCache.make_key("page", url, max_chars)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, self.parser, parse_only=SoupStrainer("body"))
+        for tag in soup(["script", "style"]):
+            tag.decompose()
+        text = " ".join(soup.get_text(" ", strip=True).split())[:max_chars]
+
+        if self.cache is not None:
+            self.cache.set(key, text)
+        return text
+
+    def fetch_pages(self, results: List[Dict[str, str]], max_chars: int = 2000) -> List[Dict[str, str]]:
+        """并发抓取搜索结果对应的网页，将正文写入 page_content 字段"""
+        targets = [r for r in results if r.get("url")]
+        if not targets:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as executor:
+            futures = [(r, executor.submit(self.fetch_page, r["url"], max_chars)) for r in targets]
+        for result, future in futures:
+            try:
+                result["page_content"] = future.result()
+            except Exception as e:
+                logger.warning(f"抓取网页 {result['url']} 失败: {e}")
+                result["page_content"] = ""
+        return results
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
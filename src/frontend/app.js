@@ -5,6 +5,16 @@ let sessions = [];
 let messages = [];
 let isProcessing = false;
 
+// 客户端标识：区分不同浏览器各自的当前会话
+const CLIENT_ID = (() => {
+    let id = localStorage.getItem('client_id');
+    if (!id) {
+        id = (crypto.randomUUID && crypto.randomUUID()) || `${Date.now()}_${Math.random().toString(16).slice(2)}`;
+        localStorage.setItem('client_id', id);
+    }
+    return id;
+})();
+
     // DOM 元素
     const chatContainer = document.getElementById('chat-container');
     const messageInput = document.getElementById('message-input');
@@ -40,7 +50,8 @@ async function loadSessions() {
         const response = await fetch(`${API_BASE_URL}/sessions/list`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({})
         });
@@ -79,7 +90,8 @@ async function loadSession(sessionId) {
         const response = await fetch(`${API_BASE_URL}/sessions/get`, {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
                 },
                 body: JSON.stringify({
                 session_id: sessionId
@@ -121,7 +133,8 @@ async function setCurrentSession(sessionId) {
         const response = await fetch(`${API_BASE_URL}/sessions/set_current`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 session_id: sessionId
@@ -146,7 +159,8 @@ async function createNewSession() {
         const response = await fetch(`${API_BASE_URL}/sessions/create`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             }
         });
         
@@ -191,7 +205,8 @@ async function deleteSession(sessionId) {
         const response = await fetch(`${API_BASE_URL}/sessions/delete`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 session_id: sessionId
@@ -306,7 +321,8 @@ async function sendMessage() {
         const response = await fetch(`${API_BASE_URL}/chat`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 messages: messages.map(msg => ({
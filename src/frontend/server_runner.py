@@ -2,18 +2,161 @@
 # -*- coding: utf-8 -*-
 
 import os
+import gzip
+import threading
 import http.server
-import socketserver
 from pathlib import Path
+from typing import Dict, Optional
 
-def run_server(port=8080):
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 需要预压缩的文本类资源
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".svg", ".txt"}
+
+# 未做文件名指纹的文本资源每次都重新验证（命中时返回 304），图片允许浏览器缓存一天
+REVALIDATE_CACHE_CONTROL = "no-cache"
+IMAGE_CACHE_CONTROL = "public, max-age=86400"
+
+
+class AssetCache:
+    """静态资源的压缩版本与 ETag 缓存，文件修改后自动重新生成"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+
+    def get(self, path: str) -> Optional[dict]:
+        """返回文件的元信息与压缩版本，文件不存在时返回 None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["version"] == version:
+                return entry
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        entry = {"version": version, "size": stat.st_size, "etag": etag, "variants": {}}
+        if Path(path).suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            with open(path, "rb") as f:
+                data = f.read()
+            compressed = {"gzip": gzip.compress(data, compresslevel=9)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(data, quality=11)
+            for encoding, body in compressed.items():
+                # 只保留确实更小的压缩版本
+                if len(body) < len(data):
+                    entry["variants"][encoding] = {"body": body, "etag": f'{etag[:-1]}-{encoding}"'}
+
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def preload(self, directory: str):
+        """启动时预先压缩目录下的全部资源，首个请求无需等待压缩"""
+        for path in Path(directory).rglob("*"):
+            if path.is_file():
+                self.get(str(path))
+
+
+class StaticFileHandler(http.server.SimpleHTTPRequestHandler):
+    """支持预压缩、ETag/Cache-Control 和 sendfile 零拷贝发送的静态文件处理器"""
+
+    protocol_version = "HTTP/1.1"
+    assets = AssetCache()
+
+    def log_message(self, format, *args):
+        # 静态资源请求量大，不逐条打印
+        pass
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _resolve(self) -> Optional[str]:
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        return path if os.path.isfile(path) else None
+
+    def _choose_encoding(self, entry: dict) -> Optional[str]:
+        accepted = self.headers.get("Accept-Encoding", "")
+        accepted = {item.split(";")[0].strip() for item in accepted.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in entry["variants"]:
+                return encoding
+        return None
+
+    def _serve(self, send_body: bool):
+        path = self._resolve()
+        entry = self.assets.get(path) if path else None
+        if entry is None:
+            self.send_error(404, "File not found")
+            return
+
+        encoding = self._choose_encoding(entry)
+        variant = entry["variants"].get(encoding) if encoding else None
+        etag = variant["etag"] if variant else entry["etag"]
+        is_image = self.guess_type(path).startswith("image/")
+
+        not_modified = etag in self.headers.get("If-None-Match", "")
+
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", IMAGE_CACHE_CONTROL if is_image else REVALIDATE_CACHE_CONTROL)
+        self.send_header("Vary", "Accept-Encoding")
+        if not_modified:
+            # 304 没有消息体，也不携带 Content-Length
+            self.end_headers()
+            return
+
+        self.send_header("Content-Type", self.guess_type(path))
+        if variant:
+            self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(len(variant["body"])))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(variant["body"])
+            return
+
+        # 未压缩的文件由内核直接从页缓存发送到套接字；
+        # 长度取自已打开的文件，缓存的 size 可能已过期
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            if send_body:
+                self.connection.sendfile(f, 0, size)
+
+
+class StaticServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def create_server(port: int = 8080, directory: Optional[str] = None) -> StaticServer:
+    """创建多线程静态文件服务器，每个连接由独立线程处理"""
+    directory = str(directory or Path(__file__).parent.absolute())
+
+    class Handler(StaticFileHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+    StaticFileHandler.assets.preload(directory)
+    return StaticServer(("", port), Handler)
+
+
+def run_server(port=8080, directory=None):
     """启动前端静态文件服务器"""
-    # 获取前端目录的绝对路径
-    current_dir = Path(__file__).parent.absolute()
-    os.chdir(current_dir)
-    
-    handler = http.server.SimpleHTTPRequestHandler
-    with socketserver.TCPServer(("", port), handler) as httpd:
+    with create_server(port, directory) as httpd:
         print(f"前端服务器已启动: http://localhost:{port}")
         try:
             httpd.serve_forever()
@@ -22,4 +165,4 @@ def run_server(port=8080):
             httpd.shutdown()
 
 if __name__ == "__main__":
-    run_server() 
\ No newline at end of file
+    run_server()
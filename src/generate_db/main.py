@@ -1,6 +1,17 @@
-from write_db import ChromaVectorStore
+from pathlib import Path
+
+from src.generate_db.write_db import ChromaVectorStore
+from src.core.corpus_router import load_corpora
 
 
 vector_store = ChromaVectorStore('config/chinese_fiction.json')
 
-vector_store.store_texts_from_file()
\ No newline at end of file
+# 配置了语料清单时按清单（合并后台入库登记的语料）逐本入库，否则只导入 default_input_file
+# 集合已有数据时写入影子集合并切换别名，重新运行不会影响正在服务的集合
+corpora = load_corpora(vector_store.config)
+if not corpora:
+    input_file = vector_store.config.get("vector_store", {}).get("default_input_file", "book.txt")
+    corpora = [{"name": Path(input_file).stem, "input_file": input_file, "collection_name": vector_store.collection_name}]
+vector_store.store_corpora(
+    corpora, retain_previous=vector_store.config.get("ingestion", {}).get("retain_previous", 1)
+)
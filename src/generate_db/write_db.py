@@ -2,8 +2,49 @@ from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 import json
-import os, re
-from typing import List, Optional, Dict, Any, Tuple
+import os, re, bisect, time, uuid
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Dict, Any, Tuple
+
+from src.core.collection_aliases import CollectionAliases
+from src.core.corpus_store import CORPUS_STORE_FLAG, CorpusStore, CorpusWriter, char_spans_to_byte_spans, remove_source
+from src.core.embedding import load_embedding_model, encode_length_bucketed
+
+def split_text_into_spans(text: str, chunk_size: int, chapter_pattern: "re.Pattern") -> List[Tuple[int, int]]:
+    """
+    将长文本按指定大小切分，返回每个 chunk 在 text 中的 [start, end) 字符区间（已去除首尾空白）。
+    参数:
+        text (str): 输入文本。
+        chunk_size (int): 每个 chunk 的最大字数。
+        chapter_pattern (re.Pattern): 章节标题的正则，标题处强制断开。
+    返回: List[Tuple[int, int]]: chunk 区间列表。
+    """
+    # 按段落（双换行）或句子（句号、叹号、问号）切分
+    # 章节标题处强制断开，保证每个 chunk 只属于一个章节
+    headings = {m.start() for m in chapter_pattern.finditer(text)}
+    spans = []
+    chunk_start = pos = 0
+    sentences = re.split(r'([。！？\n])', text)  # 保留标点
+    for i in range(0, len(sentences), 2):
+        sentence = sentences[i]
+        delimiter = sentences[i + 1] if i + 1 < len(sentences) else ""
+        length = len(sentence) + len(delimiter)
+        if pos > chunk_start and (pos + length - chunk_start > chunk_size or pos in headings):
+            spans.append((chunk_start, pos))
+            chunk_start = pos
+        pos += length
+    spans.append((chunk_start, pos))
+
+    # 去除首尾空白，丢弃空 chunk
+    stripped = []
+    for start, end in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            stripped.append((start, end))
+    return stripped
 
 class ChromaVectorStore:
     """
@@ -17,7 +58,8 @@ class ChromaVectorStore:
         config_file: str = "config.json",
         collection_name: Optional[str] = None,
         model_name: Optional[str] = None,
-        db_path: Optional[str] = None
+        db_path: Optional[str] = None,
+        model: Optional[SentenceTransformer] = None
     ):
         """
         初始化 ChromaVectorStore，加载配置并设置模型和数据库。
@@ -27,6 +69,7 @@ class ChromaVectorStore:
             collection_name (Optional[str]): Chroma 集合名称，覆盖配置文件值。
             model_name (Optional[str]): Hugging Face 模型名称，覆盖配置文件值。
             db_path (Optional[str]): Chroma 数据库存储路径，覆盖配置文件值。
+            model (Optional[SentenceTransformer]): 已加载的嵌入模型（例如后端检索器的模型），避免重复加载。
         """
         
         # 加载配置文件
@@ -47,18 +90,41 @@ class ChromaVectorStore:
         )
         self.chunk_size = self.config.get("vector_store", {}).get("chunk_size", 500)
         self.chunk_overlap = self.config.get("vector_store", {}).get("chunk_overlap", 50)
+        # 默认按原顺序每 32 条一批交给模型（sentence-transformers 批内已按长度排序）；
+        # 设置 encode_token_budget 后改为按长度分桶，每批补齐后的 token 数不超过该值
+        self.encode_token_budget = self.config.get("vector_store", {}).get("encode_token_budget", 0)
+        self.encode_max_batch = self.config.get("vector_store", {}).get("encode_max_batch", 256)
+        # HNSW 索引参数，例如 {"space": "cosine", "M": 16, "construction_ef": 100, "search_ef": 50}
+        self.hnsw = self.config.get("vector_store", {}).get("hnsw", {})
+        # 语料存储目录，配置后 chunk 文本不再重复保存在 Chroma 中
+        self.corpus_dir = self.config.get("vector_store", {}).get("corpus_dir")
+        # 章节标题所在行，用于记录每个 chunk 所属章节
+        self.chapter_pattern = re.compile(
+            self.config.get("vector_store", {}).get("chapter_pattern", r"^第\d+章"), re.MULTILINE
+        )
 
         # 初始化 Hugging Face 嵌入模型
-        self.model = SentenceTransformer(self.model_name)
+        self.model = model or load_embedding_model(self.model_name, self.config.get("embedding"))
         
         # 初始化 Chroma 数据库（本地持久化存储）
         self.client = chromadb.PersistentClient(path=self.db_path, settings=Settings())
         
         # 创建或获取集合
+        self.use_collection(self.collection_name)
+
+    def use_collection(self, collection_name: str):
+        """
+        切换写入的集合（不存在时创建），多本书入库时复用同一个嵌入模型。
+        """
+        self.collection_name = collection_name
         try:
-            self.collection = self.client.get_collection(name=self.collection_name)
+            self.collection = self.client.get_collection(name=collection_name)
         except:
-            self.collection = self.client.create_collection(name=self.collection_name)
+            metadata = {f"hnsw:{key}": value for key, value in self.hnsw.items()}
+            if self.corpus_dir:
+                # 检索端据此决定该集合是否需要向 Chroma 请求 documents
+                metadata[CORPUS_STORE_FLAG] = True
+            self.collection = self.client.create_collection(name=collection_name, metadata=metadata or None)
 
     def _load_config(self, config_file: str) -> Dict[str, Any]:
         """
@@ -70,82 +136,223 @@ class ChromaVectorStore:
         print(f"Warning: Config file '{config_file}' not found. Using default values.")
         return {}
 
+    def _split_text_into_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        将长文本按 chunk_size 切分，返回 chunk 区间列表，见 split_text_into_spans。
+        """
+        return split_text_into_spans(text, self.chunk_size, self.chapter_pattern)
+
     def _split_text_into_chunks(self, text: str) -> List[str]:
         """
-        将长文本按指定大小切分为 chunks，支持重叠。
+        将长文本按指定大小切分为 chunks。
         参数: text (str): 输入文本。
         返回: List[str]: 切分后的 chunk 列表。
         """
-        # 按段落（双换行）或句子（句号、叹号、问号）切分
-        chunks = []
-        current_chunk = ""
-        sentences = re.split(r'([。！？\n])', text)  # 保留标点
-        for i in range(0, len(sentences), 2):
-            sentence = sentences[i]
-            delimiter = sentences[i + 1] if i + 1 < len(sentences) else ""
-            sentence_with_delimiter = sentence + delimiter
-            if len(current_chunk) + len(sentence_with_delimiter) <= self.chunk_size:
-                current_chunk += sentence_with_delimiter
-            else:
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence_with_delimiter
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+        return [text[start:end] for start, end in self._split_text_into_spans(text)]
 
-    def store_texts_from_file(self, input_file: Optional[str] = None, add_batch_size: int = 500) -> int:
+    def _encode(self, texts: List[str]):
         """
-        从文本文件读取长文本，按 chunk 切分，分批生成向量并分批存储到 Chroma 集合。
+        编码一批 chunk，返回与 texts 顺序一致的向量。
+        默认按原顺序每 32 条一批交给模型；配置了 encode_token_budget 时按长度分桶（见 src/core/embedding.py）。
+        """
+        if self.encode_token_budget:
+            return encode_length_bucketed(self.model, texts, self.encode_token_budget, self.encode_max_batch)
+        return self.model.encode(texts, batch_size=32)
+
+    def _iter_segments(self, input_file: str, segment_chars: int = 1 << 20) -> Iterator[Tuple[int, str]]:
+        """
+        按行边界分段读取文件，避免一次性把整本书读入内存。
+        返回: (段起始字节偏移, 段文本) 的迭代器。
+        """
+        byte_offset = 0
+        # newline="" 保留原始换行符，保证字节偏移与文件一致
+        with open(input_file, 'r', encoding='utf-8', newline='') as file:
+            while True:
+                segment = file.read(segment_chars)
+                if not segment:
+                    break
+                segment += file.readline()
+                yield byte_offset, segment
+                byte_offset += len(segment.encode('utf-8'))
+
+    def store_texts_from_file(self, input_file: Optional[str] = None, add_batch_size: int = 500,
+                              source: Optional[str] = None,
+                              on_batch: Optional[Callable[[int, int], None]] = None,
+                              raise_errors: bool = False) -> int:
+        """
+        从文本文件分段读取长文本，按 chunk 切分，分批生成向量并分批存储到 Chroma 集合。
+
+        每个 chunk 的元数据记录 source、chunk（在原文中的顺序）和 chapter（章节序号），用于检索后扩展相邻上下文。
+        配置了 vector_store.corpus_dir 时，chunk 文本不写入 Chroma，原文、chunk 字节偏移和章节序号写入
+        语料存储（见 src/core/corpus_store.py），检索时按需从 mmap 中读取。
 
         参数:
             input_file (Optional[str]): 输入文本文件路径，默认为配置文件中的 default_input_file。
-            add_batch_size (int): 存储到 Chroma 集合时的批处理大小。
+            add_batch_size (int): 存储到 Chroma 集合时的批处理大小，也是编码时按长度分桶的排序窗口。
+            source (Optional[str]): 语料源名称，默认为文件名（不含扩展名）。
+            on_batch (Optional[Callable[[int, int], None]]): 每批写入后调用，参数为已存储的 chunk 数和已处理的字节数，
+                可用于报告进度与限速；抛出的异常会中止入库。
+            raise_errors (bool): 写入失败时抛出异常，而不是打印错误并返回已存储的数量。
 
         返回:
             int: 存储的 chunk 数量。
         """
         input_file = input_file or self.config.get("vector_store", {}).get("default_input_file", "book.txt")
+        source = source or Path(input_file).stem
+        writer = CorpusWriter(self.corpus_dir, source, input_file) if self.corpus_dir else None
+
+        num_chunks = 0
+        num_chapters = 0
+        encode_seconds = 0.0
+        # (chunk 文本, (起始字节, 结束字节, 章节序号))
+        batch: List[Tuple[str, Tuple[int, int, int]]] = []
+
+        def flush() -> bool:
+            nonlocal num_chunks, encode_seconds
+            if not batch:
+                return True
+            texts = [text for text, _ in batch]
+            ids = [str(num_chunks + j + 1) for j in range(len(batch))]
+            try:
+                encode_start = time.perf_counter()
+                embeddings = self._encode(texts).tolist()
+                encode_seconds += time.perf_counter() - encode_start
+                metadatas = [
+                    {"source": source, "chunk": num_chunks + j, "chapter": chunk[2]}
+                    for j, (_, chunk) in enumerate(batch)
+                ]
+                if writer:
+                    self.collection.add(embeddings=embeddings, metadatas=metadatas, ids=ids)
+                    writer.extend(chunk for _, chunk in batch)
+                else:
+                    self.collection.add(
+                        embeddings=embeddings,
+                        documents=texts,
+                        metadatas=metadatas,
+                        ids=ids
+                    )
+                print(f"Processed and stored chunks {num_chunks + 1} to {num_chunks + len(batch)}")
+            except Exception as e:
+                if raise_errors:
+                    raise
+                print(f"Error processing and storing batch {num_chunks // add_batch_size + 1}: {e}")
+                return False
+            num_chunks += len(batch)
+            bytes_done = batch[-1][1][1]
+            batch.clear()
+            if on_batch:
+                on_batch(num_chunks, bytes_done)
+            return True
 
         try:
-            with open(input_file, 'r', encoding='utf-8') as file:
-                text = file.read()
+            for byte_offset, segment in self._iter_segments(input_file):
+                spans = self._split_text_into_spans(segment)
+                byte_spans = char_spans_to_byte_spans(segment, spans, byte_offset)
+                headings = [m.start() for m in self.chapter_pattern.finditer(segment)]
+                for (start, end), (byte_start, byte_end) in zip(spans, byte_spans):
+                    chapter = num_chapters + bisect.bisect_right(headings, start)
+                    batch.append((segment[start:end], (byte_start, byte_end, chapter)))
+                    if len(batch) >= add_batch_size and not flush():
+                        return num_chunks  # 返回已成功存储的 chunk 数量
+                num_chapters += len(headings)
+            if not flush():
+                return num_chunks
         except FileNotFoundError:
+            if raise_errors:
+                raise
             print(f"Error: Input file '{input_file}' not found.")
             return 0
         except UnicodeDecodeError:
+            if raise_errors:
+                raise
             print(f"Error: File '{input_file}' is not UTF-8 encoded.")
             return 0
+        finally:
+            # 偏移只覆盖已写入 Chroma 的 chunk，部分失败时也保持两者一致
+            if writer and num_chunks:
+                writer.commit()
 
-        if not text.strip():
-            print("Warning: Input file is empty.")
-            return 0
-
-        chunks = self._split_text_into_chunks(text)
-        num_chunks = len(chunks)
-        if not chunks:
+        if not num_chunks:
             print("Warning: No valid chunks generated.")
             return 0
 
-        for i in range(0, num_chunks, add_batch_size):
-            batch_chunks = chunks[i:i + add_batch_size]
-            ids = [str(i + j + 1) for j in range(len(batch_chunks))]
+        print(f"Successfully stored {num_chunks} chunks in collection '{self.collection_name}' from '{input_file}'.")
+        if encode_seconds > 0:
+            print(f"Encoding took {encode_seconds:.1f}s ({num_chunks / encode_seconds:.1f} chunks/s).")
+        return num_chunks
+
+    def store_corpora(self, corpora: List[Dict[str, Any]], add_batch_size: int = 500,
+                      retain_previous: int = 1) -> Dict[str, int]:
+        """
+        按语料清单逐本入库，每本书写入清单中指定的集合（见 src/core/corpus_router.py）。
+
+        首次建库时直接写入清单中的集合名，语料源名为语料名。集合已存在或已有别名（后台入库切换过）时，
+        与后台入库任务相同：写入新的影子集合 <collection_name>__<随机后缀>，建完后切换别名
+        （见 src/core/collection_aliases.py），超出保留数的旧集合与语料文件被删除。
+        检索端始终读取别名指向的集合，重新运行不会写入它不再读取的集合，也不会覆盖正在服务的语料文件。
+
+        参数:
+            corpora (List[Dict[str, Any]]): 清单条目，包含 name、input_file、collection_name。
+            add_batch_size (int): 存储到 Chroma 集合时的批处理大小。
+            retain_previous (int): 切换别名后保留的旧集合版本数。
+
+        返回:
+            Dict[str, int]: 每本书存储的 chunk 数量。
+        """
+        aliases = self.aliases()
+        counts = {}
+        for corpus in corpora:
+            logical_name = corpus["collection_name"]
+            if logical_name not in aliases.entries() and not self._collection_count(logical_name):
+                self.use_collection(logical_name)
+                counts[corpus["name"]] = self.store_texts_from_file(
+                    corpus["input_file"], add_batch_size=add_batch_size, source=corpus["name"]
+                )
+                continue
 
+            suffix = uuid.uuid4().hex[:12]
+            shadow, source = f"{logical_name}__{suffix}", f"{corpus['name']}__{suffix}"
+            self.use_collection(shadow)
             try:
-                embeddings = self.model.encode(batch_chunks, batch_size=32).tolist()
-                self.collection.add(
-                    embeddings=embeddings,
-                    documents=batch_chunks,
-                    ids=ids
+                counts[corpus["name"]] = self.store_texts_from_file(
+                    corpus["input_file"], add_batch_size=add_batch_size, source=source, raise_errors=True
                 )
-                print(f"Processed and stored chunks {i+1} to {min(i + add_batch_size, num_chunks)}")
-            except Exception as e:
-                print(f"Error processing and storing batch {i // add_batch_size + 1}: {e}")
-                return i  # 返回已成功存储的 chunk 数量
+                if not counts[corpus["name"]]:
+                    raise RuntimeError(f"'{corpus['input_file']}' 中没有可入库的文本")
+            except Exception:
+                self.drop_versions([{"collection": shadow, "source": source}])
+                raise
+            # 从未切换过的集合以语料名作为源名
+            stale = aliases.flip(logical_name, shadow, source, retain=retain_previous, initial_source=corpus["name"])
+            self.drop_versions(stale)
+            print(f"Collection alias '{logical_name}' -> '{shadow}'.")
+        return counts
 
-        print(f"Successfully stored {num_chunks} chunks in collection '{self.collection_name}' from '{input_file}'.")
-        return num_chunks
+    def aliases(self) -> CollectionAliases:
+        """与检索端共用的集合别名文件（默认在 Chroma 数据库目录下）"""
+        return CollectionAliases.from_config({"chroma_db_path": self.db_path, **self.config})
+
+    def _collection_count(self, collection_name: str) -> int:
+        """集合中的向量数，集合不存在时为 0"""
+        try:
+            return self.client.get_collection(name=collection_name).count()
+        except Exception:
+            return 0
+
+    def drop_versions(self, versions: List[Dict[str, Optional[str]]]):
+        """
+        删除不再使用的集合版本及其语料文件。
+
+        参数:
+            versions (List[Dict[str, Optional[str]]]): 每项包含 collection 与 source，
+                例如 CollectionAliases.flip 返回的超出保留数的旧版本。
+        """
+        for version in versions:
+            try:
+                self.client.delete_collection(name=version["collection"])
+            except Exception as e:
+                print(f"Failed to delete collection '{version['collection']}': {e}")
+            remove_source(self.corpus_dir, version.get("source"))
 
     def query_similar_texts(self, query_text: str, n_results: int = 2) -> List[dict]:
         """
@@ -166,18 +373,20 @@ class ChromaVectorStore:
         # 执行查询
         results = self.collection.query(
             query_embeddings=[query_embedding],
-            n_results=n_results
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"]
         )
 
-        # 格式化查询结果
+        # 格式化查询结果（文本保存在语料存储中时按 chunk 编号读取）
+        store = CorpusStore(self.corpus_dir) if self.corpus_dir else None
         formatted_results = [
             {
                 "id": id,
-                "text": doc,
+                "text": doc if doc is not None or store is None else store.text(meta["source"], meta["chunk"]),
                 "similarity_score": distance  # 转换为相似度（1 - 余弦距离）
             }
-            for id, doc, distance in zip(
-                results["ids"][0], results["documents"][0], results["distances"][0]
+            for id, doc, meta, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
             )
         ]
 
@@ -7,9 +7,6 @@ import argparse
 import threading
 import webbrowser
 import time
-import http.server
-import socketserver
-import uvicorn
 import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
@@ -28,22 +25,21 @@ def check_env():
 
 def start_frontend_server(frontend_dir, port=8080):
     """启动前端静态文件服务器"""
-    os.chdir(frontend_dir)
-    
-    handler = http.server.SimpleHTTPRequestHandler
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        print(f"前端服务器已启动: http://localhost:{port}")
-        httpd.serve_forever()
+    from src.frontend.server_runner import run_server
+    run_server(port, directory=str(frontend_dir))
 
-def start_backend_server(port=8000):
+def start_backend_server(port=8000, workers=1, reload=False, host="127.0.0.1"):
     """启动后端 API 服务器"""
     # 不再直接在当前线程启动 uvicorn
     # 而是启动一个单独的进程运行后端服务器
     try:
         # 使用 Python 的 subprocess 模块启动一个新进程
-        cmd = [sys.executable, "-m", "src.backend.server_runner"]
+        cmd = [sys.executable, "-m", "src.backend.server_runner", "--host", host, "--port", str(port),
+               "--workers", str(workers)]
+        if reload:
+            cmd.append("--reload")
         backend_process = subprocess.Popen(cmd)
-        print(f"后端服务器已启动: http://localhost:{port}")
+        print(f"后端服务器已启动: http://{host}:{port}")
         return backend_process
     except Exception as e:
         print(f"启动后端服务器时出错: {e}")
@@ -58,7 +54,10 @@ def main():
     parser = argparse.ArgumentParser(description="小松 AI 助手启动器")
     parser.add_argument("--no-browser", action="store_true", help="不自动打开浏览器")
     parser.add_argument("--frontend-port", type=int, default=8080, help="前端服务器端口")
+    parser.add_argument("--backend-host", default="127.0.0.1", help="后端服务器监听地址，0.0.0.0 表示所有网卡")
     parser.add_argument("--backend-port", type=int, default=8000, help="后端服务器端口")
+    parser.add_argument("--backend-workers", type=int, default=1, help="后端工作进程数")
+    parser.add_argument("--reload", action="store_true", help="开发模式：后端代码变更时自动重启")
     args = parser.parse_args()
     
     # 检查环境变量
@@ -78,7 +77,7 @@ def main():
     print(f"前端目录: {frontend_dir}")
     
     # 启动后端服务器（在单独的进程中）
-    backend_process = start_backend_server(args.backend_port)
+    backend_process = start_backend_server(args.backend_port, args.backend_workers, args.reload, args.backend_host)
     
     # 启动前端服务器（在新线程中）
     frontend_thread = threading.Thread(target=start_frontend_server, args=(frontend_dir, args.frontend_port), daemon=True)
@@ -91,7 +90,7 @@ def main():
     
     print("小松 AI 助手已启动")
     print(f"前端地址: http://localhost:{args.frontend_port}")
-    print(f"后端地址: http://localhost:{args.backend_port}")
+    print(f"后端地址: http://{args.backend_host}:{args.backend_port}")
     print("按 Ctrl+C 停止服务器")
     
     try:
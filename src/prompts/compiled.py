@@ -0,0 +1,64 @@
+"""预编译的 prompt 模板
+
+模板在构造时解析为“字面量 + 字段”序列，渲染时只做一次 join，不再像 langchain
+PromptTemplate 那样每次调用都校验变量并重新解析模板字符串。partial 可预先填入
+不随请求变化的字段，把相邻的字面量合并为一段静态文本。
+"""
+
+from string import Formatter
+from typing import List, Tuple
+
+_FORMATTER = Formatter()
+
+
+class CompiledTemplate:
+    """只支持 {name} 形式字段的轻量模板，接口与 PromptTemplate.format 一致"""
+
+    def __init__(self, template: str):
+        parts: List[Tuple[str, str]] = []
+        for literal, field, spec, conversion in _FORMATTER.parse(template):
+            if spec or conversion:
+                raise ValueError(f"模板字段不支持格式说明或转换: {field}")
+            if literal:
+                parts.append((literal, None))
+            if field is not None:
+                if not field.isidentifier():
+                    raise ValueError(f"模板字段必须是标识符: {field!r}")
+                parts.append((None, field))
+        self._parts = self._merge(parts)
+        self.input_variables = sorted({field for _, field in self._parts if field})
+
+    @staticmethod
+    def _merge(parts: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """合并相邻的字面量"""
+        merged: List[Tuple[str, str]] = []
+        for literal, field in parts:
+            if literal is not None and merged and merged[-1][0] is not None:
+                merged[-1] = (merged[-1][0] + literal, None)
+            else:
+                merged.append((literal, field))
+        return merged
+
+    @classmethod
+    def _from_parts(cls, parts: List[Tuple[str, str]]) -> "CompiledTemplate":
+        template = cls.__new__(cls)
+        template._parts = cls._merge(parts)
+        template.input_variables = sorted({field for _, field in template._parts if field})
+        return template
+
+    def partial(self, **values: str) -> "CompiledTemplate":
+        """填入部分字段，返回新的模板"""
+        return self._from_parts([
+            (values[field], None) if field in values else (literal, field)
+            for literal, field in self._parts
+        ])
+
+    @property
+    def prefix(self) -> str:
+        """第一个字段之前的静态文本"""
+        first = self._parts[0] if self._parts else (None, None)
+        return first[0] or ""
+
+    def format(self, **values: str) -> str:
+        """渲染模板，缺少字段时抛出 KeyError"""
+        return "".join([literal if field is None else values[field] for literal, field in self._parts])
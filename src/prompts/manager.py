@@ -1,33 +1,60 @@
-from langchain.prompts import PromptTemplate
+from functools import lru_cache
 from typing import List, Dict
-from src.prompts.templates import SYSTEM_PROMPT, USER_PROMPTS, CONTEXT_TEMPLATE, QA_TEMPLATE, HISTORY_TEMPLATE
+from src.prompts.compiled import CompiledTemplate
+from src.prompts.templates import (
+    SYSTEM_PROMPT, USER_PROMPTS, CONTEXT_TEMPLATE, QA_TEMPLATE, HISTORY_TEMPLATE, MEMORY_TEMPLATE, HISTORY_SUMMARY_TEMPLATE
+)
+from src.core.session_archive import compress, CODEC_EXTENSIONS
 import os
 import json
 import datetime
+import threading
+
+# 原样放入 prompt 的最近对话轮数
+RECENT_TURNS = 5
+
+# 模板只解析一次，所有 PromptManager 共享
+_CONTEXT = CompiledTemplate(CONTEXT_TEMPLATE)
+_QA = CompiledTemplate(QA_TEMPLATE)
+_HISTORY = CompiledTemplate(HISTORY_TEMPLATE)
+_HISTORY_SUMMARY = CompiledTemplate(HISTORY_SUMMARY_TEMPLATE)
+_MEMORY = CompiledTemplate(MEMORY_TEMPLATE)
+
+
+@lru_cache(maxsize=None)
+def user_prompt_for(user_id: int) -> str:
+    """用户特定的提示词（风格 + 约束），按用户缓存"""
+    user_prompt = USER_PROMPTS.get(user_id, USER_PROMPTS[0])
+    return "\n".join([user_prompt["style"], user_prompt["constraints"]])
+
+
+@lru_cache(maxsize=None)
+def qa_template_for(user_id: int) -> CompiledTemplate:
+    """预先填入系统提示词与用户提示词的问答模板，静态前缀按用户缓存"""
+    return _QA.partial(system_prompt=SYSTEM_PROMPT, user_prompt=user_prompt_for(user_id))
+
 
 class PromptManager:
 
-    def __init__(self, user_id: int = 0):
+    def __init__(self, user_id: int = 0, summarizer=None):
+        """
+        Args:
+            user_id (int): 用户 ID，决定提示词风格与历史文件目录
+            summarizer (HistorySummarizer): 会话历史摘要器，指定会话时按会话记录历史并注入早期对话摘要
+        """
         self.user_id = user_id
+        self.summarizer = summarizer
         self.history_dir = f"resources/history/{self.user_id}"
         self.current_history_file = os.path.join(self.history_dir, "current.json")
         self.history = self._load_history()
+        # 多个请求在线程中并发查询时，串行化历史的修改与写盘
+        self._history_lock = threading.Lock()
         
-        # 初始化模板
-        self.context_template = PromptTemplate(
-            input_variables=["context"],
-            template=CONTEXT_TEMPLATE
-        )
-        
-        self.qa_template = PromptTemplate(
-            input_variables=["system_prompt", "context_template", "question", "user_prompt"],
-            template=QA_TEMPLATE
-        )
-        
-        self.history_template = PromptTemplate(
-            input_variables=["history", "question"],
-            template=HISTORY_TEMPLATE
-        )
+        # 初始化模板：问答模板已填入该用户的系统提示词与风格，只需渲染动态部分
+        self.context_template = _CONTEXT
+        self.qa_template = qa_template_for(user_id)
+        self.history_template = _HISTORY
+        self.memory_template = _MEMORY
 
     def _load_history(self):
         if os.path.exists(self.current_history_file):
@@ -46,36 +73,44 @@ class PromptManager:
         
     def format_context(self, retrieved_docs: List[Dict]) -> str:
         """格式化检索到的文档和用户信息"""
-        context = ""
         if not retrieved_docs:
             return ""
-        for doc in retrieved_docs:
-            context += f"{doc['text']}\n\n"
-            
         return self.context_template.format(
-            context=context.strip(),
+            context="\n\n".join([doc["text"] for doc in retrieved_docs]).strip()
         )
         
+    def format_memory(self, memories: List[Dict]) -> str:
+        """格式化从会话记忆中召回的早期对话"""
+        if not memories:
+            return ""
+        return self.memory_template.format(
+            memory="\n\n".join(m["text"] for m in memories)
+        )
+
     def get_user_prompt(self) -> str:
         """获取用户特定的提示词"""
-        user_prompt = USER_PROMPTS.get(self.user_id, USER_PROMPTS[0])
-        return "\n".join([
-            user_prompt["style"],
-            user_prompt["constraints"]
-        ])
+        return user_prompt_for(self.user_id)
         
-    def add_to_history(self, question: str, answer: str):
-        """添加对话到历史记录，并持久化保存"""
-        self.history.append(f"Q: {question}\nA: {answer}")
-        # 保持历史记录长度
-        if len(self.history) > 5:  # 只保留最近5轮对话
-            self.history = self.history[-5:]
-        self._save_history()
+    def add_to_history(self, question: str, answer: str, session_id: str = None):
+        """添加对话到历史记录，并持久化保存
+
+        指定会话且启用了摘要器时，本轮对话同时记入该会话，早期轮次由后台合并进摘要。
+        """
+        turn = f"Q: {question}\nA: {answer}"
+        if session_id and self.summarizer:
+            self.summarizer.record(session_id, turn)
+        with self._history_lock:
+            self.history.append(turn)
+            # 保持历史记录长度
+            if len(self.history) > RECENT_TURNS:  # 只保留最近5轮对话，更早的轮次由会话记忆召回
+                self.history = self.history[-RECENT_TURNS:]
+            self._save_history()
             
-    def format_history(self, question: str) -> str:
-        """格式化历史对话"""
-        history_str = "\n\n".join(self.history)
+    def format_history(self, question: str, history: List[str] = None, summary: str = "") -> str:
+        """格式化历史对话，有早期对话摘要时放在最近轮次之前"""
+        history_str = "\n\n".join(self.history if history is None else history)
         return self.history_template.format(
+            summary=_HISTORY_SUMMARY.format(summary=summary) if summary else "",
             history=history_str,
             question=question
         )
@@ -84,34 +119,55 @@ class PromptManager:
         self,
         retrieved_docs: List[Dict],
         question: str,
-        use_history: bool = False
+        use_history: bool = False,
+        memories: List[Dict] = None,
+        session_id: str = None
     ) -> str:
-        """获取完整的问答prompt"""
+        """获取完整的问答prompt
+
+        Args:
+            retrieved_docs (List[Dict]): 检索到的书籍片段
+            question (str): 用户问题
+            use_history (bool): 是否附带最近几轮对话
+            memories (List[Dict]): 从会话记忆中召回的早期对话
+            session_id (str): 会话 ID，启用摘要器时使用该会话的最近轮次与早期对话摘要
+        """
         # 格式化上下文
         context_str = self.format_context(retrieved_docs)
         
-        # 获取用户特定提示词
-        user_prompt = self.get_user_prompt()
         # 如果需要使用历史对话
-        if use_history and self.history:
-            question = self.format_history(question)
+        if use_history:
+            if session_id and self.summarizer:
+                summary, history = self.summarizer.context(session_id)
+            else:
+                summary, history = "", self.history
+            if history or summary:
+                question = self.format_history(question, history, summary)
             
-        # 生成最终prompt
+        # 生成最终prompt：系统提示词与用户提示词已预先填入模板
         return self.qa_template.format(
-            system_prompt=SYSTEM_PROMPT,
             context_template=context_str,
-            question=question,
-            user_prompt=user_prompt
+            memory_template=self.format_memory(memories),
+            question=question
         )
 
+    @property
+    def static_prefix(self) -> str:
+        """该用户所有问答 prompt 共享的静态前缀"""
+        return self.qa_template.prefix
+
 
     def clear_history(self):
-        """清空历史对话并归档当前历史文件，新建空历史文件"""
-        # 归档当前历史文件
+        """清空历史对话并压缩归档当前历史文件，新建空历史文件"""
+        # 压缩归档当前历史文件（zstd 或 gzip）
         if os.path.exists(self.current_history_file):
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            archive_file = os.path.join(self.history_dir, f"{timestamp}.json")
-            os.rename(self.current_history_file, archive_file)
+            with open(self.current_history_file, 'rb') as f:
+                codec, data = compress(f.read())
+            archive_file = os.path.join(self.history_dir, f"{timestamp}.json.{CODEC_EXTENSIONS[codec]}")
+            with open(archive_file, 'wb') as f:
+                f.write(data)
+            os.remove(self.current_history_file)
         # 新建空历史
         self.history = []
         self._save_history()
\ No newline at end of file
@@ -19,16 +19,41 @@ CONTEXT_TEMPLATE = """相关上下文信息：
 {context}
 """
 
-# 问答模板
+# 问答模板：不随请求变化的系统提示词与用户风格在最前，保证同一用户的 prompt 前缀稳定，
+# 便于上游服务的前缀缓存命中；随请求变化的检索内容、历史与问题在后
 QA_TEMPLATE = """{system_prompt}
-{context_template}
 {user_prompt}
 
-{question}
+{context_template}
+{memory_template}{question}
 请回答："""
 
-# 历史对话模板
-HISTORY_TEMPLATE = """历史对话：
+# 召回的早期对话模板（为空时不出现在 prompt 中）
+MEMORY_TEMPLATE = """相关的早期对话：
+{memory}
+
+"""
+
+# 历史对话模板（summary 为早期对话摘要，没有摘要时为空）
+HISTORY_TEMPLATE = """{summary}历史对话：
 {history}
 
-当前问题：{question}""" 
\ No newline at end of file
+当前问题：{question}""" 
+
+# 早期对话摘要在历史对话中的格式
+HISTORY_SUMMARY_TEMPLATE = """早期对话摘要：
+{summary}
+
+"""
+
+# 滚动摘要生成模板：把新增的早期对话合并进已有摘要
+SUMMARY_TEMPLATE = """请将以下对话合并进已有摘要，保留人物、事件、用户的偏好和尚未解决的问题，省略寒暄和重复内容。
+摘要不超过{max_chars}字，只输出摘要正文。
+
+已有摘要：
+{summary}
+
+新增对话：
+{turns}
+
+更新后的摘要："""
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试以 src.* 导入项目模块，直接运行 pytest 时仓库根目录不一定在 sys.path 中
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
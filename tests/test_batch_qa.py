@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""批量问答输入解析与断点续跑的测试"""
+
+import json
+
+from src.core.batch_qa import completed_ids, read_questions
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_read_questions_skips_malformed_lines(tmp_path, capsys):
+    path = tmp_path / "questions.jsonl"
+    write_lines(path, [
+        '{"id": "q1", "question": "宝玉是谁"}',
+        '{"id": "q2", "question": ',
+        '',
+        '["不是对象"]',
+        '{"id": "q5"}',
+        '{"question": "黛玉是谁"}',
+    ])
+    items = list(read_questions(str(path), "question", "id"))
+    assert items == [
+        {"id": "q1", "line": 1, "question": "宝玉是谁"},
+        {"id": "6", "line": 6, "question": "黛玉是谁"},
+    ]
+    err = capsys.readouterr().err
+    assert "第 2 行不是合法的 JSON" in err
+    assert "第 4 行不是 JSON 对象" in err
+    assert "第 5 行缺少问题字段" in err
+
+
+def test_completed_ids_drops_errors_that_will_be_retried(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [
+        '{"id": "a", "status": "ok", "answer": "1"}',
+        '{"id": "b", "status": "error", "error": "timeout"}',
+        '{"id": "c", "status": "error", "error": "timeout"}',
+        '{"id": "b", "status": "ok", "answer": "2"}',
+    ])
+    assert completed_ids(str(path)) == {"a", "b"}
+    assert [(r["id"], r["status"]) for r in read_records(path)] == [("a", "ok"), ("b", "ok")]
+
+    # 重试 c 后追加结果，再次续跑时每个问题只有一行
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "c", "status": "ok", "answer": "3"}\n')
+    assert completed_ids(str(path)) == {"a", "b", "c"}
+    assert [r["id"] for r in read_records(path)] == ["a", "b", "c"]
+
+
+def test_completed_ids_without_retry_keeps_latest_error(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [
+        '{"id": "a", "status": "error", "error": "first"}',
+        '{"id": "a", "status": "error", "error": "second"}',
+        '{"id": "b", "status": "ok", "answer": "1"}',
+        '{"id": "b", "status": "error", "error": "late"}',
+    ])
+    assert completed_ids(str(path), retry_errors=False) == {"a", "b"}
+    assert read_records(path) == [
+        {"id": "a", "status": "error", "error": "second"},
+        {"id": "b", "status": "ok", "answer": "1"},
+    ]
+
+
+def test_completed_ids_truncates_partial_line(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    path.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "sta', encoding="utf-8")
+    assert completed_ids(str(path)) == {"a"}
+    assert path.read_text(encoding="utf-8") == '{"id": "a", "status": "ok"}\n'
+    assert completed_ids(str(tmp_path / "missing.jsonl")) == set()
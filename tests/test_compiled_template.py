@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""预编译 prompt 模板的测试：渲染结果与 str.format 一致、partial 与静态前缀"""
+
+import pytest
+
+from src.prompts import templates
+from src.prompts.compiled import CompiledTemplate
+from src.prompts.manager import qa_template_for, user_prompt_for
+
+
+@pytest.mark.parametrize("name", [
+    "CONTEXT_TEMPLATE", "QA_TEMPLATE", "MEMORY_TEMPLATE", "HISTORY_TEMPLATE", "HISTORY_SUMMARY_TEMPLATE",
+    "SUMMARY_TEMPLATE"
+])
+def test_matches_str_format(name):
+    source = getattr(templates, name)
+    template = CompiledTemplate(source)
+    values = {field: f"<{field} 的值>" for field in template.input_variables}
+    assert template.format(**values) == source.format(**values)
+
+
+def test_fields_escapes_and_errors():
+    template = CompiledTemplate("{{字面量}} {a}-{b}-{a}")
+    assert template.input_variables == ["a", "b"]
+    assert template.format(a="1", b="2") == "{字面量} 1-2-1"
+    # 字段值中的花括号原样输出，不会被再次解析
+    assert template.format(a="{b}", b="x") == "{字面量} {b}-x-{b}"
+    with pytest.raises(KeyError):
+        template.format(a="1")
+    for bad in ("{a:>10}", "{a!r}", "{0}", "{a.b}"):
+        with pytest.raises(ValueError):
+            CompiledTemplate(bad)
+
+
+def test_partial_merges_static_prefix():
+    template = CompiledTemplate("系统：{system}\n用户：{user}\n问题：{question}")
+    assert template.prefix == "系统："
+    partial = template.partial(system="你是助手", user="简洁回答")
+    assert partial.input_variables == ["question"]
+    assert partial.prefix == "系统：你是助手\n用户：简洁回答\n问题："
+    assert partial.format(question="宝玉是谁") == "系统：你是助手\n用户：简洁回答\n问题：宝玉是谁"
+    # 原模板不受影响
+    assert template.input_variables == ["question", "system", "user"]
+
+
+def test_qa_template_is_cached_per_user():
+    assert qa_template_for(0) is qa_template_for(0)
+    expected_prefix = templates.SYSTEM_PROMPT + "\n" + user_prompt_for(0) + "\n"
+    assert qa_template_for(0).prefix.startswith(expected_prefix)
+    assert "system_prompt" not in qa_template_for(0).input_variables
+    # 未配置的用户使用默认提示词
+    assert user_prompt_for(99999) == user_prompt_for(0)
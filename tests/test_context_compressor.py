@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""ContextCompressor 的测试：去重与相邻 chunk 的拼接"""
+
+from src.core.context_compressor import ContextCompressor
+
+
+def doc(text, chunk, chapter=0, distance=0.5, source="红楼梦"):
+    return {"text": text, "corpus": "hongloumeng", "distance": distance,
+            "metadata": {"source": source, "chunk": chunk, "chapter": chapter}}
+
+
+def test_adjacent_chunks_in_same_chapter_are_joined():
+    compressor = ContextCompressor()
+    passages = compressor.compress("宝玉", [
+        doc("宝玉来到潇湘馆，看见黛玉正在窗下读书。", 4, distance=0.3),
+        doc("贾母正在上房里同凤姐说笑，众人都在旁边陪着。", 3, distance=0.4),
+    ])
+    assert len(passages) == 1
+    assert passages[0]["text"] == "贾母正在上房里同凤姐说笑，众人都在旁边陪着。\n宝玉来到潇湘馆，看见黛玉正在窗下读书。"
+    assert passages[0]["distance"] == 0.3
+    assert passages[0]["metadata"]["chunk_range"] == [3, 4]
+
+
+def test_adjacent_chunks_across_chapters_stay_separate():
+    compressor = ContextCompressor()
+    passages = compressor.compress("宝玉", [
+        doc("第二回的最后一段，冷子兴演说荣国府的来历。", 9, chapter=1),
+        doc("第三回开头，林黛玉抛父进京都，投奔外祖母。", 10, chapter=2),
+    ])
+    assert [p["metadata"]["chunk"] for p in passages] == [9, 10]
+    assert all("chunk_range" not in p["metadata"] for p in passages)
+
+
+def test_near_duplicates_keep_best_ranked():
+    compressor = ContextCompressor()
+    text = "满纸荒唐言，一把辛酸泪。都云作者痴，谁解其中味？"
+    passages, stats = compressor.compress_with_stats("作者", [
+        doc(text, 1, source="a"),
+        doc(text, 7, source="b"),
+        doc(text[:12], 2, source="c"),
+    ])
+    assert [p["metadata"]["source"] for p in passages] == ["a"]
+    assert stats["duplicate"] == 2
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""CorpusStore / CorpusWriter 的测试：提交、读取、版本发布与清理"""
+
+import array
+import threading
+
+import pytest
+
+from src.core import corpus_store
+from src.core.corpus_store import CorpusStore, CorpusWriter, char_spans_to_byte_spans, remove_source
+
+
+def write_corpus(root, source, tmp_path, text, chunk_chars, chapter_of=lambda i: 0):
+    """把 text 按 chunk_chars 个字符切分后写入语料存储，返回各 chunk 的文本"""
+    input_file = tmp_path / f"{source}-input.txt"
+    input_file.write_text(text, encoding="utf-8")
+    char_spans = [(i, min(i + chunk_chars, len(text))) for i in range(0, len(text), chunk_chars)]
+    with CorpusWriter(str(root), source, str(input_file)) as writer:
+        for i, (start, end) in enumerate(char_spans_to_byte_spans(text, char_spans)):
+            writer.add(start, end, chapter_of(i))
+    return [text[start:end] for start, end in char_spans]
+
+
+def test_commit_and_read(tmp_path):
+    root = tmp_path / "store"
+    chunks = write_corpus(root, "红楼梦", tmp_path, "甲乙丙丁戊己庚辛壬癸", 3, chapter_of=lambda i: i // 2)
+    store = CorpusStore(str(root))
+
+    assert store.sources() == ["红楼梦"]
+    assert store.count("红楼梦") == 4
+    assert [store.text("红楼梦", i) for i in range(4)] == chunks
+    assert store.span("红楼梦", 1) == (9, 18)
+    assert store.text_range("红楼梦", 0, 6) == "甲乙"
+    assert [store.chapter("红楼梦", i) for i in range(4)] == [0, 0, 1, 1]
+    # 上下文扩展不跨章节
+    assert store.neighbors("红楼梦", 1, 2) == (0, 1)
+    assert store.neighbors("红楼梦", 2, 2) == (2, 3)
+    with pytest.raises(IndexError):
+        store.span("红楼梦", 4)
+    with pytest.raises(KeyError):
+        store.count("不存在")
+
+
+def test_recommit_publishes_new_version_and_prunes_old(tmp_path):
+    root = tmp_path / "store"
+    write_corpus(root, "s", tmp_path, "aaaa", 2)
+    store = CorpusStore(str(root))
+    assert store.text("s", 0) == "aa"
+
+    write_corpus(root, "s", tmp_path, "bbbbbb", 3)
+    assert store.count("s") == 2
+    assert store.text("s", 1) == "bbb"
+
+    write_corpus(root, "s", tmp_path, "cc", 1)
+    assert store.text("s", 1) == "c"
+    # 只保留当前版本和上一个版本
+    assert len(corpus_store._stored_versions(root, "s")) == 2
+
+
+def test_data_files_are_invisible_until_pointer_swap(tmp_path, monkeypatch):
+    root = tmp_path / "store"
+    write_corpus(root, "s", tmp_path, "old-text", 4)
+    store = CorpusStore(str(root))
+    seen = []
+    real_replace = corpus_store.os.replace
+
+    def checking_replace(src, dst):
+        # 新版本的三个文件都已写完，但指针尚未替换：读取端仍完整地读到旧版本
+        seen.append([store.text("s", i) for i in range(store.count("s"))])
+        real_replace(src, dst)
+
+    monkeypatch.setattr(corpus_store.os, "replace", checking_replace)
+    write_corpus(root, "s", tmp_path, "new-text-longer", 5)
+    assert seen == [["old-", "text"]]
+    assert store.text("s", 2) == "onger"
+
+
+def test_concurrent_reads_never_mix_versions(tmp_path):
+    root = tmp_path / "store"
+    versions = {
+        "a": "一二三四五六七八",
+        "b": "abcdefghijklmnopqrstuvwx",
+    }
+    expected = {}
+    for key, text in versions.items():
+        chunks = [text[i:i + 2] for i in range(0, len(text), 2)]
+        expected[len(chunks)] = chunks
+    write_corpus(root, "s", tmp_path, versions["a"], 2)
+
+    store = CorpusStore(str(root))
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            mapped = store._get("s")
+            chunks = [str(memoryview(mapped.blob)[a:b], "utf-8") for a, b in
+                      (mapped.span(i) for i in range(len(mapped)))]
+            if chunks != expected.get(len(chunks)):
+                errors.append(chunks)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(40):
+            write_corpus(root, "s", tmp_path, versions["ab"[i % 2]], 2)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+
+
+def test_legacy_layout_is_readable_and_replaced_on_commit(tmp_path):
+    root = tmp_path / "store"
+    root.mkdir()
+    (root / "s.txt").write_bytes("旧格式".encode("utf-8"))
+    with open(root / "s.offsets", "wb") as f:
+        array.array("Q", [0, 3, 3, 9]).tofile(f)
+    store = CorpusStore(str(root))
+    assert store.sources() == ["s"]
+    assert store.text("s", 1) == "格式"
+    # 没有章节文件时视为同一章
+    assert store.chapter("s", 1) == 0
+
+    write_corpus(root, "s", tmp_path, "新格式", 1)
+    assert not (root / "s.txt").exists()
+    assert not (root / "s.offsets").exists()
+    assert store.sources() == ["s"]
+    assert store.text("s", 0) == "新"
+
+
+def test_remove_source(tmp_path):
+    root = tmp_path / "store"
+    write_corpus(root, "s", tmp_path, "abcd", 2)
+    write_corpus(root, "s", tmp_path, "efgh", 2)
+    write_corpus(root, "t", tmp_path, "ijkl", 2)
+
+    remove_source(str(root), "s")
+    store = CorpusStore(str(root))
+    assert store.sources() == ["t"]
+    assert corpus_store._stored_versions(root, "s") == []
+    with pytest.raises(KeyError):
+        store.text("s", 0)
+    # 不存在时忽略
+    remove_source(str(root), "s")
+    remove_source(None, "s")
+
+
+def test_char_spans_to_byte_spans():
+    text = "a中b文"
+    assert char_spans_to_byte_spans(text, [(0, 2), (1, 4), (2, 3)]) == [(0, 4), (1, 8), (4, 5)]
+    assert char_spans_to_byte_spans(text, [(0, 1)], base=10) == [(10, 11)]
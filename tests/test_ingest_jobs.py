@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""入库任务的测试：语料登记文件与清单合并、中断任务的启动恢复"""
+
+import json
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from src.core.corpus_router import load_corpora
+from src.core.ingest_jobs import IngestJobManager, fcntl
+
+TRACKED = {
+    "name": "hongloumeng", "title": "红楼梦", "input_file": "./resources/红楼梦.txt",
+    "collection_name": "chinese_love_fiction", "keywords": ["宝玉"]
+}
+
+
+@pytest.fixture
+def setup(tmp_path):
+    manifest = tmp_path / "corpora.json"
+    manifest.write_text(json.dumps({"corpora": [TRACKED]}, ensure_ascii=False), encoding="utf-8")
+    config = {
+        "chroma_db_path": str(tmp_path / "chroma_db"),
+        "corpus_manifest": str(manifest),
+        "corpus_overlay": str(tmp_path / "data" / "ingested_corpora.json"),
+        "vector_store": {"db_path": str(tmp_path / "chroma_db"), "corpus_dir": str(tmp_path / "corpus_store")}
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config), encoding="utf-8")
+    manager = IngestJobManager(str(config_path), jobs_dir=str(tmp_path / "jobs"),
+                               upload_dir=str(tmp_path / "uploads"))
+    return manager, config, manifest
+
+
+def make_job(manager, corpus, title=None, keywords=None):
+    upload_path = manager.new_upload_path()
+    upload_path.write_text("正文", encoding="utf-8")
+    return manager.create_job(corpus, upload_path, "book.txt", title=title, keywords=keywords)
+
+
+def test_register_corpus_writes_overlay_not_manifest(setup):
+    manager, config, manifest = setup
+    tracked_before = manifest.read_text(encoding="utf-8")
+
+    job = make_job(manager, "xiyouji", title="西游记", keywords=["悟空"])
+    manager._register_corpus(config, job, "xiyouji", "uploads/xiyouji.txt")
+    job = make_job(manager, "hongloumeng")
+    manager._register_corpus(config, job, "chinese_love_fiction", "uploads/hongloumeng.txt")
+    # 再次替换时更新已有的登记条目
+    manager._register_corpus(config, job, "chinese_love_fiction", "uploads/hongloumeng-v2.txt")
+
+    assert manifest.read_text(encoding="utf-8") == tracked_before
+    overlay = json.loads(open(config["corpus_overlay"], encoding="utf-8").read())["corpora"]
+    assert overlay == [
+        {"name": "xiyouji", "title": "西游记", "input_file": "uploads/xiyouji.txt",
+         "collection_name": "xiyouji", "keywords": ["悟空"]},
+        {"name": "hongloumeng", "input_file": "uploads/hongloumeng-v2.txt"},
+    ]
+
+    corpora = load_corpora(config)
+    assert [c["name"] for c in corpora] == ["hongloumeng", "xiyouji"]
+    assert corpora[0] == {**TRACKED, "input_file": "uploads/hongloumeng-v2.txt"}
+
+
+def test_load_corpora_rejects_incomplete_new_entries(setup):
+    _, config, _ = setup
+    overlay = Path(config["corpus_overlay"])
+    overlay.parent.mkdir()
+    overlay.write_text(json.dumps({"corpora": [{"name": "unknown", "input_file": "x.txt"}]}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_corpora(config)
+    assert load_corpora({}) == []
+
+
+def _hold_job(jobs_dir, upload_dir, config_path, ready, done):
+    manager = IngestJobManager(config_path, jobs_dir=jobs_dir, upload_dir=upload_dir)
+    job = make_job(manager, "live")
+    ready.send(job["id"])
+    done.wait()
+
+
+@pytest.mark.skipif(fcntl is None, reason="需要 fcntl 文件锁")
+def test_recover_stale_jobs(setup):
+    manager, _, _ = setup
+    # 上次运行遗留的任务：没有进程持有锁
+    stale = make_job(manager, "stale")
+    manager._release(stale["id"])
+    running = make_job(manager, "crashed")
+    manager._update(running["id"], status="running", collection="crashed__" + running["id"][:12])
+    manager._release(running["id"])
+    finished = make_job(manager, "finished")
+    manager._update(finished["id"], status="succeeded")
+    manager._release(finished["id"])
+    # 本进程创建、尚未执行的任务
+    own = make_job(manager, "own")
+
+    # 另一个存活进程创建的任务
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe()
+    done = context.Event()
+    process = context.Process(target=_hold_job, args=(
+        str(manager.jobs_dir), str(manager.upload_dir), manager.config_path, child_conn, done))
+    process.start()
+    try:
+        live_id = parent_conn.recv()
+        recovered = manager.recover_stale_jobs()
+    finally:
+        done.set()
+        process.join()
+
+    assert sorted(recovered) == sorted([stale["id"], running["id"]])
+    for job_id in recovered:
+        job = manager.get_job(job_id)
+        assert job["status"] == "failed"
+        assert "中断" in job["error"]
+        assert not (manager.jobs_dir / f"{job_id}.lock").exists()
+    assert not Path(stale["upload_path"]).exists()
+    assert manager.get_job(finished["id"])["status"] == "succeeded"
+    assert manager.get_job(own["id"])["status"] == "queued"
+    assert manager.get_job(live_id)["status"] == "queued"
+
+    # 创建任务的进程退出后，它的任务在下次恢复时被标记为失败
+    assert manager.recover_stale_jobs() == [live_id]
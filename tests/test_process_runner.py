@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""AsyncProcessRunner 的测试：超时、后台进程占用管道、stdin 与非零退出码"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+from src.core.process_runner import AsyncProcessRunner, NullAppBackend, detect_app_backend
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="需要 sh 与进程组")
+
+
+def run(args, **kwargs):
+    runner = AsyncProcessRunner(max_output_bytes=kwargs.pop("max_output_bytes", 64 * 1024))
+    start = time.perf_counter()
+    result = asyncio.run(runner.run(args, **kwargs))
+    return result, time.perf_counter() - start
+
+
+def test_success_captures_output():
+    result, _ = run(["sh", "-c", "echo out; echo err >&2"])
+    assert result["returncode"] == 0
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+    assert not result["timed_out"]
+    assert not result["truncated"]
+
+
+def test_non_zero_exit():
+    result, _ = run(["sh", "-c", "echo failed >&2; exit 3"])
+    assert result["returncode"] == 3
+    assert result["stderr"] == "failed\n"
+    assert not result["timed_out"]
+
+
+def test_timeout_kills_process():
+    result, elapsed = run(["sh", "-c", "echo started; sleep 5"], timeout=0.5)
+    assert result["timed_out"]
+    assert result["returncode"] is not None and result["returncode"] != 0
+    assert result["stdout"] == "started\n"
+    assert elapsed < 2.5
+
+
+def test_timeout_kills_grandchild_holding_pipes():
+    result, elapsed = run(["sh", "-c", "sleep 5 & sleep 5"], timeout=0.5)
+    assert result["timed_out"]
+    assert elapsed < 2.5
+
+
+def test_background_process_after_successful_exit():
+    # 命令本身立即成功退出，后台进程继承了 stdout，直到截止时间才被杀死
+    result, elapsed = run(["sh", "-c", "(sleep 4; echo late) & echo done; exit 0"], timeout=0.5)
+    assert result["returncode"] == 0
+    assert not result["timed_out"]
+    assert result["stdout"] == "done\n"
+    assert elapsed < 2.5
+
+
+def test_stdin_input():
+    result, _ = run(["sh", "-c", "tr a-z A-Z"], input_data=b"hello\n")
+    assert result["returncode"] == 0
+    assert result["stdout"] == "HELLO\n"
+
+
+def test_stdin_ignored_by_early_exit():
+    # 子进程不读 stdin 就退出，写入大量数据会遇到管道断开
+    result, _ = run(["sh", "-c", "exit 0"], input_data=b"x" * (4 * 1024 * 1024))
+    assert result["returncode"] == 0
+    assert not result["timed_out"]
+
+
+def test_output_is_capped():
+    result, _ = run([sys.executable, "-c", "print('x' * 100000)"], max_output_bytes=1000)
+    assert len(result["stdout"]) == 1000
+    assert result["truncated"]
+    assert result["returncode"] == 0
+
+
+def test_concurrent_runs_do_not_serialize():
+    runner = AsyncProcessRunner(max_concurrency=4)
+
+    async def main():
+        return await asyncio.gather(*(runner.run(["sleep", "0.5"]) for _ in range(4)))
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    assert all(r["returncode"] == 0 for r in results)
+    assert time.perf_counter() - start < 1.5
+
+
+def test_null_backend_reports_unsupported():
+    backend = detect_app_backend(AsyncProcessRunner(), platform="linux")
+    assert isinstance(backend, NullAppBackend)
+    result = asyncio.run(backend.open_app("Calculator"))
+    assert result["status"] == "unsupported"
+    assert result["returncode"] is None
+    assert list(backend.calls) == [{"action": "open_app", "app_name": "Calculator"}]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""FairScheduler 的测试：令牌桶限流、会话轮转、优先级与队列上限"""
+
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import scheduler as scheduler_module
+from src.core.scheduler import PRIORITY_NORMAL, PRIORITY_SHORT, FairScheduler, RateLimited, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """替换 scheduler 模块中的 time，用于推进令牌桶时间"""
+    now = [1000.0]
+    monkeypatch.setattr(scheduler_module, "time",
+                        SimpleNamespace(monotonic=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+def unlimited(**kwargs) -> FairScheduler:
+    """不限流的调度器，只测试排队行为"""
+    return FairScheduler(session_rate=0, client_rate=0, **kwargs)
+
+
+async def run_queued(sched: FairScheduler, requests):
+    """先占住全部槽位，再按顺序排入 requests [(名称, 会话, 优先级)]，释放后返回执行顺序"""
+    order = []
+    gate = asyncio.Event()
+
+    async def holder():
+        async with sched.slot("holder", "c"):
+            await gate.wait()
+
+    async def request(name, session_id, priority):
+        async with sched.slot(session_id, "c", priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    holders = [asyncio.create_task(holder()) for _ in range(sched.max_concurrency)]
+    await asyncio.sleep(0)
+    tasks = []
+    for name, session_id, priority in requests:
+        tasks.append(asyncio.create_task(request(name, session_id, priority)))
+        await asyncio.sleep(0)
+    assert order == []
+    gate.set()
+    await asyncio.gather(*holders, *tasks)
+    return order
+
+
+def test_token_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=2, burst=3)
+    now = bucket.updated
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.take()
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+    # 长时间空闲后最多积累 burst 个令牌
+    assert bucket.wait_time(now + 100) == 0
+    assert bucket.tokens == 3
+    assert TokenBucket(rate=0, burst=0).wait_time(now) == float("inf")
+
+
+def test_session_rate_limit(clock):
+    sched = FairScheduler(session_rate=1, session_burst=2, client_rate=0)
+
+    async def main():
+        for _ in range(2):
+            async with sched.slot("s1", "c"):
+                pass
+        with pytest.raises(RateLimited) as excinfo:
+            async with sched.slot("s1", "c"):
+                pass
+        assert excinfo.value.retry_after == pytest.approx(1.0)
+        # 其他会话不受影响
+        async with sched.slot("s2", "c"):
+            pass
+        clock[0] += 1
+        async with sched.slot("s1", "c"):
+            pass
+
+    asyncio.run(main())
+    assert sched.active == 0
+
+
+def test_client_limit_spans_sessions_and_rejection_keeps_tokens(clock):
+    sched = FairScheduler(session_rate=1, session_burst=1, client_rate=1, client_burst=2)
+
+    async def main():
+        async with sched.slot("s1", "c"):
+            pass
+        # 会话桶已空：被拒绝的请求不扣除客户端桶的令牌
+        with pytest.raises(RateLimited):
+            async with sched.slot("s1", "c"):
+                pass
+        async with sched.slot("s2", "c"):
+            pass
+        # 客户端桶已空：换会话也会被拒绝
+        with pytest.raises(RateLimited):
+            async with sched.slot("s3", "c"):
+                pass
+        async with sched.slot("s3", "other-client"):
+            pass
+
+    asyncio.run(main())
+
+
+def test_sessions_take_turns():
+    sched = unlimited(max_concurrency=1)
+    requests = [("a1", "a", PRIORITY_NORMAL), ("a2", "a", PRIORITY_NORMAL), ("a3", "a", PRIORITY_NORMAL),
+                ("b1", "b", PRIORITY_NORMAL), ("c1", "c", PRIORITY_NORMAL)]
+    order = asyncio.run(run_queued(sched, requests))
+    # 会话 a 先排入三个请求，也只能与 b、c 轮流执行
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_short_requests_run_first():
+    sched = unlimited(max_concurrency=1)
+    requests = [("n1", "a", PRIORITY_NORMAL), ("n2", "b", PRIORITY_NORMAL), ("s1", "c", PRIORITY_SHORT)]
+    assert asyncio.run(run_queued(sched, requests)) == ["s1", "n1", "n2"]
+    assert sched.priority_for("短问题") == PRIORITY_SHORT
+    assert sched.priority_for("短问题", use_tools=True) == PRIORITY_NORMAL
+    assert sched.priority_for("长" * 31) == PRIORITY_NORMAL
+
+
+def test_full_queue_rejects():
+    sched = unlimited(max_concurrency=1, max_queue=1)
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def hold(session_id):
+            async with sched.slot(session_id, "c"):
+                await gate.wait()
+
+        running = asyncio.create_task(hold("a"))
+        queued = asyncio.create_task(hold("b"))
+        await asyncio.sleep(0)
+        assert sched.stats()["queued"] == 1
+        with pytest.raises(RateLimited):
+            async with sched.slot("c", "c"):
+                pass
+        gate.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+    assert sched.stats()["active"] == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    sched = unlimited(max_concurrency=1)
+
+    async def main():
+        gate = asyncio.Event()
+        order = []
+
+        async def request(name, session_id, wait=False):
+            async with sched.slot(session_id, "c"):
+                order.append(name)
+                if wait:
+                    await gate.wait()
+
+        running = asyncio.create_task(request("first", "a", wait=True))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(request("cancelled", "b"))
+        waiting = asyncio.create_task(request("waiting", "c"))
+        await asyncio.sleep(0)
+        stats = sched.stats()
+        assert stats["queued"] == 2
+        assert stats["queued_sessions"] == 2
+        assert stats["queued_by_priority"] == {"short": 0, "normal": 2}
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert sched.stats()["queued"] == 1
+        gate.set()
+        await asyncio.gather(running, waiting)
+        return order
+
+    assert asyncio.run(main()) == ["first", "waiting"]
+    assert sched.stats() == {
+        "active": 0, "queued": 0, "max_concurrency": 1,
+        "queued_by_priority": {"short": 0, "normal": 0}, "queued_sessions": 0
+    }
+
+
+def test_from_config():
+    sched = FairScheduler.from_config({"scheduler": {"max_concurrency": 2, "session_rate": 0}})
+    assert sched.max_concurrency == 2
+    assert sched.max_queue == 64
+    assert sched._session_buckets is None
+    assert sched._client_buckets is not None
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会话归档的测试：归档、按需读取、恢复、压实与导出导入"""
+
+import os
+import time
+
+from src.core.session_archive import SessionArchive
+from src.core.session_manager import SessionManager
+
+
+def make_session(manager, client_id, *contents, age_days=0):
+    session_id = manager.create_session(client_id)
+    for content in contents:
+        manager.save_message(session_id, {"role": "user", "content": content})
+    if age_days:
+        old = time.time() - age_days * 86400
+        os.utime(manager.base_dir / f"{session_id}.json", (old, old))
+    return session_id
+
+
+def test_archive_skips_recent_and_current_sessions(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    old = make_session(manager, "alice", "林黛玉进贾府", age_days=30)
+    current = make_session(manager, "bob", "刘姥姥进大观园", age_days=30)
+    recent = make_session(manager, "bob", "宝玉挨打")
+    # old 不再是任何客户端的当前会话；current 很久未更新，但仍是 bob 的当前会话
+    manager.set_current_session(current, "bob")
+    manager.set_current_session(recent, "alice")
+
+    result = manager.archive_sessions(older_than_days=7)
+    assert result["archived"] == 1
+    assert result["compressed_bytes"] > 0
+    assert [s["id"] for s in manager.get_sessions()] == sorted([current, recent], reverse=True)
+    assert not (tmp_path / f"{old}.json").exists()
+
+    # 归档会话按需读取，列表分页返回元信息
+    assert manager.get_session(old) == [{"role": "user", "content": "林黛玉进贾府"}]
+    archived = manager.list_archived()
+    assert archived["total"] == 1
+    assert archived["sessions"][0]["id"] == old
+    assert archived["sessions"][0]["message_count"] == 1
+
+
+def test_saving_to_archived_session_restores_it(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    session_id = make_session(manager, "alice", "第一问", age_days=30)
+    manager.create_session("alice")
+    manager.archive_sessions(older_than_days=7)
+    assert manager.archive.contains(session_id)
+
+    assert manager.save_message(session_id, {"role": "assistant", "content": "第一答"})
+    assert not manager.archive.contains(session_id)
+    assert [m["content"] for m in manager.get_session(session_id)] == ["第一问", "第一答"]
+    assert session_id in [s["id"] for s in manager.get_sessions()]
+
+
+def test_delete_archived_session(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    session_id = make_session(manager, "alice", "要删除的会话", age_days=30)
+    manager.create_session("alice")
+    manager.archive_sessions(older_than_days=7)
+
+    assert manager.delete_session(session_id)
+    assert manager.get_session(session_id) == []
+    assert manager.list_archived()["total"] == 0
+    assert not manager.delete_session(session_id)
+
+
+def test_compact_reclaims_removed_frames(tmp_path):
+    archive = SessionArchive(str(tmp_path), segment_bytes=1 << 20)
+    sessions = {f"s{i}": [{"role": "user", "content": f"消息 {i} " + "内容" * (50 + i)}] for i in range(6)}
+    for session_id, messages in sessions.items():
+        archive.add({"id": session_id, "title": session_id}, messages, time.time())
+    assert len(list(tmp_path.glob("segment-*"))) == 1
+
+    # 垃圾比例未达到阈值时不压实
+    archive.remove("s0")
+    assert archive.compact()["compacted_segments"] == 0
+
+    for session_id in ("s1", "s2", "s3"):
+        archive.remove(session_id)
+    segment_size = next(tmp_path.glob("segment-*")).stat().st_size
+    result = archive.compact()
+    assert result["compacted_segments"] == 1
+    assert 0 < result["reclaimed_bytes"] < segment_size
+
+    segments = list(tmp_path.glob("segment-*"))
+    assert len(segments) == 1
+    assert segments[0].stat().st_size == segment_size - result["reclaimed_bytes"]
+    for session_id in ("s4", "s5"):
+        assert archive.load(session_id) == sessions[session_id]
+    assert archive.load("s1") is None
+
+    # 全部移除后分段被删除
+    archive.remove("s4")
+    archive.remove("s5")
+    archive.compact()
+    assert list(tmp_path.glob("segment-*")) == []
+
+
+def test_export_and_import_round_trip(tmp_path):
+    source = SessionManager(str(tmp_path / "source"))
+    archived = make_session(source, "alice", "已归档", age_days=30)
+    hot = make_session(source, "alice", "活跃")
+    source.archive_sessions(older_than_days=7)
+
+    records = list(source.iter_export())
+    assert {(r["id"], r["archived"]) for r in records} == {(archived, True), (hot, False)}
+
+    target = SessionManager(str(tmp_path / "target"))
+    invalid = {"id": "../escape", "messages": []}
+    assert target.import_sessions(records + [invalid]) == {"imported": 2, "skipped": 0, "invalid": 1}
+    assert target.get_session(archived) == [{"role": "user", "content": "已归档"}]
+    assert target.import_sessions(records) == {"imported": 0, "skipped": 2, "invalid": 0}
+
+    changed = [{"id": hot, "messages": [{"role": "user", "content": "覆盖"}]}]
+    assert target.import_sessions(changed, overwrite=True)["imported"] == 1
+    assert target.get_session(hot) == [{"role": "user", "content": "覆盖"}]
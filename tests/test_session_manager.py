@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""SessionManager 的测试：跨进程加锁写入、按客户端区分的当前会话、多实例间的列表同步"""
+
+import json
+import multiprocessing
+
+import pytest
+
+from src.core.session_manager import SessionManager, fcntl
+
+
+def _append_messages(base_dir, session_id, worker, count):
+    manager = SessionManager(base_dir)
+    for i in range(count):
+        assert manager.save_message(session_id, {"role": "user", "content": f"{worker}-{i}"})
+
+
+@pytest.mark.skipif(fcntl is None, reason="需要 fcntl 文件锁")
+def test_concurrent_appends_from_processes_are_not_lost(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    session_id = manager.create_session()
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append_messages, args=(str(tmp_path), session_id, w, 25))
+               for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    messages = manager.get_session(session_id)
+    assert len(messages) == 100
+    assert sorted(m["content"] for m in messages) == sorted(f"{w}-{i}" for w in range(4) for i in range(25))
+    # 每个工作进程内部的消息保持追加顺序
+    for w in range(4):
+        own = [m["content"] for m in messages if m["content"].startswith(f"{w}-")]
+        assert own == [f"{w}-{i}" for i in range(25)]
+    # 没有遗留的临时文件
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_current_session_is_per_client(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    first = manager.create_session("alice")
+    second = manager.create_session("bob")
+
+    assert manager.get_current_session_id("alice") == first
+    assert manager.get_current_session_id("bob") == second
+    assert manager.get_current_session_id("carol") is None
+
+    assert manager.set_current_session(second, "alice")
+    assert manager.get_current_session_id("alice") == second
+    assert not manager.set_current_session("missing", "alice")
+    assert manager.get_current_session_id("alice") == second
+
+    # 删除会话时重置所有以它为当前会话的客户端
+    assert manager.delete_session(second)
+    assert manager.get_current_session_id("alice") is None
+    assert manager.get_current_session_id("bob") is None
+    assert json.loads((tmp_path / ".state" / "clients.json").read_text(encoding="utf-8")) == {}
+
+
+def test_instances_share_session_list(tmp_path):
+    worker_a = SessionManager(str(tmp_path))
+    worker_b = SessionManager(str(tmp_path))
+
+    session_id = worker_a.create_session("alice")
+    assert [s["id"] for s in worker_b.get_sessions()] == [session_id]
+    assert worker_b.get_current_session_id("alice") == session_id
+
+    # 第一条用户消息更新标题，其他实例通过版本文件感知
+    question = "宝玉和黛玉第一次见面是在哪一回？当时两人各自说了什么话，贾母又是怎样安排黛玉住处的？"
+    worker_b.save_message(session_id, {"role": "user", "content": question})
+    assert worker_a.get_sessions()[0]["title"] == question[:30] + "..."
+
+    worker_b.delete_session(session_id)
+    assert worker_a.get_sessions() == []
+    assert worker_a.get_session(session_id) == []
+
+
+def test_save_message_to_unknown_session(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    assert not manager.save_message("missing", {"role": "user", "content": "你好"})
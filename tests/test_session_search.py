@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会话全文检索的测试：trigram 索引、短词扫描、片段标记与增量维护"""
+
+import os
+import time
+
+from src.core.session_manager import SessionManager
+from src.core.session_search import SessionSearchIndex, make_snippet
+
+
+def test_make_snippet_marks_terms():
+    content = "那日宝玉来到潇湘馆，只见黛玉正在窗下看书。" * 3
+    snippet = make_snippet(content, ["黛玉"], width=6)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "<mark>黛玉</mark>" in snippet
+    # 重叠的命中合并为一个标记
+    assert make_snippet("贾宝玉", ["贾宝", "宝玉"]) == "<mark>贾宝玉</mark>"
+    assert make_snippet("Hello World", ["world"]) == "Hello <mark>World</mark>"
+
+
+def test_search_index(tmp_path):
+    index = SessionSearchIndex(tmp_path / "search.sqlite")
+    index.add("s1", 0, {"role": "user", "content": "林黛玉进贾府是第几回？"})
+    index.add("s1", 1, {"role": "assistant", "content": "林黛玉进贾府出自第三回。"})
+    index.add("s2", 0, {"role": "user", "content": "刘姥姥进大观园闹了哪些笑话"})
+    index.add("s2", 1, {"role": "assistant", "content": ""})
+
+    results, total = index.search("林黛玉")
+    assert total == 2
+    assert {(r["session_id"], r["position"]) for r in results} == {("s1", 0), ("s1", 1)}
+    assert all("<mark>林黛玉</mark>" in r["snippet"] and r["score"] is not None for r in results)
+
+    # 多个词需同时命中；不足三个字的词退化为 LIKE 扫描
+    results, total = index.search("进贾府 第三")
+    assert total == 1 and results[0]["role"] == "assistant"
+    results, total = index.search("姥姥")
+    assert total == 1 and results[0]["session_id"] == "s2" and results[0]["score"] is None
+    # 查询语法和 LIKE 通配符按字面匹配
+    assert index.search('"OR" %')[1] == 0
+    assert index.search("   ") == ([], 0)
+
+    # 分页
+    first, total = index.search("林黛玉", offset=0, limit=1)
+    second, _ = index.search("林黛玉", offset=1, limit=1)
+    assert total == 2 and len(first) == len(second) == 1
+    assert first[0]["position"] != second[0]["position"]
+
+    index.remove("s1")
+    assert index.search("林黛玉")[1] == 0
+    index.index_session("s2", [{"role": "user", "content": "重新导入的会话"}])
+    assert index.search("姥姥")[1] == 0
+    assert index.search("重新导入")[1] == 1
+
+
+def test_manager_search_builds_index_and_tracks_changes(tmp_path):
+    manager = SessionManager(str(tmp_path))
+    archived = manager.create_session("alice")
+    manager.save_message(archived, {"role": "user", "content": "晴雯撕扇的故事"})
+    old = time.time() - 30 * 86400
+    os.utime(tmp_path / f"{archived}.json", (old, old))
+    hot = manager.create_session("alice")
+    manager.archive_sessions(older_than_days=7)
+
+    # 模拟升级前已有的会话：清空索引后首次检索时补建（包括归档会话）
+    manager.search_index = SessionSearchIndex(tmp_path / ".state" / "rebuilt.sqlite")
+    assert not manager.search_index.is_built()
+    result = manager.search_sessions("晴雯撕扇")
+    assert manager.search_index.is_built()
+    assert result["total"] == 1
+    assert result["results"][0]["session_id"] == archived
+    assert result["results"][0]["archived"] is True
+
+    # 新消息增量索引，删除会话后不再命中
+    manager.save_message(hot, {"role": "user", "content": "晴雯补裘在第几回"})
+    result = manager.search_sessions("晴雯", page_size=1)
+    assert result["total"] == 2 and len(result["results"]) == 1
+    manager.delete_session(archived)
+    result = manager.search_sessions("晴雯")
+    assert [(r["session_id"], r["archived"], r["title"]) for r in result["results"]] == [
+        (hot, False, "晴雯补裘在第几回")
+    ]
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""WebSearcher 的测试：本地 http.server 返回固定的百度结果页，不访问外网"""
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from src.core import web_search
+from src.core.web_search import SearchCache, WebSearcher
+
+RESULT_PAGE = """<!DOCTYPE html>
+<html><head><title>{query}_百度搜索</title><script>var x = 1;</script></head>
+<body>
+<div id="head"><div class="s_form">搜索框</div></div>
+<div id="content_left">
+  <div class="result c-container new-pmd" id="1">
+    <h3 class="t"><a href="http://example.com/1">{query} 第一条结果</a></h3>
+    <div class="c-abstract content">第一条摘要，<em>{query}</em></div>
+  </div>
+  <div class="c-container result-op" id="2"><h3>不是普通结果</h3></div>
+  <div class="result c-container" id="3">
+    <h3 class="t"><a href="http://example.com/3">{query} 第二条结果</a></h3>
+    <div class="content">第二条摘要</div>
+  </div>
+  <div class="result c-container" id="4">
+    <h3 class="t">没有链接的结果</h3>
+  </div>
+</div>
+</body></html>
+"""
+
+ARTICLE_PAGE = """<html><head><style>body {{ color: red; }}</style></head>
+<body><script>alert("x")</script><p>正文   第一段</p><p>正文第二段</p></body></html>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """/s 返回结果页（wd=fail 时返回 500），/page 返回网页正文，/slow 延迟响应"""
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        with server.stats_lock:
+            server.requests.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if url.path == "/s":
+                query = parse_qs(url.query).get("wd", [""])[0]
+                time.sleep(server.search_delay)
+                if query == "fail":
+                    self._send(500, "error")
+                else:
+                    self._send(200, RESULT_PAGE.format(query=query))
+            elif url.path == "/page":
+                self._send(200, ARTICLE_PAGE.format())
+            elif url.path == "/slow":
+                time.sleep(server.slow_delay)
+                self._send(200, ARTICLE_PAGE.format())
+            else:
+                self._send(404, "not found")
+        finally:
+            with server.stats_lock:
+                server.in_flight -= 1
+
+    def _send(self, status: int, body: str):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时断开
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    httpd.daemon_threads = True
+    httpd.stats_lock = threading.Lock()
+    httpd.requests = []
+    httpd.in_flight = 0
+    httpd.max_in_flight = 0
+    httpd.search_delay = 0.0
+    httpd.slow_delay = 2.0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """替换 web_search 模块中的 time，用于推进缓存时间"""
+    now = [1000.0]
+    monkeypatch.setattr(web_search, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def make_searcher(server, cache=None, **kwargs) -> WebSearcher:
+    return WebSearcher(cache=cache, search_url=f"{server.base_url}/s", **kwargs)
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "auto"])
+def test_parse_results(parser):
+    searcher = WebSearcher(parser=parser)
+    results = searcher.parse_results(RESULT_PAGE.format(query="红楼梦"), max_results=5)
+    assert results == [
+        {"title": "红楼梦 第一条结果", "content": "第一条摘要，红楼梦", "url": "http://example.com/1"},
+        {"title": "红楼梦 第二条结果", "content": "第二条摘要", "url": "http://example.com/3"},
+        {"title": "没有链接的结果", "content": "", "url": ""},
+    ]
+    assert len(searcher.parse_results(RESULT_PAGE.format(query="红楼梦"), max_results=1)) == 1
+    assert searcher.parse_results("<html><body>没有结果</body></html>", max_results=5) == []
+
+
+def test_search_fetches_and_parses(server):
+    searcher = make_searcher(server)
+    results = searcher.search("林黛玉", max_results=2)
+    assert [r["url"] for r in results] == ["http://example.com/1", "http://example.com/3"]
+    assert results[0]["title"] == "林黛玉 第一条结果"
+    assert len(server.requests) == 1
+
+
+def test_search_cache_hits_until_ttl_expires(server, clock):
+    cache = SearchCache(":memory:", ttl=60)
+    searcher = make_searcher(server, cache=cache)
+
+    first = searcher.search("宝玉")
+    assert searcher.search("宝玉") == first
+    assert len(server.requests) == 1
+
+    # 不同的参数使用不同的缓存键
+    searcher.search("宝玉", max_results=1)
+    assert len(server.requests) == 2
+
+    clock[0] += 59
+    searcher.search("宝玉")
+    assert len(server.requests) == 2
+
+    clock[0] += 2
+    searcher.search("宝玉")
+    assert len(server.requests) == 3
+
+
+def test_search_cache_purge_expired(clock):
+    cache = SearchCache(":memory:", ttl=10)
+    cache.set("a", [1])
+    clock[0] += 5
+    cache.set("b", [2])
+    clock[0] += 6
+    assert cache.get("a") is None
+    assert cache.get("b") == [2]
+    assert cache.purge_expired() == 1
+
+
+def test_search_cache_persists_across_instances(tmp_path):
+    path = tmp_path / "cache" / "web_search.sqlite"
+    cache = SearchCache(path, ttl=60)
+    cache.set(SearchCache.make_key("search", "q"), [{"title": "t"}])
+    cache.close()
+    assert SearchCache(path, ttl=60).get(SearchCache.make_key("search", "q")) == [{"title": "t"}]
+
+
+def test_search_many_runs_concurrently(server):
+    server.search_delay = 0.3
+    searcher = make_searcher(server, max_workers=4)
+    queries = ["宝玉", "黛玉", "宝钗", "湘云", "宝玉"]
+
+    start = time.perf_counter()
+    results = searcher.search_many(queries, max_results=1)
+    elapsed = time.perf_counter() - start
+
+    # 重复的查询只请求一次，结果按查询返回
+    assert len(server.requests) == 4
+    assert set(results) == {"宝玉", "黛玉", "宝钗", "湘云"}
+    assert results["黛玉"][0]["title"] == "黛玉 第一条结果"
+    # 4 个查询串行需要 1.2 秒
+    assert server.max_in_flight >= 2
+    assert elapsed < 1.0
+
+
+def test_search_many_isolates_failures(server):
+    searcher = make_searcher(server)
+    results = searcher.search_many(["宝玉", "fail"])
+    assert results["宝玉"][0]["title"] == "宝玉 第一条结果"
+    assert "error" in results["fail"][0]
+    assert "500" in results["fail"][0]["error"]
+
+
+def test_fetch_page_extracts_text(server):
+    searcher = make_searcher(server)
+    text = searcher.fetch_page(f"{server.base_url}/page")
+    assert text == "正文 第一段 正文第二段"
+    assert searcher.fetch_page(f"{server.base_url}/page", max_chars=4) == "正文 第"
+
+
+def test_fetch_page_read_timeout(server):
+    searcher = make_searcher(server, timeout=(1.0, 0.2))
+    start = time.perf_counter()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        searcher.fetch_page(f"{server.base_url}/slow")
+    # 读取超时不重试，只等待一次读取超时
+    assert time.perf_counter() - start < 0.4
+    assert len(server.requests) == 1
+
+
+def test_fetch_pages_keeps_going_after_timeout(server):
+    searcher = make_searcher(server, timeout=(1.0, 0.2))
+    results = searcher.fetch_pages([
+        {"title": "慢", "url": f"{server.base_url}/slow"},
+        {"title": "正常", "url": f"{server.base_url}/page"},
+        {"title": "无链接", "url": ""},
+    ])
+    assert results[0]["page_content"] == ""
+    assert results[1]["page_content"] == "正文 第一段 正文第二段"
+    assert "page_content" not in results[2]